@@ -75,7 +75,22 @@ else:
 important_files = {
     'app.py': os.path.join(src_dir, 'app.py'),
     'menu_updater.py': os.path.join(src_dir, 'menu_updater.py'),
-    'nutrition_data.csv': os.path.join(src_dir, 'nutrition_data.csv')
+    'menu_model.py': os.path.join(src_dir, 'menu_model.py'),
+    'excel_export.py': os.path.join(src_dir, 'excel_export.py'),
+    'image_layout.py': os.path.join(src_dir, 'image_layout.py'),
+    'pdf_export.py': os.path.join(src_dir, 'pdf_export.py'),
+    'order_sheet.py': os.path.join(src_dir, 'order_sheet.py'),
+    'llm_client.py': os.path.join(src_dir, 'llm_client.py'),
+    'job_queue.py': os.path.join(src_dir, 'job_queue.py'),
+    'progress.py': os.path.join(src_dir, 'progress.py'),
+    'log_config.py': os.path.join(src_dir, 'log_config.py'),
+    'tracing.py': os.path.join(src_dir, 'tracing.py'),
+    'metrics.py': os.path.join(src_dir, 'metrics.py'),
+    'profiling.py': os.path.join(src_dir, 'profiling.py'),
+    'history.py': os.path.join(src_dir, 'history.py'),
+    'kondate.py': os.path.join(src_dir, 'kondate.py'),
+    'nutrition_data.csv': os.path.join(src_dir, 'nutrition_data.csv'),
+    'order_suppliers.csv': os.path.join(src_dir, 'order_suppliers.csv')
 }
 
 # 必要なファイルを直接distディレクトリにコピー
@@ -127,6 +142,7 @@ PyInstaller.__main__.run([
     '--hidden-import=pandas',
     '--hidden-import=openpyxl',
     '--hidden-import=xlsxwriter',
+    '--hidden-import=reportlab',
     '--hidden-import=python-dotenv',
     '--hidden-import=dotenv',
     '--distpath=' + dist_dir,  # 出力先ディレクトリを指定
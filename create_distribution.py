@@ -24,8 +24,38 @@ FILES_TO_INCLUDE = [
      "dest": "app.py"},
     {"source": os.path.join(DIST_DIR, "menu_updater.py"), 
      "dest": "menu_updater.py"},
+    {"source": os.path.join(DIST_DIR, "menu_model.py"), 
+     "dest": "menu_model.py"},
+    {"source": os.path.join(DIST_DIR, "excel_export.py"), 
+     "dest": "excel_export.py"},
+    {"source": os.path.join(DIST_DIR, "image_layout.py"), 
+     "dest": "image_layout.py"},
+    {"source": os.path.join(DIST_DIR, "pdf_export.py"), 
+     "dest": "pdf_export.py"},
+    {"source": os.path.join(DIST_DIR, "order_sheet.py"), 
+     "dest": "order_sheet.py"},
+    {"source": os.path.join(DIST_DIR, "llm_client.py"), 
+     "dest": "llm_client.py"},
+    {"source": os.path.join(DIST_DIR, "job_queue.py"), 
+     "dest": "job_queue.py"},
+    {"source": os.path.join(DIST_DIR, "progress.py"), 
+     "dest": "progress.py"},
+    {"source": os.path.join(DIST_DIR, "log_config.py"), 
+     "dest": "log_config.py"},
+    {"source": os.path.join(DIST_DIR, "tracing.py"), 
+     "dest": "tracing.py"},
+    {"source": os.path.join(DIST_DIR, "metrics.py"), 
+     "dest": "metrics.py"},
+    {"source": os.path.join(DIST_DIR, "profiling.py"), 
+     "dest": "profiling.py"},
+    {"source": os.path.join(DIST_DIR, "history.py"), 
+     "dest": "history.py"},
+    {"source": os.path.join(DIST_DIR, "kondate.py"), 
+     "dest": "kondate.py"},
     {"source": os.path.join(DIST_DIR, "nutrition_data.csv"), 
      "dest": "nutrition_data.csv"},
+    {"source": os.path.join(DIST_DIR, "order_suppliers.csv"), 
+     "dest": "order_suppliers.csv"},
     # 環境設定ファイル
     {"source": os.path.join(DIST_DIR, ".env"), 
      "dest": ".env"},
@@ -59,7 +89,22 @@ def main():
         'kondate_system.exe',
         'app.py',
         'menu_updater.py',
+        'menu_model.py',
+        'excel_export.py',
+        'image_layout.py',
+        'pdf_export.py',
+        'order_sheet.py',
+        'llm_client.py',
+        'job_queue.py',
+        'progress.py',
+        'log_config.py',
+        'tracing.py',
+        'metrics.py',
+        'profiling.py',
+        'history.py',
+        'kondate.py',
         'nutrition_data.csv',
+        'order_suppliers.csv',
         'run_menu.bat',
         'Start.bat'
     ]
@@ -1,5 +1,4 @@
 import os
-import tempfile
 import base64
 from pathlib import Path
 import pandas as pd
@@ -8,20 +7,37 @@ import datetime
 from datetime import date, timedelta
 import io
 import re
+import hmac
+import time
+import uuid
 
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from menu_updater import (
     update_menu_with_desserts,
-    generate_menu_image_output,
     create_order_sheets,
+    create_order_sheets_batch,
     update_menu_with_reordering,
     get_nutritionist_response,
     preview_reordering,
     reorder_with_llm,
-    generate_weekly_menu
+    generate_weekly_menu,
+    extract_menu_and_nutrition,
+    load_nutrition_data,
+    load_supplier_config,
+    configure_resource_loaders,
+    clear_parsed_menu_cache,
+    get_model
 )
+from excel_export import write_menu_dataframe, column_width
+from job_queue import FAILED, get_job_queue, job_key
+from progress import ProgressReporter
+from tracing import load_trace, recent_traces, waterfall_rows
+from metrics import start_metrics_server
+from profiling import profiled, profiling_enabled, recent_reports, report_path
+import altair as alt
+import google.generativeai as genai
 
 # プロジェクトのルートディレクトリを取得
 ROOT_DIR = Path(__file__).parent.parent
@@ -74,11 +90,204 @@ st.write("""
 1. Excelファイル（input_menu.xlsx）をアップロードしてください
 2. 「通常出力」ボタン：デザート追加と栄養計算を行います
 3. 「献立並び替え」ボタン：選択した戦略に基づいて献立を並び替えます
-4. 処理が完了すると、更新されたファイルが自動で開かれます
+4. 処理が完了すると表示されるダウンロードボタンから、更新されたファイルを保存してください
 """)
 
+# キャッシュの上限（件数と保持時間）
+RESULT_CACHE_MAX_ENTRIES = 32
+WORKBOOK_CACHE_MAX_ENTRIES = 16
+MODEL_CACHE_MAX_ENTRIES = 4
+CACHE_TTL_SECONDS = 60 * 60
+
+# 設定すると、キャッシュのクリアに管理者パスワードが必要になる
+ADMIN_PASSWORD_ENV = 'MENU_ADMIN_PASSWORD'
+
+@st.cache_resource(show_spinner=False)
+def cached_nutrition_data():
+    """栄養価データ（プロセス内で1回だけ読み込み、全セッションで共有する）"""
+    return load_nutrition_data()
+
+@st.cache_resource(show_spinner=False)
+def cached_supplier_config():
+    """発注先の設定と食材名の割り当てルール（プロセス内で1回だけ作成する）"""
+    return load_supplier_config()
+
+@st.cache_resource(max_entries=MODEL_CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_model(model_name):
+    """Geminiモデル（モデル名ごとに1回だけ作成する）"""
+    return genai.GenerativeModel(model_name)
+
+# menu_updater の処理でもキャッシュした栄養価データ・発注先設定・モデルを使う
+configure_resource_loaders(nutrition_data=cached_nutrition_data, supplier_config=cached_supplier_config,
+                           model=cached_model)
+
+# MENU_METRICS_PORT を指定した場合は計測値を別ポートの /metrics に公開する（プロセスごとに1回だけ起動）
+start_metrics_server()
+
+@st.cache_data(max_entries=WORKBOOK_CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def read_workbook_sheets(input_data):
+    """アップロードされたワークブックの全シート（内容のハッシュでキャッシュ）"""
+    return pd.read_excel(io.BytesIO(input_data), sheet_name=None)
+
+@st.cache_data(max_entries=WORKBOOK_CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def workbook_nutrition(input_data):
+    """ワークブックの日付ごとの栄養価（内容のハッシュでキャッシュ）"""
+    return extract_menu_and_nutrition(input_data).all_nutrition
+
+def is_admin() -> bool:
+    """管理者の操作を許可するか（管理者パスワードが未設定の場合は常に許可）"""
+    password = os.getenv(ADMIN_PASSWORD_ENV)
+    if not password:
+        return True
+    return hmac.compare_digest(st.session_state.get("admin_password", ""), password)
+
+def clear_caches():
+    """Streamlitのキャッシュ・解析済みワークブック・完了済みジョブの結果を削除する"""
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    clear_parsed_menu_cache()
+    get_job_queue().purge(older_than=0)
+
+# ジョブの進捗を確認する間隔（秒）
+JOB_POLL_SECONDS = 1.0
+
+# 処理時間タブに表示する処理の件数
+TRACE_LIST_LIMIT = 50
+
+# 処理時間タブに表示するプロファイルの件数
+PROFILE_LIST_LIMIT = 20
+
+def job_owner() -> str:
+    """このブラウザセッションの利用者ID（ジョブの同時実行数の制限に使う）"""
+    if "job_owner" not in st.session_state:
+        st.session_state.job_owner = uuid.uuid4().hex
+    return st.session_state.job_owner
+
+def profiling_requested() -> bool:
+    """
+    登録する処理をプロファイルするか（MENU_PROFILE=1、または管理者のURLの ?profile=1・チェックボックス）
+
+    プロファイルする処理はキャッシュを通さずレポートも保存するため、URLでの切り替えも管理者に限る。
+    """
+    requested = st.query_params.get("profile") == "1" or st.session_state.get("profile_jobs", False)
+    return profiling_enabled() or (requested and is_admin())
+
+def job_function(func):
+    """ジョブで呼び出すキャッシュ付きの関数（プロファイルする場合はキャッシュ済みの結果を返さないようにキャッシュを通さない）"""
+    return func.__wrapped__ if profiling_requested() else func
+
+def submit_job(slot, kind, fn, *key_parts):
+    """
+    時間のかかる処理をジョブとして登録し、ジョブIDをセッションに保存する
+
+    同じ種類・同じ入力のジョブが順番待ち・実行中の場合は、そのジョブを再利用する（ボタンの重複クリック対策）。
+    完了済みの結果は st.cache_data のキャッシュで再利用されるため、ジョブとしては再利用しない。
+    fn は進捗を報告する progress(割合, メッセージ) を受け取り、pickle できる結果を返す関数。
+    プロファイルする場合は実行中のジョブを再利用せずに実行し、レポートのパスをセッションに保存する。
+    """
+    profile_path = None
+    if profiling_requested():
+        profile_path = report_path(kind)
+        fn = profiled(fn, profile_path, title=kind)
+        key_parts += (profile_path,)
+    job_id = get_job_queue().submit(kind, job_key(kind, *key_parts), fn, owner=job_owner())
+    st.session_state[f"job_{slot}"] = job_id
+    st.session_state[f"profile_{slot}"] = profile_path
+    return job_id
+
+def profile_download_button(path, key):
+    """プロファイルのレポート（HTML）のダウンロードボタン"""
+    with open(path, "rb") as f:
+        st.download_button("プロファイル（HTML）をダウンロード", f.read(), file_name=os.path.basename(path),
+                           mime="text/html", key=key)
+
+def job_result(slot, running_text, show_error=True):
+    """
+    slot のジョブの状態を表示し、完了していればジョブを返す
+
+    実行中は進捗バーを表示し、スクリプトの最後で一定間隔ごとに再実行して表示を更新する。
+    失敗したジョブは show_error が True ならエラーを表示して None、False ならそのまま返す。
+    """
+    job_id = st.session_state.get(f"job_{slot}")
+    if not job_id:
+        return None
+    job = get_job_queue().get(job_id)
+    if job is None:
+        del st.session_state[f"job_{slot}"]
+        return None
+    profile_path = st.session_state.get(f"profile_{slot}")
+    if job.finished and profile_path and os.path.exists(profile_path):
+        profile_download_button(profile_path, key=f"profile_download_{slot}")
+    if job.status == FAILED and show_error:
+        st.error(f"処理中にエラーが発生しました: {job.error}")
+        return None
+    if not job.finished:
+        elapsed = time.time() - (job.started_at or job.created_at)
+        st.progress(job.progress, text=f"{running_text}...（{job.message}、{elapsed:.0f}秒経過）")
+        st.session_state.jobs_pending = True
+        return None
+    return job
+
+def rerun_while_jobs_running():
+    """表示中のジョブが実行中なら、少し待ってから再実行して進捗を更新する"""
+    if st.session_state.pop("jobs_pending", False):
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+
+def job_reporter(progress):
+    """処理の進捗（段階・完了数/総数）をジョブの進捗 progress(割合, メッセージ) に流す ProgressReporter"""
+    return ProgressReporter(lambda event: progress(event.fraction, f"{event.stage} {event.completed}/{event.total}"))
+
+@st.cache_data(max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def run_menu_output(input_data, output_format, _progress=None):
+    """メニュー出力ジョブ（Excel・PDFはbytes、画像はページごとのbytesのリスト。入力と形式ごとにキャッシュ）"""
+    output = update_menu_with_desserts(input_data, output_format=output_format, progress=_progress)
+    if not output:
+        # 失敗として記録し、もう一度ボタンを押したときに再実行できるようにする
+        raise RuntimeError("メニュー表の作成に失敗しました")
+    if output_format == 'png':
+        return [page.getvalue() for page in output]
+    return output.getvalue()
+
+@st.cache_data(max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def run_reorder_save(input_data, params, _progress=None):
+    """並び替え保存ジョブ（並び替えたExcelのbytes）"""
+    reordered_file = update_menu_with_reordering(
+        input_data,
+        None,
+        params["reorder_type"],
+        params.get("target_weekday"),
+        params.get("target_genre"),
+        progress=_progress
+    )
+    return reordered_file.getvalue()
+
+@st.cache_data(max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def run_order_sheets(order_data, order_params):
+    """発注書作成ジョブ（発注書のExcelのbytes）"""
+    order_output = create_order_sheets(order_data, **order_params)
+    if not order_output:
+        raise RuntimeError("発注書の作成に失敗しました。")
+    return order_output.getvalue()
+
+@st.cache_data(max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def run_order_sheets_batch(order_data, order_specs):
+    """発注書一括作成ジョブ（発注書をまとめたZIPのbytes）"""
+    order_zip = create_order_sheets_batch(order_data, order_specs)
+    if not order_zip:
+        raise RuntimeError("発注書の作成に失敗しました。")
+    return order_zip.getvalue()
+
+def clear_jobs_for_new_upload(upload_key, uploaded_file, slots):
+    """アップロードされたファイルが変わったら、前のファイルのジョブ結果を表示しない"""
+    current = (uploaded_file.name, uploaded_file.size)
+    if st.session_state.get(f"upload_{upload_key}") != current:
+        st.session_state[f"upload_{upload_key}"] = current
+        for slot in slots:
+            st.session_state.pop(f"job_{slot}", None)
+
 # タブを作成して機能を分ける
-tab1, tab2, tab3 = st.tabs(["既存献立の管理", "一週間献立の自動生成", "発注書作成"])
+tab1, tab2, tab3, tab4 = st.tabs(["既存献立の管理", "一週間献立の自動生成", "発注書作成", "処理時間（管理者向け）"])
 
 with tab1:
     # 既存の機能（ファイルアップロード、デザート追加、並び替え）
@@ -86,120 +295,131 @@ with tab1:
 
     # ファイルがアップロードされた場合の処理
     if uploaded_file is not None:
+        clear_jobs_for_new_upload("menu_file", uploaded_file, ["menu_output", "reorder_preview", "reorder_save"])
         col1, col2 = st.columns(2)
         
         with col1:
             # 出力オプションの選択ラジオボタン
             output_option = st.radio(
                 "出力形式を選択してください",
-                ["Excel出力", "画像出力"],
+                ["Excel出力", "画像出力", "PDF出力"],
                 index=0
             )
             
             if st.button("メニュー出力", key="normal_output"):
-                with st.spinner("デザート追加と栄養計算を実行中..."):
-                    try:
-                        # 一時ファイルとして保存
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_input:
-                            tmp_input.write(uploaded_file.getvalue())
-                            input_path = tmp_input.name
-
-                        if output_option == "Excel出力":
-                            # 通常の処理を実行
-                            output_file = update_menu_with_desserts(input_path)
+                # アップロードされたファイルをメモリ上で処理（一時ファイルを作成しない）
+                input_data = uploaded_file.getvalue()
+                output_format = {"Excel出力": "xlsx", "画像出力": "png", "PDF出力": "pdf"}[output_option]
+                run = job_function(run_menu_output)
+                submit_job("menu_output", "menu_output",
+                           lambda progress: run(input_data, output_format, job_reporter(progress)),
+                           input_data, output_format)
+                st.session_state.menu_output_option = output_option
+
+            # 出力結果の表示（処理中は進捗を表示し、完了後は再実行しても結果を表示し続ける）
+            menu_job = job_result("menu_output", "デザート追加と栄養計算を実行中", show_error=False)
+            if menu_job is not None:
+                try:
+                    input_data = uploaded_file.getvalue()
+                    output_option = st.session_state.get("menu_output_option", output_option)
+                    output_data = menu_job.result if menu_job.status != FAILED else None
+
+                    if output_option == "Excel出力":
+                        if output_data:
+                            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
                             
-                            if output_file:
-                                with open(output_file, "rb") as file:
-                                    output_data = file.read()
-                                
-                                st.success("メニュー表を更新しました！")
-                                st.download_button(
-                                    label="更新されたメニュー表をダウンロード",
-                                    data=output_data,
-                                    file_name=os.path.basename(output_file),
-                                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                                )
-                            else:
-                                st.error("メニュー表の更新に失敗しました。")
-                                st.info("もう一度お試しいただくか、ファイルの形式を確認してください。")
-                                retry_col1, retry_col2 = st.columns([1,3])
-                                with retry_col1:
-                                    if st.button("再試行", key="retry_update"):
-                                        st.rerun()
-                                with retry_col2:
-                                    st.write("ファイルのフォーマットが正しいことを確認してください。入力ファイルは最新の形式である必要があります。")
-                                
-                                # 詳細なデバッグ情報を表示（開発者向け）
-                                with st.expander("詳細なエラー情報（開発者向け）"):
-                                    try:
-                                        # 一時ファイルとして保存
-                                        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_input:
-                                            tmp_input.write(uploaded_file.getvalue())
-                                            temp_input_path = tmp_input.name
-                                        
-                                        # テストとしてExcelファイルを読み込んでみる
-                                        df_dict = pd.read_excel(temp_input_path, sheet_name=None)
-                                        st.write("ファイル読み込み: OK")
-                                        st.write(f"シート数: {len(df_dict)}")
-                                        st.write(f"シート名: {list(df_dict.keys())}")
-                                        
-                                        # シート名の形式チェック
-                                        valid_sheets = []
-                                        invalid_sheets = []
-                                        for sheet_name in df_dict.keys():
-                                            match = re.search(r'(\d+)月(\d+)日(?:\(.\))?', sheet_name)
-                                            if match:
-                                                valid_sheets.append(sheet_name)
-                                            else:
-                                                invalid_sheets.append(sheet_name)
-                                        
-                                        st.write(f"有効なシート名: {valid_sheets}")
-                                        if invalid_sheets:
-                                            st.write(f"無効なシート名: {invalid_sheets}")
-                                            st.warning("シート名は「X月Y日」の形式である必要があります。")
-                                        
-                                        # 最初のシートのデータ構造を確認
-                                        if df_dict:
-                                            first_sheet = list(df_dict.keys())[0]
-                                            df = df_dict[first_sheet]
-                                            st.write(f"最初のシート '{first_sheet}' の列: {list(df.columns)}")
-                                            st.write(f"データサンプル:")
-                                            st.dataframe(df.head(5))
-                                        
-                                        # 一時ファイルを削除
-                                        os.unlink(temp_input_path)
-                                    except Exception as debug_err:
-                                        st.error(f"デバッグ中にエラーが発生: {str(debug_err)}")
+                            st.success("メニュー表を更新しました！")
+                            st.download_button(
+                                label="更新されたメニュー表をダウンロード",
+                                data=output_data,
+                                file_name=f"menu_with_desserts_{timestamp}.xlsx",
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            )
+                        else:
+                            st.error("メニュー表の更新に失敗しました。")
+                            st.info("もう一度お試しいただくか、ファイルの形式を確認してください。")
+                            retry_col1, retry_col2 = st.columns([1,3])
+                            with retry_col1:
+                                if st.button("再試行", key="retry_update"):
+                                    st.rerun()
+                            with retry_col2:
+                                st.write("ファイルのフォーマットが正しいことを確認してください。入力ファイルは最新の形式である必要があります。")
+                            
+                            # 詳細なデバッグ情報を表示（開発者向け）
+                            with st.expander("詳細なエラー情報（開発者向け）"):
+                                try:
+                                    # テストとしてExcelファイルを読み込んでみる
+                                    df_dict = read_workbook_sheets(input_data)
+                                    st.write("ファイル読み込み: OK")
+                                    st.write(f"シート数: {len(df_dict)}")
+                                    st.write(f"シート名: {list(df_dict.keys())}")
+                                    
+                                    # シート名の形式チェック
+                                    valid_sheets = []
+                                    invalid_sheets = []
+                                    for sheet_name in df_dict.keys():
+                                        match = re.search(r'(\d+)月(\d+)日(?:\(.\))?', sheet_name)
+                                        if match:
+                                            valid_sheets.append(sheet_name)
+                                        else:
+                                            invalid_sheets.append(sheet_name)
+                                    
+                                    st.write(f"有効なシート名: {valid_sheets}")
+                                    if invalid_sheets:
+                                        st.write(f"無効なシート名: {invalid_sheets}")
+                                        st.warning("シート名は「X月Y日」の形式である必要があります。")
+                                    
+                                    # 最初のシートのデータ構造を確認
+                                    if df_dict:
+                                        first_sheet = list(df_dict.keys())[0]
+                                        df = df_dict[first_sheet]
+                                        st.write(f"最初のシート '{first_sheet}' の列: {list(df.columns)}")
+                                        st.write(f"データサンプル:")
+                                        st.dataframe(df.head(5))
+                                except Exception as debug_err:
+                                    st.error(f"デバッグ中にエラーが発生: {str(debug_err)}")
+                    
+                    elif output_option == "PDF出力":
+                        # 印刷用のベクターPDF（デザート追加後の表からExcelを経由せずに作成、1週間ごとに1ページ）
+                        if output_data:
+                            st.success("メニュー表のPDFを作成しました！")
+                            st.download_button(
+                                label="メニュー表のPDFをダウンロード",
+                                data=output_data,
+                                file_name=f"{Path(uploaded_file.name).stem}_menu.pdf",
+                                mime="application/pdf"
+                            )
+                        else:
+                            st.error("メニュー表のPDF作成に失敗しました。")
+                    
+                    else:  # 画像出力
+                        # 画像出力処理を実行（デザート追加後の表からExcelを経由せずに作成、1週間ごとのページ）
+                        output_pages = output_data
                         
-                        else:  # 画像出力
-                            # 画像出力処理を実行
-                            output_file = generate_menu_image_output(input_path)
+                        if output_pages:
+                            st.success(f"メニュー表の画像を作成しました！（{len(output_pages)}ページ）")
                             
-                            if output_file:
-                                with open(output_file, "rb") as file:
-                                    output_data = file.read()
-                                
-                                st.success("メニュー表の画像を作成しました！")
+                            for page_num, page in enumerate(output_pages, start=1):
+                                output_data = page
+                                image_name = f"{Path(uploaded_file.name).stem}_image_output_{page_num}.png"
                                 
                                 # 画像を表示
-                                st.image(output_data, caption="メニュー表")
+                                st.image(output_data, caption=f"メニュー表（{page_num}ページ）")
                                 
                                 # ダウンロードボタン
                                 st.download_button(
-                                    label="メニュー表の画像をダウンロード",
+                                    label=f"{page_num}ページ目の画像をダウンロード",
                                     data=output_data,
-                                    file_name=os.path.basename(output_file),
-                                    mime="image/png"
+                                    file_name=image_name,
+                                    mime="image/png",
+                                    key=f"image_page_{page_num}"
                                 )
-                            else:
-                                st.error("メニュー表の画像作成に失敗しました。")
-                        
-                        # 一時ファイルを削除
-                        os.unlink(input_path)
-                    
-                    except Exception as e:
-                        st.error(f"エラーが発生しました: {str(e)}")
-        
+                        else:
+                            st.error("メニュー表の画像作成に失敗しました。")
+                
+                except Exception as e:
+                    st.error(f"エラーが発生しました: {str(e)}")
+    
         with col2:
             # 並び替え基本戦略のプルダウン
             reorder_options = [
@@ -235,78 +455,93 @@ with tab1:
                 if not uploaded_file:
                     st.error("ファイルをアップロードしてください。")
                 else:
-                    try:
-                        # 一時ファイルとして保存
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_input:
-                            tmp_input.write(uploaded_file.getvalue())
-                            input_path = tmp_input.name
-
-                        # プレビュー生成パラメータ
-                        params = {
-                            "reorder_type": reorder_selection
-                        }
-                        
-                        if reorder_selection == "曜日指定並び替え":
-                            params["target_weekday"] = selected_weekday
-                            params["target_genre"] = selected_genre
-                        
-                        # プレビュー生成
-                        preview_df, menu_details, reorder_rationale = preview_reordering(input_path, **params)
-                        
-                        # セッションステートに保存
-                        st.session_state.preview_df = preview_df
-                        st.session_state.menu_details = menu_details
-                        st.session_state.reorder_rationale = reorder_rationale
-                        st.session_state.reorder_params = params
-                        st.session_state.input_path = input_path
-                        
-                        # プレビュー表示
-                        st.subheader("並び替え後のメニュー表")
-                        st.dataframe(preview_df, use_container_width=True)
-                        
-                        # 並び替え理由の表示
-                        st.write("#### AIによる並び替え判断の説明")
-                        st.info(reorder_rationale)
-                        
-                        # メッセージとボタンを横に配置
-                        col_message, col_button = st.columns([2, 1])
-                        
-                        with col_message:
-                            st.success("並び替えプレビューを生成しました。確定して保存する場合は右のボタンをクリックしてください。")
+                    # アップロードされたファイルをメモリ上で処理（一時ファイルを作成しない）
+                    input_data = uploaded_file.getvalue()
+
+                    # プレビュー生成パラメータ
+                    params = {
+                        "reorder_type": reorder_selection
+                    }
+                    
+                    if reorder_selection == "曜日指定並び替え":
+                        params["target_weekday"] = selected_weekday
+                        params["target_genre"] = selected_genre
+                    
+                    # プレビュー生成をジョブとして実行
+                    submit_job("reorder_preview", "reorder_preview",
+                               lambda progress: preview_reordering(input_data, progress=job_reporter(progress), **params),
+                               input_data, params)
+                    st.session_state.reorder_params = params
+                    st.session_state.input_data = input_data
+                    st.session_state.pop("job_reorder_save", None)
+
+            # プレビューの表示（生成中は進捗を表示）
+            preview_job = job_result("reorder_preview", "並び替えプレビューを生成中")
+            if preview_job is not None:
+                try:
+                    # プレビュー生成時の入力とパラメータ
+                    input_data = st.session_state.input_data
+                    params = st.session_state.reorder_params
+                    preview_df, menu_details, reorder_rationale = preview_job.result
+                    
+                    # セッションステートに保存
+                    st.session_state.preview_df = preview_df
+                    st.session_state.menu_details = menu_details
+                    st.session_state.reorder_rationale = reorder_rationale
+                    
+                    # プレビュー表示
+                    st.subheader("並び替え後のメニュー表")
+                    st.dataframe(preview_df, use_container_width=True)
+                    
+                    # 並び替え理由の表示
+                    st.write("#### AIによる並び替え判断の説明")
+                    st.info(reorder_rationale)
+                    
+                    # メッセージとボタンを横に配置
+                    col_message, col_button = st.columns([2, 1])
+                    
+                    with col_message:
+                        st.success("並び替えプレビューを生成しました。確定して保存する場合は右のボタンをクリックしてください。")
+                    
+                    with col_button:
+                        if st.button("確定して保存", key="confirm_reorder"):
+                            # 並び替え更新処理をジョブとして実行（メモリ上に出力）
+                            run = job_function(run_reorder_save)
+                            submit_job("reorder_save", "reorder_save",
+                                       lambda progress: run(input_data, params, job_reporter(progress)),
+                                       input_data, params)
                         
-                        with col_button:
-                            if st.button("確定して保存", key="confirm_reorder"):
-                                with st.spinner("ファイルを保存しています..."):
-                                    # 出力用の一時ファイル名を生成
-                                    output_path = str(Path(input_path).with_name('reordered_menu.xlsx'))
-                                    
-                                    # 並び替え更新処理を実行
-                                    update_menu_with_reordering(
-                                        input_path, 
-                                        output_path, 
-                                        reorder_selection,
-                                        selected_weekday,
-                                        selected_genre
-                                    )
-                                    
-                                    # 完了メッセージ
-                                    st.success("並び替えが完了しました！ファイルが自動で開かれます。")
+                        save_job = job_result("reorder_save", "ファイルを保存しています")
+                        if save_job is not None:
+                            # 完了メッセージ
+                            st.success("並び替えが完了しました！")
+                            st.download_button(
+                                label="並び替えたメニュー表をダウンロード",
+                                data=save_job.result,
+                                file_name="reordered_menu.xlsx",
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            )
+                    
+                    # メニュー詳細表示（栄養価はプレビュー時の解析結果を再利用）
+                    all_nutrition = workbook_nutrition(input_data)
+                    with st.expander("メニューの詳細を表示"):
+                        st.write("#### 日付ごとのメニュー内容")
                         
-                        # メニュー詳細表示
-                        with st.expander("メニューの詳細を表示"):
-                            st.write("#### 日付ごとのメニュー内容")
-                            
-                            # 日付ごとに折りたたみ可能なセクションで表示
-                            for date, meals in menu_details.items():
-                                with st.expander(f"{date}"):
-                                    for meal_type, dishes in meals.items():
-                                        st.write(f"**{meal_type}**")
-                                        for dish in dishes:
-                                            st.write(f"- {dish}")
-                    except Exception as e:
-                        st.error(f"プレビュー生成中にエラーが発生しました: {str(e)}")
-                        if 'input_path' in vars() and os.path.exists(input_path):
-                            os.unlink(input_path)
+                        # 日付ごとに折りたたみ可能なセクションで表示
+                        for menu_date, meals in menu_details.items():
+                            with st.expander(f"{menu_date}"):
+                                for meal_type, dishes in meals.items():
+                                    st.write(f"**{meal_type}**")
+                                    for dish in dishes:
+                                        st.write(f"- {dish}")
+                                if all_nutrition.get(menu_date):
+                                    st.write("**栄養価**")
+                                    st.table(pd.DataFrame({
+                                        "栄養素": list(all_nutrition[menu_date].keys()),
+                                        "値": list(all_nutrition[menu_date].values())
+                                    }))
+                except Exception as e:
+                    st.error(f"プレビュー生成中にエラーが発生しました: {str(e)}")
 
 with tab2:
     st.header("🍽️ 一週間の献立自動生成")
@@ -363,406 +598,359 @@ with tab2:
     # 週間献立生成ボタン
     generate_button_text = f"{selected_weeks}週間の献立を生成"
     if st.button(generate_button_text, type="primary"):
-        with st.spinner("献立を考案中です..."):
-            try:
-                # 生成パラメータの設定
-                days = selected_weeks * 7
-                params = {
-                    "start_date": start_date,
-                    "meal_pattern": meal_pattern,
-                    "cuisine_preference": cuisine_preference,
-                    "special_considerations": special_considerations,
-                    "budget_per_meal": "200〜300円",
-                    "person_count": person_count
-                }
+        # 生成パラメータの設定
+        days = selected_weeks * 7
+        params = {
+            "start_date": start_date,
+            "meal_pattern": meal_pattern,
+            "cuisine_preference": cuisine_preference,
+            "special_considerations": special_considerations,
+            "budget_per_meal": "200〜300円",
+            "person_count": person_count
+        }
+        
+        # 献立生成をジョブとして実行
+        submit_job("weekly_menu", "weekly_menu",
+                   lambda progress: generate_weekly_menu(days, params, progress=job_reporter(progress)),
+                   days, params)
+        st.session_state.weekly_menu_request = {
+            "selected_weeks": selected_weeks,
+            "start_date": start_date,
+            "person_count": person_count
+        }
+
+    # 生成結果の表示（生成中は進捗を表示）
+    weekly_job = job_result("weekly_menu", "献立を考案中です")
+    if weekly_job is not None:
+        try:
+            # 生成時の設定で表示する（生成後にウィジェットを変更しても表示が崩れないように）
+            weekly_request = st.session_state.weekly_menu_request
+            selected_weeks = weekly_request["selected_weeks"]
+            start_date = weekly_request["start_date"]
+            person_count = weekly_request["person_count"]
+            days = selected_weeks * 7
+            weekly_menu = weekly_job.result
+            
+            if "error" in weekly_menu:
+                st.error(weekly_menu["error"])
+            else:
+                # 献立表示
+                st.success(f"{selected_weeks}週間分（{days}日分）の献立の生成が完了しました！")
                 
-                # 献立生成関数を呼び出し
-                weekly_menu = generate_weekly_menu(days, params)
+                # 各週ごとのタブ
+                week_tabs = st.tabs([f"第{i+1}週" for i in range(selected_weeks)])
                 
-                if "error" in weekly_menu:
-                    st.error(weekly_menu["error"])
-                else:
-                    # 献立表示
-                    st.success(f"{selected_weeks}週間分（{days}日分）の献立の生成が完了しました！")
-                    
-                    # 各週ごとのタブ
-                    week_tabs = st.tabs([f"第{i+1}週" for i in range(selected_weeks)])
-                    
-                    # Excel出力用のデータを週ごとに作成
-                    all_excel_data = []
-                    
-                    # 週ごとに処理
-                    for week_idx in range(selected_weeks):
-                        with week_tabs[week_idx]:
-                            # 日付タブの作成（各週7日分）
-                            start_day_idx = week_idx * 7
-                            end_day_idx = start_day_idx + 7
-                            week_dates = [(start_date + timedelta(days=i)) for i in range(start_day_idx, end_day_idx)]
-                            
-                            day_tabs = st.tabs([f"{date.strftime('%m/%d')}（{['月', '火', '水', '木', '金', '土', '日'][date.weekday()]}）" for date in week_dates])
-                            
-                            # 週ごとのExcelデータ構造
-                            week_excel_data = {
-                                "日付": [],
-                                "食事区分": [],
-                                "メニュー区分": [],
-                                "料理名": [],
-                                "1人分量": [],
-                                f"{person_count}人分量": []
-                            }
+                # Excel出力用のデータを週ごとに作成
+                all_excel_data = []
+                
+                # 週ごとに処理
+                for week_idx in range(selected_weeks):
+                    with week_tabs[week_idx]:
+                        # 日付タブの作成（各週7日分）
+                        start_day_idx = week_idx * 7
+                        end_day_idx = start_day_idx + 7
+                        week_dates = [(start_date + timedelta(days=i)) for i in range(start_day_idx, end_day_idx)]
+                        
+                        day_tabs = st.tabs([f"{date.strftime('%m/%d')}（{['月', '火', '水', '木', '金', '土', '日'][date.weekday()]}）" for date in week_dates])
+                        
+                        # 週ごとのExcelデータ構造
+                        week_excel_data = {
+                            "日付": [],
+                            "食事区分": [],
+                            "メニュー区分": [],
+                            "料理名": [],
+                            "1人分量": [],
+                            f"{person_count}人分量": []
+                        }
+                        
+                        # 各日の処理
+                        for day_idx, day_date in enumerate(week_dates):
+                            date_key = day_date.strftime("%Y-%m-%d")
+                            date_display = day_date.strftime("%m月%d日")
                             
-                            # 各日の処理
-                            for day_idx, day_date in enumerate(week_dates):
-                                date_key = day_date.strftime("%Y-%m-%d")
-                                date_display = day_date.strftime("%m月%d日")
+                            # 日付タブの内容を表示
+                            with day_tabs[day_idx]:
+                                day_menu = weekly_menu.get(date_key, {})
                                 
-                                # 日付タブの内容を表示
-                                with day_tabs[day_idx]:
-                                    day_menu = weekly_menu.get(date_key, {})
+                                # 献立の表示
+                                if day_menu:
+                                    # メニューと食材情報を表示
+                                    meals = day_menu.get("meals", {})
+                                    ingredients = day_menu.get("ingredients", {})
                                     
-                                    # 献立の表示
-                                    if day_menu:
-                                        # メニューと食材情報を表示
-                                        meals = day_menu.get("meals", {})
-                                        ingredients = day_menu.get("ingredients", {})
-                                        
-                                        st.subheader("本日の献立")
-                                        for meal_type in ["朝食", "昼食", "夕食"]:
-                                            if meal_type in meals:
-                                                st.write(f"### {meal_type}")
+                                    st.subheader("本日の献立")
+                                    for meal_type in ["朝食", "昼食", "夕食"]:
+                                        if meal_type in meals:
+                                            st.write(f"### {meal_type}")
+                                            
+                                            # メニュー項目と食材情報を表で表示
+                                            meal_items = meals[meal_type]
+                                            meal_ingredients = ingredients.get(meal_type, {})
+                                            
+                                            for idx, item_name in enumerate(meal_items):
+                                                st.write(f"**{item_name}**")
                                                 
-                                                # メニュー項目と食材情報を表で表示
-                                                meal_items = meals[meal_type]
-                                                meal_ingredients = ingredients.get(meal_type, {})
+                                                # Excel用データに追加
+                                                # 日付, 食事区分, メニュー区分, 料理名, 1人分量, 全体量
+                                                week_excel_data["日付"].append(date_display)
+                                                week_excel_data["食事区分"].append(meal_type)
                                                 
-                                                for idx, item_name in enumerate(meal_items):
-                                                    st.write(f"**{item_name}**")
+                                                # メニュー区分を決定（順番に応じて）
+                                                menu_category = ""
+                                                if idx == 0:
+                                                    menu_category = "主食"
+                                                elif idx == 1:
+                                                    menu_category = "主菜"
+                                                elif idx == 2:
+                                                    menu_category = "副菜"
+                                                elif idx == 3:
+                                                    menu_category = "汁物"
+                                                elif idx == 4:
+                                                    menu_category = "デザート"
+                                                else:
+                                                    menu_category = "その他"
+                                                
+                                                week_excel_data["メニュー区分"].append(menu_category)
+                                                week_excel_data["料理名"].append(item_name)
+                                                
+                                                # 食材情報があれば表示
+                                                if item_name in meal_ingredients:
+                                                    ingredient_info = meal_ingredients[item_name]
                                                     
-                                                    # Excel用データに追加
-                                                    # 日付, 食事区分, メニュー区分, 料理名, 1人分量, 全体量
-                                                    week_excel_data["日付"].append(date_display)
-                                                    week_excel_data["食事区分"].append(meal_type)
+                                                    # データフレームで食材情報を表示
+                                                    ingredients_data = {
+                                                        "食材名": [],
+                                                        "1人分量": [],
+                                                        f"{person_count}人分量": []
+                                                    }
                                                     
-                                                    # メニュー区分を決定（順番に応じて）
-                                                    menu_category = ""
-                                                    if idx == 0:
-                                                        menu_category = "主食"
-                                                    elif idx == 1:
-                                                        menu_category = "主菜"
-                                                    elif idx == 2:
-                                                        menu_category = "副菜"
-                                                    elif idx == 3:
-                                                        menu_category = "汁物"
-                                                    elif idx == 4:
-                                                        menu_category = "デザート"
+                                                    # ingredient_infoがリストの場合とディクショナリの場合の両方に対応
+                                                    if isinstance(ingredient_info, dict):
+                                                        # 辞書の場合
+                                                        for ingredient, amount in ingredient_info.items():
+                                                            ingredients_data["食材名"].append(ingredient)
+                                                            ingredients_data["1人分量"].append(amount)
+                                                            
+                                                            # 人数分の計算
+                                                            try:
+                                                                # 数値部分と単位を分離
+                                                                import re
+                                                                match = re.match(r"([\d.]+)(\D+)", str(amount))
+                                                                if match:
+                                                                    value, unit = match.groups()
+                                                                    total = float(value) * person_count
+                                                                    total_amount = f"{total}{unit}"
+                                                                else:
+                                                                    total_amount = f"{amount}×{person_count}"
+                                                            except:
+                                                                total_amount = f"{amount}×{person_count}"
+                                                                
+                                                            ingredients_data[f"{person_count}人分量"].append(total_amount)
                                                     else:
-                                                        menu_category = "その他"
+                                                        # リストの場合
+                                                        for ingredient in ingredient_info:
+                                                            ingredients_data["食材名"].append(ingredient)
+                                                            ingredients_data["1人分量"].append("適量")
+                                                            ingredients_data[f"{person_count}人分量"].append("適量")
                                                     
-                                                    week_excel_data["メニュー区分"].append(menu_category)
-                                                    week_excel_data["料理名"].append(item_name)
+                                                    # 食材テーブルを表示
+                                                    st.table(pd.DataFrame(ingredients_data))
                                                     
-                                                    # 食材情報があれば表示
-                                                    if item_name in meal_ingredients:
-                                                        ingredient_info = meal_ingredients[item_name]
-                                                        
-                                                        # データフレームで食材情報を表示
-                                                        ingredients_data = {
-                                                            "食材名": [],
-                                                            "1人分量": [],
-                                                            f"{person_count}人分量": []
-                                                        }
-                                                        
-                                                        # ingredient_infoがリストの場合とディクショナリの場合の両方に対応
-                                                        if isinstance(ingredient_info, dict):
-                                                            # 辞書の場合
-                                                            for ingredient, amount in ingredient_info.items():
-                                                                ingredients_data["食材名"].append(ingredient)
-                                                                ingredients_data["1人分量"].append(amount)
-                                                                
-                                                                # 人数分の計算
-                                                                try:
-                                                                    # 数値部分と単位を分離
-                                                                    import re
-                                                                    match = re.match(r"([\d.]+)(\D+)", str(amount))
-                                                                    if match:
-                                                                        value, unit = match.groups()
-                                                                        total = float(value) * person_count
-                                                                        total_amount = f"{total}{unit}"
-                                                                    else:
-                                                                        total_amount = f"{amount}×{person_count}"
-                                                                except:
-                                                                    total_amount = f"{amount}×{person_count}"
-                                                                    
-                                                                ingredients_data[f"{person_count}人分量"].append(total_amount)
-                                                        else:
-                                                            # リストの場合
-                                                            for ingredient in ingredient_info:
-                                                                ingredients_data["食材名"].append(ingredient)
-                                                                ingredients_data["1人分量"].append("適量")
-                                                                ingredients_data[f"{person_count}人分量"].append("適量")
-                                                        
-                                                        # 食材テーブルを表示
-                                                        st.table(pd.DataFrame(ingredients_data))
-                                                        
-                                                        # Excel用データに追加
-                                                        if isinstance(ingredient_info, dict):
-                                                            one_person = ", ".join([f"{ing}: {amt}" for ing, amt in ingredient_info.items()])
-                                                            all_persons = ", ".join([f"{ing}: {amt}×{person_count}" for ing, amt in ingredient_info.items()])
-                                                        else:
-                                                            one_person = ", ".join([f"{ing}: 適量" for ing in ingredient_info])
-                                                            all_persons = ", ".join([f"{ing}: 適量" for ing in ingredient_info])
-                                                        
-                                                        week_excel_data["1人分量"].append(one_person)
-                                                        week_excel_data[f"{person_count}人分量"].append(all_persons)
+                                                    # Excel用データに追加
+                                                    if isinstance(ingredient_info, dict):
+                                                        one_person = ", ".join([f"{ing}: {amt}" for ing, amt in ingredient_info.items()])
+                                                        all_persons = ", ".join([f"{ing}: {amt}×{person_count}" for ing, amt in ingredient_info.items()])
                                                     else:
-                                                        # 食材情報がない場合は空欄
-                                                        week_excel_data["1人分量"].append("")
-                                                        week_excel_data[f"{person_count}人分量"].append("")
-                                        
-                                        # 栄養情報も表示
-                                        st.write("### 栄養情報")
-                                        nutrition = day_menu.get("nutrition", {})
-                                        nutrition_data = {
-                                            "栄養素": list(nutrition.keys()),
-                                            "1人分": list(nutrition.values()),
-                                            f"{person_count}人分": [f"{value}×{person_count}" for value in nutrition.values()]
-                                        }
-                                        st.table(pd.DataFrame(nutrition_data))
-                                    else:
-                                        st.write("この日の献立情報はありません")
-                            
-                            # 週ごとのデータをリストに追加
-                            all_excel_data.append(pd.DataFrame(week_excel_data))
+                                                        one_person = ", ".join([f"{ing}: 適量" for ing in ingredient_info])
+                                                        all_persons = ", ".join([f"{ing}: 適量" for ing in ingredient_info])
+                                                    
+                                                    week_excel_data["1人分量"].append(one_person)
+                                                    week_excel_data[f"{person_count}人分量"].append(all_persons)
+                                                else:
+                                                    # 食材情報がない場合は空欄
+                                                    week_excel_data["1人分量"].append("")
+                                                    week_excel_data[f"{person_count}人分量"].append("")
+                                    
+                                    # 栄養情報も表示
+                                    st.write("### 栄養情報")
+                                    nutrition = day_menu.get("nutrition", {})
+                                    nutrition_data = {
+                                        "栄養素": list(nutrition.keys()),
+                                        "1人分": list(nutrition.values()),
+                                        f"{person_count}人分": [f"{value}×{person_count}" for value in nutrition.values()]
+                                    }
+                                    st.table(pd.DataFrame(nutrition_data))
+                                else:
+                                    st.write("この日の献立情報はありません")
+                        
+                        # 週ごとのデータをリストに追加
+                        all_excel_data.append(pd.DataFrame(week_excel_data))
+                
+                # 全てのデータを結合
+                final_excel_df = pd.concat(all_excel_data, ignore_index=True)
+                
+                # エクスポートオプション
+                st.write(f"### 献立のエクスポート ({selected_weeks}週間分)")
+                
+                try:
+                    # メンテナンスのためのデバッグ出力
+                    print("ピボットテーブル処理を開始します")
+                    print(f"元データのカラム: {final_excel_df.columns.tolist()}")
                     
-                    # 全てのデータを結合
-                    final_excel_df = pd.concat(all_excel_data, ignore_index=True)
+                    # ピボットテーブル処理 - データ変換
+                    # 「項目」列を作成し、「日付」「食事区分」「メニュー区分」「料理名」を項目として使用
+                    pivoted_df = final_excel_df.copy()
                     
-                    # エクスポートオプション
-                    st.write(f"### 献立のエクスポート ({selected_weeks}週間分)")
+                    # データの整合性チェック
+                    required_columns = ['日付', '食事区分', 'メニュー区分', '料理名']
+                    missing_columns = [col for col in required_columns if col not in pivoted_df.columns]
+                    if missing_columns:
+                        raise ValueError(f"必要なカラムがありません: {missing_columns}")
+                        
+                    # 文字列データの確認と変換
+                    for col in required_columns:
+                        pivoted_df[col] = pivoted_df[col].astype(str)
+                    
+                    # 一度UniqueなIDを作成して、同じ日付の異なるメニューを区別する
+                    pivoted_df['unique_id'] = pivoted_df['日付'] + '_' + pivoted_df['食事区分'] + '_' + pivoted_df['メニュー区分'] + '_' + pivoted_df['料理名']
+                    
+                    # 「項目」列を作成し、メニュー区分と料理名を結合
+                    pivoted_df['項目'] = pivoted_df['メニュー区分'] + '：' + pivoted_df['料理名']
+                    
+                    # 食事区分を項目に追加（朝食/昼食/夕食を明確にする）
+                    pivoted_df['項目'] = pivoted_df['食事区分'] + '：' + pivoted_df['項目']
                     
+                    print("ピボット処理準備完了")
+                    print(f"項目列サンプル: {pivoted_df['項目'].head().tolist()}")
+                    
+                    # ピボットテーブルを作成（項目を行、日付を列に変換）
                     try:
-                        # メンテナンスのためのデバッグ出力
-                        print("ピボットテーブル処理を開始します")
-                        print(f"元データのカラム: {final_excel_df.columns.tolist()}")
-                        
-                        # ピボットテーブル処理 - データ変換
-                        # 「項目」列を作成し、「日付」「食事区分」「メニュー区分」「料理名」を項目として使用
-                        pivoted_df = final_excel_df.copy()
-                        
-                        # データの整合性チェック
-                        required_columns = ['日付', '食事区分', 'メニュー区分', '料理名']
-                        missing_columns = [col for col in required_columns if col not in pivoted_df.columns]
-                        if missing_columns:
-                            raise ValueError(f"必要なカラムがありません: {missing_columns}")
+                        # 値がない場合の処理
+                        if '1人分量' not in pivoted_df.columns:
+                            pivoted_df['1人分量'] = "情報なし"
                             
-                        # 文字列データの確認と変換
-                        for col in required_columns:
-                            pivoted_df[col] = pivoted_df[col].astype(str)
+                        pivot_table = pd.pivot_table(
+                            pivoted_df, 
+                            values='1人分量',  # 1人分量を値として使用
+                            index=['項目'],     # 項目を行インデックスに
+                            columns=['日付'],   # 日付を列に
+                            aggfunc='first'    # 同じ項目×日付の組み合わせは最初の値を使用
+                        )
+                        print("ピボットテーブル作成完了")
                         
-                        # 一度UniqueなIDを作成して、同じ日付の異なるメニューを区別する
-                        pivoted_df['unique_id'] = pivoted_df['日付'] + '_' + pivoted_df['食事区分'] + '_' + pivoted_df['メニュー区分'] + '_' + pivoted_df['料理名']
+                        # NaN値を空文字に置換
+                        pivot_table = pivot_table.fillna('')
                         
-                        # 「項目」列を作成し、メニュー区分と料理名を結合
-                        pivoted_df['項目'] = pivoted_df['メニュー区分'] + '：' + pivoted_df['料理名']
+                        # 項目を明示的に列として扱う（existing code と同じ形式に）
+                        reset_df = pivot_table.reset_index()
+                        reset_df = reset_df.rename(columns={'index': '項目'})
                         
-                        # 食事区分を項目に追加（朝食/昼食/夕食を明確にする）
-                        pivoted_df['項目'] = pivoted_df['食事区分'] + '：' + pivoted_df['項目']
+                        # 最終的なデータフレームを「項目」列をインデックスとして設定
+                        final_formatted_df = reset_df.set_index('項目')
                         
-                        print("ピボット処理準備完了")
-                        print(f"項目列サンプル: {pivoted_df['項目'].head().tolist()}")
+                        print("ピボットテーブル処理完了")
+                    except Exception as pivot_err:
+                        st.error(f"データのピボット処理中にエラーが発生しました: {str(pivot_err)}")
+                        print(f"ピボット処理エラー詳細: {pivot_err}")
+                        # シンプルな代替表示を使用
+                        st.write("正規形式での表示に切り替えます")
                         
-                        # ピボットテーブルを作成（項目を行、日付を列に変換）
-                        try:
-                            # 値がない場合の処理
-                            if '1人分量' not in pivoted_df.columns:
-                                pivoted_df['1人分量'] = "情報なし"
-                                
-                            pivot_table = pd.pivot_table(
-                                pivoted_df, 
-                                values='1人分量',  # 1人分量を値として使用
-                                index=['項目'],     # 項目を行インデックスに
-                                columns=['日付'],   # 日付を列に
-                                aggfunc='first'    # 同じ項目×日付の組み合わせは最初の値を使用
-                            )
-                            print("ピボットテーブル作成完了")
-                            
-                            # NaN値を空文字に置換
-                            pivot_table = pivot_table.fillna('')
-                            
-                            # 項目を明示的に列として扱う（existing code と同じ形式に）
-                            reset_df = pivot_table.reset_index()
-                            reset_df = reset_df.rename(columns={'index': '項目'})
-                            
-                            # 最終的なデータフレームを「項目」列をインデックスとして設定
-                            final_formatted_df = reset_df.set_index('項目')
-                            
-                            print("ピボットテーブル処理完了")
-                        except Exception as pivot_err:
-                            st.error(f"データのピボット処理中にエラーが発生しました: {str(pivot_err)}")
-                            print(f"ピボット処理エラー詳細: {pivot_err}")
-                            # シンプルな代替表示を使用
-                            st.write("正規形式での表示に切り替えます")
-                            
-                            # シンプルな形式の表に変換 (ピボットテーブルを使わない)
-                            final_formatted_df = pivoted_df[['項目', '日付', '1人分量']].set_index('項目')
-                    except Exception as data_err:
-                        st.error(f"データ形式の変換中にエラーが発生しました: {str(data_err)}")
-                        print(f"データ変換エラー詳細: {data_err}")
-                        # 最もシンプルな形式で表示
-                        st.dataframe(final_excel_df)
-                        # 元のデータを使用
-                        final_formatted_df = final_excel_df
+                        # シンプルな形式の表に変換 (ピボットテーブルを使わない)
+                        final_formatted_df = pivoted_df[['項目', '日付', '1人分量']].set_index('項目')
+                except Exception as data_err:
+                    st.error(f"データ形式の変換中にエラーが発生しました: {str(data_err)}")
+                    print(f"データ変換エラー詳細: {data_err}")
+                    # 最もシンプルな形式で表示
+                    st.dataframe(final_excel_df)
+                    # 元のデータを使用
+                    final_formatted_df = final_excel_df
+                
+                # Excelファイルの作成
+                output = io.BytesIO()
+                try:
+                    # デバッグメッセージ
+                    print("Excel出力処理を開始します")
+                    
+                    # 出力するデータの確認
+                    print(f"データ形式: {type(final_formatted_df)}")
+                    print(f"列数: {len(final_formatted_df.columns)}")
+                    print(f"行数: {len(final_formatted_df)}")
+                    
+                    # まずxlsxwriterでの出力を試みる（列幅はまとめて計算し、1行ずつ書き出す）
+                    print("xlsxwriterエンジンで出力を試みます")
+                    write_menu_dataframe(output, final_formatted_df,
+                                         index_label=final_formatted_df.index.name or '')
+                    print("xlsxwriterでの出力完了")
+                
+                except Exception as e:
+                    # xlsxwriterが利用できない場合はopenpyxlにフォールバック
+                    print(f"xlsxwriterでの書き出しに失敗しました: {str(e)}")
+                    print("openpyxlエンジンを使用します")
                     
-                    # Excelファイルの作成
+                    # 新しいメモリストリームを作成（前のは使い切っている可能性がある）
                     output = io.BytesIO()
+                    
                     try:
-                        # デバッグメッセージ
-                        print("Excel出力処理を開始します")
-                        
-                        # 出力するデータの確認
-                        print(f"データ形式: {type(final_formatted_df)}")
-                        print(f"列数: {len(final_formatted_df.columns)}")
-                        print(f"行数: {len(final_formatted_df)}")
-                        
-                        # まずxlsxwriterでの出力を試みる（書式設定が容易）
-                        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                            print("xlsxwriterエンジンで出力を試みます")
+                        with pd.ExcelWriter(output, engine='openpyxl') as writer:
                             # 既存献立の管理と同じ形式で出力
                             final_formatted_df.to_excel(writer, sheet_name='Sheet1', index=True)
                             
-                            # 書式設定
+                            # openpyxlでの書式設定
                             workbook = writer.book
                             worksheet = writer.sheets['Sheet1']
                             
-                            # セル書式
-                            print("セル書式の設定を行います")
-                            cell_format = workbook.add_format({
-                                'font_size': 8,
-                                'font_name': 'MS Gothic',
-                                'text_wrap': True,
-                                'align': 'left',
-                                'valign': 'top'
-                            })
+                            # openpyxlでの列幅調整
+                            widths = [column_width(final_formatted_df.index.name or 'index',
+                                                   final_formatted_df.index.astype(str), split_lines=False)]
+                            widths += [column_width(col, final_formatted_df[col]) for col in final_formatted_df.columns]
+                            for col_num, width in enumerate(widths):
+                                # openpyxlでの列幅設定（インデックスが0から始まる）
+                                col_letter = worksheet.cell(row=1, column=col_num+1).column_letter
+                                worksheet.column_dimensions[col_letter].width = width
                             
-                            # 列幅調整と書式適用
-                            print("列幅の調整を行います")
-                            for col_num, col in enumerate(final_formatted_df.reset_index().columns):
-                                # 列幅を計算（文字数に基づく）
-                                max_width = len(str(col)) * 1.2  # ヘッダー幅
+                            try:
+                                # openpyxlでのフォント設定 (全セルに適用)
+                                from openpyxl.styles import Font, Alignment
+                                font = Font(name='MS Gothic', size=8)
+                                alignment = Alignment(horizontal='left', vertical='top', wrap_text=True)
                                 
-                                if col_num == 0:  # インデックス列（項目）
-                                    for cell in final_formatted_df.index.astype(str):
-                                        width = len(cell) * 1.1
-                                        max_width = max(max_width, width)
-                                else:  # データ列
-                                    try:
-                                        col_name = final_formatted_df.columns[col_num-1]
-                                        for cell in final_formatted_df[col_name].astype(str):
-                                            lines = cell.split('\n')
-                                            for line in lines:
-                                                width = len(line) * 1.1
-                                                max_width = max(max_width, width)
-                                    except Exception as e:
-                                        print(f"列処理中にエラー発生: {e}")
-                                
-                                # 幅を制限（10～50の範囲）
-                                column_width = max(10, min(max_width, 50))
-                                worksheet.set_column(col_num, col_num, column_width)
-                            
-                            # 全セルに書式を適用
-                            print("セルに書式を適用します")
-                            for row in range(len(final_formatted_df) + 1):
-                                worksheet.set_row(row, None, cell_format)
+                                # ヘッダー行を含めた全行、全列のループ
+                                for row in worksheet.iter_rows():
+                                    for cell in row:
+                                        cell.font = font
+                                        cell.alignment = alignment
+                            except Exception as style_err:
+                                print(f"セルスタイル適用中にエラーが発生しました: {str(style_err)}")
+                                # スタイル適用に失敗しても処理を続行
                             
-                            print("xlsxwriterでの出力完了")
-                    
-                    except Exception as e:
-                        # xlsxwriterが利用できない場合はopenpyxlにフォールバック
-                        print(f"xlsxwriterでの書き出しに失敗しました: {str(e)}")
-                        print("openpyxlエンジンを使用します")
-                        
-                        # 新しいメモリストリームを作成（前のは使い切っている可能性がある）
+                            print("openpyxlでの出力完了")
+                    except Exception as openpyxl_err:
+                        print(f"openpyxlでの書き出しにも失敗しました: {str(openpyxl_err)}")
+                        # 最後の手段として、スタイルなしで出力を試みる
                         output = io.BytesIO()
-                        
-                        try:
-                            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                                # 既存献立の管理と同じ形式で出力
-                                final_formatted_df.to_excel(writer, sheet_name='Sheet1', index=True)
-                                
-                                # openpyxlでの書式設定
-                                workbook = writer.book
-                                worksheet = writer.sheets['Sheet1']
-                                
-                                # openpyxlでの列幅調整
-                                for col_num, col in enumerate(final_formatted_df.reset_index().columns):
-                                    # 列幅を計算（文字数に基づく）
-                                    max_width = len(str(col)) * 1.2  # ヘッダー幅
-                                    
-                                    if col_num == 0:  # インデックス列（項目）
-                                        for cell in final_formatted_df.index.astype(str):
-                                            width = len(cell) * 1.1
-                                            max_width = max(max_width, width)
-                                    else:  # データ列
-                                        try:
-                                            col_name = final_formatted_df.columns[col_num-1]
-                                            for cell in final_formatted_df[col_name].astype(str):
-                                                lines = cell.split('\n')
-                                                for line in lines:
-                                                    width = len(line) * 1.1
-                                                    max_width = max(max_width, width)
-                                        except Exception as e:
-                                            print(f"列処理中にエラー発生: {e}")
-                                    
-                                    # 幅を制限（10～50の範囲）
-                                    column_width = max(10, min(max_width, 50))
-                                    
-                                    # openpyxlでの列幅設定（インデックスが0から始まる）
-                                    col_letter = worksheet.cell(row=1, column=col_num+1).column_letter
-                                    worksheet.column_dimensions[col_letter].width = column_width
-                                
-                                try:
-                                    # openpyxlでのフォント設定 (全セルに適用)
-                                    from openpyxl.styles import Font, Alignment
-                                    font = Font(name='MS Gothic', size=8)
-                                    alignment = Alignment(horizontal='left', vertical='top', wrap_text=True)
-                                    
-                                    # ヘッダー行を含めた全行、全列のループ
-                                    for row in worksheet.iter_rows():
-                                        for cell in row:
-                                            cell.font = font
-                                            cell.alignment = alignment
-                                except Exception as style_err:
-                                    print(f"セルスタイル適用中にエラーが発生しました: {str(style_err)}")
-                                    # スタイル適用に失敗しても処理を続行
-                                
-                                print("openpyxlでの出力完了")
-                        except Exception as openpyxl_err:
-                            print(f"openpyxlでの書き出しにも失敗しました: {str(openpyxl_err)}")
-                            # 最後の手段として、スタイルなしで出力を試みる
-                            output = io.BytesIO()
-                            final_formatted_df.to_excel(output, index=True)
-                            print("スタイルなしでの出力完了")
+                        final_formatted_df.to_excel(output, index=True)
+                        print("スタイルなしでの出力完了")
+                
+                # 最終的なダウンロードボタン（いずれの方法でも成功した場合）
+                try:
+                    download_button = st.download_button(
+                        label=f"{selected_weeks}週間分の献立をExcelでダウンロード",
+                        data=output.getvalue(),
+                        file_name=f"menu_{selected_weeks}w_{start_date.strftime('%Y%m%d')}.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
                     
-                    # 最終的なダウンロードボタン（いずれの方法でも成功した場合）
-                    try:
-                        download_button = st.download_button(
-                            label=f"{selected_weeks}週間分の献立をExcelでダウンロード",
-                            data=output.getvalue(),
-                            file_name=f"menu_{selected_weeks}w_{start_date.strftime('%Y%m%d')}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-                        
-                        if download_button:
-                            st.balloons()
-                    except Exception as download_err:
-                        st.error(f"ダウンロードボタンの作成に失敗しました: {str(download_err)}")
-                        # 代替のダウンロード方法を提供
-                        st.write("ダウンロードボタンの生成に失敗しました。別の方法でダウンロードしてください。")
-
-            except Exception as e:
-                st.error(f"献立生成中にエラーが発生しました: {str(e)}")
-                import traceback
-                st.error(traceback.format_exc())
+                    if download_button:
+                        st.balloons()
+                except Exception as download_err:
+                    st.error(f"ダウンロードボタンの作成に失敗しました: {str(download_err)}")
+                    # 代替のダウンロード方法を提供
+                    st.write("ダウンロードボタンの生成に失敗しました。別の方法でダウンロードしてください。")
+
+        except Exception as e:
+            st.error(f"献立生成中にエラーが発生しました: {str(e)}")
+            import traceback
+            st.error(traceback.format_exc())
 
 # サイドバーの機能説明
 st.sidebar.write("""
@@ -787,6 +975,20 @@ st.sidebar.write("""
 - 様々な食事パターンや好みに対応
 """)
 
+# キャッシュの管理（管理者向け）
+with st.sidebar:
+    with st.expander("キャッシュ管理（管理者向け）"):
+        st.write(f"処理結果は最大{RESULT_CACHE_MAX_ENTRIES}件、ワークブックの解析結果は最大{WORKBOOK_CACHE_MAX_ENTRIES}件を"
+                 f"{CACHE_TTL_SECONDS // 60}分間保持します。")
+        if os.getenv(ADMIN_PASSWORD_ENV):
+            st.text_input("管理者パスワード", type="password", key="admin_password")
+        if st.button("キャッシュをクリア", key="clear_caches", disabled=not is_admin()):
+            clear_caches()
+            st.success("キャッシュをクリアしました")
+        st.checkbox("処理をプロファイルする", key="profile_jobs", disabled=not is_admin(),
+                    help="チェック中に実行した処理の関数ごとの処理時間をHTMLで保存します（キャッシュは使いません）。"
+                         "結果の下と「処理時間」タブからダウンロードできます。")
+
 # 区切り線で明確に分離
 st.markdown("---")
 
@@ -820,7 +1022,7 @@ def get_nutritionist_response(prompt, message_history):
         import traceback
         
         genai.configure(api_key=GOOGLE_API_KEY)
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_model('gemini-1.5-flash')
         
         try:
             response = model.generate_content(
@@ -987,6 +1189,7 @@ with tab3:
     order_file = st.file_uploader("メニューファイルを選択してください", type=['xlsx', 'png', 'jpg', 'jpeg'], key="order_file")
     
     if order_file is not None:
+        clear_jobs_for_new_upload("order_file", order_file, ["order", "order_batch"])
         try:
             # ファイルの種類を確認
             file_ext = Path(order_file.name).suffix.lower()
@@ -1001,54 +1204,125 @@ with tab3:
             
             # 人数の入力
             person_count = st.number_input("何人分の発注書を作成しますか？", min_value=1, max_value=100, value=45, key="order_person_count")
+
+            # 食事ごとに人数が異なる場合
+            if st.checkbox("食事ごとに人数を指定する", key="order_per_meal"):
+                meal_columns = st.columns(3)
+                person_count = {
+                    meal_type: column.number_input(f"{meal_type}の人数", min_value=0, max_value=100,
+                                                   value=int(st.session_state.get("order_person_count", 45)),
+                                                   key=f"order_person_count_{meal_type}")
+                    for meal_type, column in zip(["朝食", "昼食", "夕食"], meal_columns)
+                }
+
+            # 発注合計の納品間隔
+            window_options = {"2日ごと": 2, "1週間ごと": 7}
+            window_label = st.selectbox("発注合計の納品間隔", list(window_options), key="order_window")
             
             if st.button("発注書を作成", key="create_order"):
-                with st.spinner("発注書を作成中..."):
-                    try:
-                        # 一時ファイルとして保存
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp_input:
-                            tmp_input.write(order_file.getvalue())
-                            input_path = tmp_input.name
-                        
-                        # 発注書の出力先を設定
-                        output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx').name
-                        
-                        # 発注書を作成
-                        order_file_path = create_order_sheets(
-                            input_path, 
-                            output_path, 
-                            person_count=person_count, 
-                            destination=destination
-                        )
-                        
-                        if order_file_path:
-                            # 出力ファイルをダウンロード用に読み込む
-                            with open(order_file_path, "rb") as file:
-                                output_data = file.read()
-                            
-                            # 一時ファイルを削除
-                            os.unlink(input_path)
-                            
-                            # ダウンロードボタンを表示
-                            now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                            st.download_button(
-                                label="発注書をダウンロード",
-                                data=output_data,
-                                file_name=f"発注書_{destination}_{now}.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                            )
-                            
-                            # 成功メッセージを表示
-                            st.success(f"{destination}向けの発注書を作成しました。")
-                        else:
-                            st.error("発注書の作成に失敗しました。")
-                    
-                    except Exception as e:
-                        import traceback
-                        print("=== 発注書作成エラー詳細 ===")
-                        print(e)
-                        traceback.print_exc()
-                        raise  # これでエラーが必ず画面に出る
+                # 発注書を作成（入力・出力ともメモリ上で処理）
+                order_data = order_file.getvalue()
+                order_params = {
+                    "person_count": person_count,
+                    "destination": destination,
+                    "window_days": window_options[window_label]
+                }
+                run = job_function(run_order_sheets)
+                submit_job("order", "order_sheets",
+                           lambda progress: run(order_data, order_params),
+                           order_data, order_params)
+                st.session_state.order_done_destination = destination
+            
+            order_job = job_result("order", "発注書を作成中")
+            if order_job is not None:
+                done_destination = st.session_state.get("order_done_destination", destination)
+                
+                # ダウンロードボタンを表示
+                now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+                st.download_button(
+                    label="発注書をダウンロード",
+                    data=order_job.result,
+                    file_name=f"発注書_{done_destination}_{now}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+                
+                # 成功メッセージを表示
+                st.success(f"{done_destination}向けの発注書を作成しました。")
+
+            # 全ての送り先の発注書をまとめて作成（献立表の読み込みは1回）
+            if st.button("全送り先の発注書をまとめて作成（ZIP）", key="create_order_batch"):
+                order_data = order_file.getvalue()
+                order_specs = [
+                    {"destination": order_destination, "person_count": person_count,
+                     "window_days": window_options[window_label]}
+                    for order_destination in ["宝成", "豊中"]
+                ]
+                run = job_function(run_order_sheets_batch)
+                submit_job("order_batch", "order_sheets_batch",
+                           lambda progress: run(order_data, order_specs),
+                           order_data, order_specs)
+            
+            order_batch_job = job_result("order_batch", "発注書をまとめて作成中")
+            if order_batch_job is not None:
+                now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+                st.download_button(
+                    label="発注書（ZIP）をダウンロード",
+                    data=order_batch_job.result,
+                    file_name=f"発注書_{now}.zip",
+                    mime="application/zip"
+                )
+                st.success("発注書をまとめて作成しました。")
         
         except Exception as e:
-            st.error(f"処理中にエラーが発生しました: {str(e)}") 
\ No newline at end of file
+            st.error(f"処理中にエラーが発生しました: {str(e)}")
+
+# 処理時間のウォーターフォール（管理者向け）
+with tab4:
+    st.header("処理時間（管理者向け）")
+    if not is_admin():
+        st.info("サイドバーの「キャッシュ管理（管理者向け）」で管理者パスワードを入力してください。")
+    else:
+        traces = recent_traces(limit=TRACE_LIST_LIMIT)
+        if not traces:
+            st.info("記録された処理はまだありません。")
+        else:
+            trace_labels = {
+                f"{datetime.datetime.fromtimestamp(trace.start_time):%m/%d %H:%M:%S} {trace.name}"
+                f"（{trace.duration_ms / 1000:.2f}秒、{trace.span_count}区間{'、エラー' if trace.status == 'error' else ''}）": trace.trace_id
+                for trace in traces
+            }
+            selected_trace = st.selectbox("処理を選択", list(trace_labels), key="trace_select")
+            waterfall_df = pd.DataFrame(waterfall_rows(load_trace(trace_labels[selected_trace])))
+            waterfall_df["label"] = [
+                f"{row.order + 1}. {'　' * row.depth}{row.name}" for row in waterfall_df.itertuples()
+            ]
+            chart = alt.Chart(waterfall_df).mark_bar().encode(
+                x=alt.X("start_ms:Q", title="開始からの経過時間（ミリ秒）"),
+                x2="end_ms:Q",
+                y=alt.Y("label:N", sort=None, title=None),
+                color=alt.Color("status:N", scale=alt.Scale(domain=["ok", "error"], range=["#4c78a8", "#e45756"]),
+                                legend=None),
+                tooltip=["name", "duration_ms", "attributes", "error"],
+            )
+            st.altair_chart(chart, use_container_width=True)
+            st.dataframe(
+                waterfall_df[["label", "start_ms", "duration_ms", "status", "attributes", "error"]],
+                hide_index=True, use_container_width=True
+            )
+
+        # 保存済みのプロファイル（サイドバーのチェックボックスまたはURLの ?profile=1 で記録）
+        st.subheader("プロファイル")
+        reports = recent_reports(limit=PROFILE_LIST_LIMIT)
+        if not reports:
+            st.info("保存されたプロファイルはまだありません。")
+        else:
+            report_labels = {
+                f"{datetime.datetime.fromtimestamp(report.created):%m/%d %H:%M:%S} {report.name}"
+                f"（{report.size / 1024:.0f}KB）": report.path
+                for report in reports
+            }
+            selected_report = st.selectbox("プロファイルを選択", list(report_labels), key="profile_select")
+            profile_download_button(report_labels[selected_report], key="profile_download_selected")
+
+# 実行中のジョブがあれば進捗を更新する
+rerun_while_jobs_running()
@@ -0,0 +1,31 @@
+"""
+処理時間のベンチマーク
+
+    cd src
+    python -m benchmarks                      # 全段階を計測し、baseline.json と比較する
+    python -m benchmarks --days 60 --rows 80  # ワークブックの大きさを変えて計測する
+    python -m benchmarks --update-baseline    # 計測結果を基準値として保存する
+    python -m benchmarks.loadtest --users 8 --duration 60 --llm-latency 2  # 同時利用者数を変えて負荷をかける
+
+- workbook: 「X月Y日(曜)」のシートを持つ献立表を、日数・1シートの行数・食材の種類数を指定して生成する
+- llm_stub: LLMの代わりに固定の応答を返すモデル（応答時間を指定できる）
+- runner: 段階ごと（読み込み・シート解析・栄養価計算・並び替え・Excel書き出し・画像描画・発注書）に計測し、
+  基準値より遅くなった段階があれば終了コード1を返す（CIで性能の劣化を検出する）
+- loadtest: アプリと同じジョブキューに複数の利用者の処理を同時に投入し、操作ごとの応答時間の
+  パーセンタイル（p50/p95/p99）とスループットを求める（1台のLinux上でネットワークなしで動く）
+"""
+import os
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+# 計測中はトレース・献立の履歴を保存せず、ログも警告以上だけにする（環境変数で指定した場合はそれに従う）。
+# LLMの応答キャッシュ・レート制限・出力ファイルの自動オープンは計測に含めない
+os.environ.setdefault('MENU_TRACING', '0')
+os.environ.setdefault('MENU_HISTORY', '0')
+os.environ.setdefault('MENU_LOG_LEVEL', 'WARNING')
+for name in ('MENU_LLM_CACHE', 'MENU_LLM_RPM', 'MENU_AUTO_OPEN'):
+    os.environ.pop(name, None)
@@ -0,0 +1,95 @@
+"""
+ベンチマーク用のLLMの代わり（固定の応答を返すモデル）
+
+    install(latency=0.5)  # 以後 menu_updater の get_model はこのモデルを返す
+
+generate_content は latency 秒（jitter を指定した場合はその幅でばらつかせる）待ってから、
+プロンプトの形式に合った応答を返す（デザートの一括生成ではメニューの数だけデザートを返し、
+並び替えでは日付を逆順にしたJSONを、献立生成では指定された日付ごとの献立のJSONを返す）。
+APIキーやネットワークは使わない。
+"""
+import json
+import random
+import re
+import time
+from typing import NamedTuple
+
+DESSERT_TEXT = "フルーツ寒天\n\n材料:\n  - 粉寒天: 1g/45g\n  - みかん缶: 20g/900g\n  - 砂糖: 5g/225g"
+
+# 献立生成の応答に使う料理（日ごとにずらして組み合わせる）
+WEEKLY_DISHES = {
+    '朝食': [("米飯", {"米": "80g"}), ("味噌汁", {"豆腐": "30g", "味噌": "7g"}), ("焼き鮭", {"鮭": "60g"}),
+           ("だし巻き卵", {"卵": "50g", "だし": "10ml"}), ("納豆", {"納豆": "40g"})],
+    '昼食': [("うどん", {"ゆでうどん": "200g", "だし": "250ml"}), ("鶏の照り焼き", {"鶏もも肉": "60g", "醤油": "5g"}),
+           ("ほうれん草のおひたし", {"ほうれん草": "50g"}), ("肉じゃが", {"じゃがいも": "60g", "牛肉": "30g"}),
+           ("サラダ", {"レタス": "20g", "トマト": "30g"})],
+    '夕食': [("麦飯", {"米": "70g", "麦": "10g"}), ("さばの味噌煮", {"さば": "60g", "味噌": "8g"}),
+           ("筑前煮", {"鶏もも肉": "30g", "ごぼう": "20g"}), ("すまし汁", {"豆腐": "20g", "だし": "100ml"}),
+           ("豚の生姜焼き", {"豚ロース": "60g", "しょうが": "2g"})],
+}
+WEEKLY_NUTRITION = {"カロリー": "1750kcal", "タンパク質": "72g", "脂質": "48g", "炭水化物": "235g", "塩分": "7.2g"}
+
+
+class StubUsage(NamedTuple):
+    prompt_token_count: int
+    candidates_token_count: int
+
+
+class StubResponse(NamedTuple):
+    """generate_content の応答と同じく text と usage_metadata を持つ"""
+    text: str
+    usage_metadata: StubUsage
+
+
+def default_response(prompt: str) -> str:
+    """プロンプトの形式に合った応答の本文"""
+    menu_count = len(re.findall(r'===== メニュー\d+:', prompt))
+    if menu_count:
+        return '\n'.join(f"===== デザート{i} =====\n{DESSERT_TEXT}\n" for i in range(1, menu_count + 1))
+    weekly_dates = re.search(r'日付は必ず(.+?)の形式', prompt)
+    if weekly_dates:
+        return f"```json\n{json.dumps(weekly_menu(weekly_dates.group(1).split(', ')), ensure_ascii=False)}\n```"
+    if 'reordered_dates' in prompt:
+        dates = list(dict.fromkeys(re.findall(r'"(\d+/\d+)": \{', prompt)))
+        answer = {'reordered_dates': dates[::-1], 'rationale': '同じ系統の料理が続かないように並び替えました。'}
+        return f"```json\n{json.dumps(answer, ensure_ascii=False)}\n```"
+    return DESSERT_TEXT
+
+
+def weekly_menu(dates) -> dict:
+    """献立生成の応答（日付ごとに料理の組み合わせを変えた3食分）"""
+    menu = {}
+    for day, date in enumerate(dates):
+        meals, ingredients = {}, {}
+        for meal_type, dishes in WEEKLY_DISHES.items():
+            chosen = [dishes[(day + offset) % len(dishes)] for offset in range(3)]
+            meals[meal_type] = [name for name, _ in chosen]
+            ingredients[meal_type] = dict(chosen)
+        menu[date] = {'meals': meals, 'ingredients': ingredients, 'nutrition': dict(WEEKLY_NUTRITION)}
+    return menu
+
+
+class StubModel:
+    """genai.GenerativeModel の代わり（generate_content だけを持つ）"""
+
+    def __init__(self, model_name: str = 'stub', latency: float = 0.0, responder=default_response,
+                 jitter: float = 0.0):
+        self.model_name = model_name
+        self.latency = latency
+        self.jitter = jitter
+        self.responder = responder
+
+    def generate_content(self, prompt: str) -> StubResponse:
+        delay = self.latency + random.uniform(-self.jitter, self.jitter) if self.jitter else self.latency
+        if delay > 0:
+            time.sleep(delay)
+        text = self.responder(prompt)
+        # トークン数はおおよそ（日本語は1文字1トークン程度）
+        return StubResponse(text, StubUsage(len(prompt), len(text)))
+
+
+def install(latency: float = 0.0, responder=default_response, jitter: float = 0.0):
+    """menu_updater がモデルを取得するときに StubModel を返すようにする"""
+    from menu_updater import configure_resource_loaders
+
+    configure_resource_loaders(model=lambda model_name: StubModel(model_name, latency, responder, jitter))
@@ -0,0 +1,299 @@
+"""
+アプリの同時利用の負荷試験
+
+    cd src
+    python -m benchmarks.loadtest --users 8 --duration 60 --llm-latency 2 --operation menu_output
+
+Streamlit アプリはボタンが押されると処理をジョブキュー（job_queue.JobQueue）に投入し、完了するまで
+状態を問い合わせる。このツールは仮想の利用者ごとにスレッドを立て、アプリのジョブと同じ処理を
+アプリと同じ設定（全体の同時実行数・1人あたりの同時実行数）のジョブキューに投入して、
+投入から完了までの時間（順番待ちを含む）を操作ごとに集計する。
+- LLMは llm_stub に置き換え、応答時間（--llm-latency）とそのばらつき（--llm-jitter）を指定できる
+- 利用者ごとに別の献立表（workbook.generate_workbook）を使う
+- アプリの st.cache_data による結果の再利用は含めない（毎回処理した場合の値になる）
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional
+
+from benchmarks import llm_stub
+from benchmarks.runner import DEFAULT_DAYS, DEFAULT_ROWS, rjust_display
+from benchmarks.workbook import generate_workbook
+
+# 並び替え・週間献立はAPIキーがないとLLMを呼ばないため、スタブ用の値を設定する（ネットワークは使わない）
+os.environ.setdefault('GOOGLE_API_KEY', 'loadtest-stub')
+
+DEFAULT_USERS = 4
+DEFAULT_DURATION = 30.0
+DEFAULT_LLM_LATENCY = 1.0
+DEFAULT_POLL_SECONDS = 0.1
+DEFAULT_OPERATIONS = ('menu_output', 'menu_image', 'weekly_menu', 'order_sheets')
+
+REORDER_PARAMS = {'reorder_type': '栄養バランス優先並び替え'}
+WEEKLY_PARAMS = {
+    'start_date': date(2025, 4, 7),
+    'meal_pattern': '一日3食（朝・昼・夕）',
+    'cuisine_preference': '和食中心',
+    'special_considerations': [],
+    'budget_per_meal': '200〜300円',
+    'person_count': 45,
+}
+ORDER_PARAMS = {'person_count': 45, 'destination': '宝成', 'window_days': 2}
+
+
+class UserInputs(NamedTuple):
+    """利用者ごとの入力（アップロードする献立表と、発注書の作成に使う出力済みの献立表）"""
+    workbook: bytes
+    menu_table: bytes
+
+
+class Sample(NamedTuple):
+    """1回の操作の結果"""
+    operation: str
+    user: int
+    submitted: float
+    finished: float
+    latency: float  # 投入から完了まで（秒）
+    wait: float  # 順番待ちの時間（秒）
+    status: str
+    error: str
+
+
+def _require(output, message: str):
+    if not output:
+        raise RuntimeError(message)
+    return output
+
+
+def run_operation(operation: str, inputs: UserInputs, progress=None):
+    """アプリのジョブと同じ処理を実行する（アプリの run_menu_output などに相当）"""
+    import menu_updater
+
+    if operation in ('menu_output', 'menu_image', 'menu_pdf'):
+        output_format = {'menu_output': 'xlsx', 'menu_image': 'png', 'menu_pdf': 'pdf'}[operation]
+        output = _require(menu_updater.update_menu_with_desserts(inputs.workbook, output_format=output_format,
+                                                                 progress=progress),
+                          "メニュー表の作成に失敗しました")
+        return [page.getvalue() for page in output] if output_format == 'png' else output.getvalue()
+    if operation == 'reorder_preview':
+        return menu_updater.preview_reordering(inputs.workbook, progress=progress, **REORDER_PARAMS)
+    if operation == 'reorder_save':
+        return menu_updater.update_menu_with_reordering(inputs.workbook, None, REORDER_PARAMS['reorder_type'],
+                                                        progress=progress).getvalue()
+    if operation == 'weekly_menu':
+        return menu_updater.generate_weekly_menu(7, WEEKLY_PARAMS, progress=progress)
+    if operation == 'order_sheets':
+        return _require(menu_updater.create_order_sheets(inputs.menu_table, **ORDER_PARAMS),
+                        "発注書の作成に失敗しました").getvalue()
+    if operation == 'order_sheets_batch':
+        specs = [dict(ORDER_PARAMS, destination=destination) for destination in ('宝成', '豊中')]
+        return _require(menu_updater.create_order_sheets_batch(inputs.menu_table, specs),
+                        "発注書の作成に失敗しました").getvalue()
+    raise ValueError(f"未対応の操作です: {operation}")
+
+
+OPERATIONS = ('menu_output', 'menu_image', 'menu_pdf', 'reorder_preview', 'reorder_save', 'weekly_menu',
+              'order_sheets', 'order_sheets_batch')
+
+
+def prepare_inputs(users: int, days: int = DEFAULT_DAYS, rows_per_sheet: int = DEFAULT_ROWS) -> List[UserInputs]:
+    """利用者ごとの献立表を生成する（LLMの応答時間を設定する前に呼ぶ）"""
+    import menu_updater
+
+    inputs = []
+    for user in range(users):
+        workbook = generate_workbook(days=days, rows_per_sheet=rows_per_sheet, seed=user)
+        inputs.append(UserInputs(workbook, menu_updater.update_menu_with_desserts(workbook).getvalue()))
+    return inputs
+
+
+def _job(operation: str, inputs: UserInputs, progress):
+    from progress import ProgressReporter
+
+    # アプリの job_reporter と同じく、段階ごとの進捗をジョブの進捗に流す
+    reporter = ProgressReporter(lambda event: progress(event.fraction, f"{event.stage} {event.completed}/{event.total}"))
+    result = run_operation(operation, inputs, reporter)
+    # 献立生成はエラー時もフォールバックの献立を返すため、LLMの応答を使わなかった場合はエラーとして数える
+    if operation == 'weekly_menu' and any(day.get('fallback') for day in result.values()):
+        raise RuntimeError("フォールバックの献立が返されました（LLMの応答を使用していません）")
+    return result
+
+
+def _virtual_user(user: int, queue, inputs: UserInputs, operations, deadline: float, iterations: Optional[int],
+                  think_time: float, poll_seconds: float, samples: List[Sample], lock: threading.Lock):
+    """1人の利用者として、操作を順に投入して完了を待つことを繰り返す"""
+    from job_queue import FAILED, job_key
+
+    owner = f"loadtest-{user}"
+    count = 0
+    while time.time() < deadline and (iterations is None or count < iterations):
+        operation = operations[(user + count) % len(operations)]
+        submitted = time.time()
+        job_id = queue.submit(operation, job_key(operation, owner, count, submitted),
+                              functools.partial(_job, operation, inputs), owner=owner)
+        job = queue.get(job_id, with_result=False)
+        while not job.finished:
+            time.sleep(poll_seconds)
+            job = queue.get(job_id, with_result=False)
+        sample = Sample(operation, user, submitted, job.finished_at, job.finished_at - submitted,
+                        (job.started_at or job.finished_at) - job.created_at,
+                        'error' if job.status == FAILED else 'ok', job.error or '')
+        with lock:
+            samples.append(sample)
+        count += 1
+        if think_time > 0:
+            time.sleep(think_time)
+
+
+def run_load_test(users: int = DEFAULT_USERS, duration: float = DEFAULT_DURATION, iterations: Optional[int] = None,
+                  operations=DEFAULT_OPERATIONS, llm_latency: float = DEFAULT_LLM_LATENCY, llm_jitter: float = 0.0,
+                  workers: Optional[int] = None, jobs_per_user: Optional[int] = None, ramp_up: float = 0.0,
+                  think_time: float = 0.0, days: int = DEFAULT_DAYS, rows_per_sheet: int = DEFAULT_ROWS,
+                  poll_seconds: float = DEFAULT_POLL_SECONDS) -> dict:
+    """
+    仮想の利用者で負荷をかけ、操作ごとの集計を返す
+
+    Args:
+        users (int): 同時に操作する利用者数
+        duration (float): 新しい操作を投入する時間（秒）。投入済みの操作は完了まで待つ
+        iterations (int, optional): 利用者ごとの操作回数の上限
+        operations: 利用者が順に実行する操作（OPERATIONS のいずれか）
+        llm_latency (float): LLMの応答時間（秒）
+        llm_jitter (float): LLMの応答時間のばらつきの幅（秒）
+        workers (int, optional): ジョブキュー全体の同時実行数（Noneの場合はアプリと同じ）
+        jobs_per_user (int, optional): 1人あたりの同時実行数（Noneの場合はアプリと同じ）
+        ramp_up (float): 全利用者が操作を始めるまでの時間（秒）。利用者は等間隔で始める
+        think_time (float): 利用者が結果を受け取ってから次の操作までの時間（秒）
+    """
+    from job_queue import MAX_JOB_WORKERS, MAX_JOBS_PER_OWNER, JobQueue
+
+    workers = workers or MAX_JOB_WORKERS
+    jobs_per_user = jobs_per_user or MAX_JOBS_PER_OWNER
+
+    llm_stub.install()
+    inputs = prepare_inputs(users, days, rows_per_sheet)
+    llm_stub.install(latency=llm_latency, jitter=llm_jitter)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(os.path.join(tmp, 'loadtest_jobs.sqlite'), max_workers=workers,
+                         max_jobs_per_owner=jobs_per_user)
+        samples: List[Sample] = []
+        lock = threading.Lock()
+        started = time.time()
+        deadline = started + ramp_up + duration
+        threads = []
+        for user in range(users):
+            thread = threading.Thread(
+                target=_virtual_user, name=f'loadtest-user-{user}',
+                args=(user, queue, inputs[user], list(operations), deadline, iterations, think_time,
+                      poll_seconds, samples, lock),
+                daemon=True)
+            threads.append(thread)
+            thread.start()
+            if ramp_up > 0 and user < users - 1:
+                time.sleep(ramp_up / max(users - 1, 1))
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+
+    return {
+        'config': {'users': users, 'duration': duration, 'iterations': iterations, 'operations': list(operations),
+                   'llm_latency': llm_latency, 'llm_jitter': llm_jitter, 'workers': workers,
+                   'jobs_per_user': jobs_per_user, 'ramp_up': ramp_up, 'think_time': think_time,
+                   'days': days, 'rows_per_sheet': rows_per_sheet},
+        'elapsed': elapsed,
+        'operations': summarize(samples, elapsed),
+        'errors': sorted({f"{sample.operation}: {sample.error}" for sample in samples if sample.status != 'ok'}),
+    }
+
+
+def percentile(values: List[float], q: float) -> float:
+    """パーセンタイル（q は0〜100、隣り合う順位の間は線形に補間する）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _stats(samples: List[Sample], elapsed: float) -> dict:
+    latencies = [sample.latency for sample in samples if sample.status == 'ok']
+    return {
+        'count': len(samples),
+        'errors': sum(sample.status != 'ok' for sample in samples),
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies, default=0.0),
+        'mean_wait': sum(sample.wait for sample in samples) / len(samples) if samples else 0.0,
+        'throughput_per_minute': len(latencies) / elapsed * 60 if elapsed else 0.0,
+    }
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, dict]:
+    """操作ごと（と全体 'total'）の件数・エラー数・応答時間のパーセンタイル・順番待ち・1分あたりの完了数"""
+    by_operation: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        by_operation.setdefault(sample.operation, []).append(sample)
+    summary = {operation: _stats(items, elapsed) for operation, items in by_operation.items()}
+    summary['total'] = _stats(samples, elapsed)
+    return summary
+
+
+def format_summary(result: dict) -> str:
+    columns = (('件数', 6), ('エラー', 8), ('p50(秒)', 10), ('p95(秒)', 10), ('p99(秒)', 10), ('最大(秒)', 10),
+               ('待ち(秒)', 10), ('件/分', 8))
+    lines = ['操作' + ' ' * 16 + ''.join(rjust_display(label, width) for label, width in columns)]
+    for operation, stats in result['operations'].items():
+        lines.append(f"{operation:<20}{stats['count']:>6}{stats['errors']:>8}{stats['p50']:>10.2f}"
+                     f"{stats['p95']:>10.2f}{stats['p99']:>10.2f}{stats['max']:>10.2f}{stats['mean_wait']:>10.2f}"
+                     f"{stats['throughput_per_minute']:>8.1f}")
+    config = result['config']
+    lines.append(f"利用者{config['users']}人、同時実行{config['workers']}件（1人{config['jobs_per_user']}件）、"
+                 f"LLMの応答{config['llm_latency']}秒、経過{result['elapsed']:.1f}秒")
+    for error in result['errors']:
+        lines.append(f"エラー: {error}")
+    return '\n'.join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.loadtest',
+                                     description='複数の利用者が同時に操作した場合の応答時間を計測します')
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS, help='同時に操作する利用者数')
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help='操作を投入し続ける時間（秒）')
+    parser.add_argument('--iterations', type=int, help='利用者ごとの操作回数の上限')
+    parser.add_argument('--operation', action='append', choices=OPERATIONS,
+                        help=f"利用者が順に実行する操作（複数指定可、既定は {', '.join(DEFAULT_OPERATIONS)}）")
+    parser.add_argument('--llm-latency', type=float, default=DEFAULT_LLM_LATENCY, help='LLMの応答時間（秒）')
+    parser.add_argument('--llm-jitter', type=float, default=0.0, help='LLMの応答時間のばらつきの幅（秒）')
+    parser.add_argument('--workers', type=int, help='ジョブキュー全体の同時実行数（既定はアプリと同じ）')
+    parser.add_argument('--jobs-per-user', type=int, help='1人あたりの同時実行数（既定はアプリと同じ）')
+    parser.add_argument('--ramp-up', type=float, default=0.0, help='全利用者が操作を始めるまでの時間（秒）')
+    parser.add_argument('--think-time', type=float, default=0.0, help='結果を受け取ってから次の操作までの時間（秒）')
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='献立表の日数（シート数）')
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help='献立表の1シートあたりの行数')
+    parser.add_argument('--json', help='集計結果をJSONで保存するファイル')
+    args = parser.parse_args(argv)
+
+    result = run_load_test(users=args.users, duration=args.duration, iterations=args.iterations,
+                           operations=args.operation or DEFAULT_OPERATIONS, llm_latency=args.llm_latency,
+                           llm_jitter=args.llm_jitter, workers=args.workers, jobs_per_user=args.jobs_per_user,
+                           ramp_up=args.ramp_up, think_time=args.think_time, days=args.days, rows_per_sheet=args.rows)
+    print(format_summary(result))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 1 if result['operations']['total']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
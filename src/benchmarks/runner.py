@@ -0,0 +1,206 @@
+"""
+段階ごとの処理時間の計測と基準値との比較
+
+各段階は同じワークブック（workbook.generate_workbook）を入力に、1回の予行の後 repeat 回計測し、
+中央値を基準値（baseline.json）と比べる。計測環境の速さの違いは、固定の計算（calibrate）に
+かかった時間の比で基準値を補正して吸収する。LLMは llm_stub に置き換えるため、APIキーは不要。
+"""
+import argparse
+import copy
+import io
+import json
+import os
+import random
+import statistics
+import time
+import unicodedata
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import pandas as pd
+
+from benchmarks import llm_stub
+from benchmarks.workbook import generate_workbook
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+
+# 既定のワークブックの大きさと計測回数
+DEFAULT_DAYS = 30
+DEFAULT_ROWS = 40
+DEFAULT_REPEAT = 5
+
+# 基準値からの許容する遅れ（比率）と、差が小さい場合に無視する時間（秒）
+DEFAULT_TOLERANCE = 0.5
+MIN_REGRESSION_SECONDS = 0.02
+
+STAGES = ('read', 'parse', 'nutrition', 'desserts', 'reorder', 'excel_write', 'image', 'orders', 'end_to_end')
+
+
+class StageResult(NamedTuple):
+    stage: str
+    median: float
+    minimum: float
+    runs: List[float]
+
+
+def measure(stage: str, fn: Callable, setup: Optional[Callable] = None, repeat: int = DEFAULT_REPEAT) -> StageResult:
+    """fn を1回予行した後 repeat 回計測する（setup の戻り値を引数として渡し、setup は計測に含めない）"""
+    fn(*(setup() if setup else ()))
+    runs = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        started = time.perf_counter()
+        fn(*args)
+        runs.append(time.perf_counter() - started)
+    return StageResult(stage, statistics.median(runs), min(runs), runs)
+
+
+def calibrate(repeat: int = DEFAULT_REPEAT) -> float:
+    """計測環境の速さの目安（固定のPython・pandasの処理にかかる時間の最小値）"""
+    def workload():
+        sum(i * i for i in range(200_000))
+        pd.DataFrame({'a': range(20_000), 'b': ['x'] * 20_000}).astype(str).to_dict('records')
+    return measure('calibration', workload, repeat=repeat).minimum
+
+
+def run_benchmarks(days: int = DEFAULT_DAYS, rows_per_sheet: int = DEFAULT_ROWS, vocabulary_size: Optional[int] = None,
+                   repeat: int = DEFAULT_REPEAT, stages=STAGES) -> Dict[str, StageResult]:
+    """生成したワークブックで各段階を計測する"""
+    import menu_updater
+    from excel_export import write_menu_dataframe
+
+    llm_stub.install()
+    data = generate_workbook(days=days, rows_per_sheet=rows_per_sheet, vocabulary_size=vocabulary_size)
+
+    # 各段階の入力は前の段階の結果から作る（計測には含めない）
+    df_dict = pd.read_excel(io.BytesIO(data), sheet_name=None)
+    book = menu_updater.parse_menu_book(df_dict)
+    all_meals = book.menu_names_by_date()
+    all_nutrition = book.nutrition_by_date()
+    dessert_book = copy.deepcopy(book)
+    menu_updater.add_desserts_to_menu(dessert_book)
+    table = dessert_book.to_dataframe()
+    menu_xlsx = io.BytesIO()
+    write_menu_dataframe(menu_xlsx, table)
+    menu_bytes = menu_xlsx.getvalue()
+
+    def reorder():
+        random.seed(0)
+        menu_updater.optimize_menu_order(all_meals, all_nutrition)
+
+    cases = {
+        'read': (lambda: pd.read_excel(io.BytesIO(data), sheet_name=None), None),
+        'parse': (lambda: menu_updater.parse_menu_book(df_dict, calculate_nutrition=False), None),
+        'nutrition': (lambda: menu_updater.calculate_nutrition_for_all_days(all_meals), None),
+        'desserts': (menu_updater.add_desserts_to_menu, lambda: (copy.deepcopy(book),)),
+        'reorder': (reorder, None),
+        'excel_write': (lambda: write_menu_dataframe(io.BytesIO(), table), None),
+        'image': (lambda: menu_updater.generate_menu_image_output(table), None),
+        'orders': (lambda: menu_updater.create_order_sheets(menu_bytes), None),
+        'end_to_end': (lambda: menu_updater.update_menu_with_desserts(data), None),
+    }
+    return {stage: measure(stage, *cases[stage], repeat=repeat) for stage in stages}
+
+
+def load_baseline(path=BASELINE_PATH) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(results: Dict[str, StageResult], baseline: dict, calibration: float,
+            tolerance: float = DEFAULT_TOLERANCE) -> Dict[str, dict]:
+    """
+    基準値と比較する（段階 → {'baseline': 補正後の基準値, 'ratio': 中央値/基準値, 'regressed': bool}）
+
+    基準値は calibration の比で計測環境の速さに合わせて補正する。
+    """
+    scale = calibration / baseline['calibration'] if baseline.get('calibration') else 1.0
+    comparison = {}
+    for stage, result in results.items():
+        reference = baseline['stages'].get(stage)
+        if reference is None:
+            continue
+        expected = reference * scale
+        comparison[stage] = {
+            'baseline': expected,
+            'ratio': result.median / expected if expected else 0.0,
+            'regressed': result.median > expected * (1 + tolerance) and
+                         result.median - expected > MIN_REGRESSION_SECONDS,
+        }
+    return comparison
+
+
+def rjust_display(text: str, width: int) -> str:
+    """全角文字を2桁として右寄せする"""
+    length = sum(2 if unicodedata.east_asian_width(char) in 'WF' else 1 for char in text)
+    return ' ' * max(width - length, 0) + text
+
+
+def format_report(results: Dict[str, StageResult], comparison: Dict[str, dict]) -> str:
+    header = ''.join(rjust_display(label, width) for label, width in (('中央値(ms)', 12), ('最小(ms)', 12),
+                                                               ('基準値(ms)', 12), ('比', 8)))
+    lines = ['段階' + ' ' * 8 + header]
+    for stage, result in results.items():
+        entry = comparison.get(stage)
+        baseline = f"{entry['baseline'] * 1000:.1f}" if entry else '-'
+        ratio = f"{entry['ratio']:.2f}" if entry else '-'
+        mark = '  遅くなりました' if entry and entry['regressed'] else ''
+        lines.append(f"{stage:<12}{result.median * 1000:>12.1f}{result.minimum * 1000:>12.1f}"
+                     f"{baseline:>12}{ratio:>8}{mark}")
+    return '\n'.join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='段階ごとの処理時間を計測します')
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='ワークブックの日数（シート数）')
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help='1シートあたりの行数')
+    parser.add_argument('--vocabulary', type=int, help='食材の種類数（既定は栄養価データの全食材）')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='各段階の計測回数')
+    parser.add_argument('--stage', action='append', choices=STAGES, help='計測する段階（複数指定可、既定は全段階）')
+    parser.add_argument('--baseline', default=str(BASELINE_PATH), help='基準値のJSONファイル')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='基準値から許容する遅れの比率（0.5なら1.5倍まで）')
+    parser.add_argument('--update-baseline', action='store_true', help='計測結果を基準値として保存する')
+    parser.add_argument('--json', help='計測結果をJSONで保存するファイル')
+    args = parser.parse_args(argv)
+
+    workbook = {'days': args.days, 'rows_per_sheet': args.rows, 'vocabulary_size': args.vocabulary}
+    calibration = calibrate(args.repeat)
+    results = run_benchmarks(**workbook, repeat=args.repeat, stages=args.stage or STAGES)
+
+    baseline = load_baseline(args.baseline)
+    comparison = {}
+    if baseline is None:
+        print(f"基準値がありません: {args.baseline}")
+    elif baseline.get('workbook') != workbook:
+        print(f"基準値とワークブックの大きさが異なるため比較しません（基準値: {baseline.get('workbook')}）")
+    else:
+        comparison = compare(results, baseline, calibration, args.tolerance)
+    print(format_report(results, comparison))
+
+    summary = {
+        'workbook': workbook,
+        'calibration': calibration,
+        'stages': {stage: result.median for stage, result in results.items()},
+        'runs': {stage: result.runs for stage, result in results.items()},
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({**summary, 'comparison': comparison}, f, ensure_ascii=False, indent=2)
+    if args.update_baseline:
+        # 一部の段階だけ計測した場合は、その段階の基準値だけを更新する
+        stages = dict(baseline['stages']) if baseline and baseline.get('workbook') == workbook else {}
+        stages.update(summary['stages'])
+        merged = {'workbook': workbook, 'calibration': calibration, 'stages': stages}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(merged, f, ensure_ascii=False, indent=2)
+        print(f"基準値を保存しました: {args.baseline}")
+        return 0
+
+    regressed = [stage for stage, entry in comparison.items() if entry['regressed']]
+    if regressed:
+        print(f"基準値より遅くなった段階: {', '.join(regressed)}")
+        return 1
+    return 0
@@ -0,0 +1,141 @@
+"""
+ベンチマーク用の献立表（入力ワークブック）の生成
+
+    python -m benchmarks.workbook bench_input.xlsx --days 30 --rows 40 --vocabulary 120
+
+シート名は「4月1日(月)」の形式で、各シートは A列に食事区分、B列に献立名、D列に「食品番号:食品名/分類」、
+E列に1人分の重量、F列に総使用量を持つ（process_excel_sheet が読み込む形式）。
+食材名は nutrition_data.csv から取るため、栄養価計算の照合も実際の献立表と同じように行われる。
+"""
+import argparse
+import io
+import random
+from datetime import date, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+
+NUTRITION_CSV = Path(__file__).resolve().parent.parent / 'nutrition_data.csv'
+
+COLUMNS = ['区分', '献立名', '', '食品名', '重量', '総使用量']
+MEAL_TYPES = ('朝食', '昼食', '夕食')
+WEEKDAYS = '月火水木金土日'
+
+# 食事区分ごとの行数の比（朝食は品数が少ない）
+MEAL_SHARE = {'朝食': 0.25, '昼食': 0.35, '夕食': 0.4}
+
+# 主食（料理名, 食材名）は各食事区分の最初の料理にする
+STAPLES = {
+    '朝食': [('食パン', 'パン'), ('米飯', '米'), ('ロールパン', 'パン')],
+    '昼食': [('米飯', '米'), ('麦ごはん', '米'), ('うどん', '麺')],
+    '夕食': [('米飯', '米'), ('麦ごはん', '米')],
+}
+COOKING = ['煮物', '炒め', '焼き', '和え', 'サラダ', '揚げ', '蒸し', '汁', 'ソテー', '南蛮漬け']
+
+DEFAULT_PERSON_COUNT = 45
+
+
+def load_vocabulary(size: Optional[int] = None) -> List[str]:
+    """
+    食材名の一覧（nutrition_data.csv の順）
+
+    size が栄養価データの食材数より多い場合は、データにない食材名（栄養価計算で照合されない）を追加する。
+    """
+    names = pd.read_csv(NUTRITION_CSV)['食材名'].astype(str).tolist()
+    if size is None:
+        return names
+    if size <= len(names):
+        return names[:size]
+    return names + [f"食材{i}" for i in range(len(names) + 1, size + 1)]
+
+
+def _meal_rows(rng: random.Random, meal_type: str, row_count: int, vocabulary: List[str],
+               person_count: int) -> List[list]:
+    """食事区分1つ分の行（最初の行に区分名、料理ごとに食材の行、最後に合計行）"""
+    rows = [[meal_type, '', '', '', '', '']]
+    remaining = max(row_count - 2, 1)
+    first = True
+    while remaining > 0:
+        if first:
+            dish_name, staple = rng.choice(STAPLES[meal_type])
+            ingredients = [staple]
+        else:
+            ingredients = rng.sample(vocabulary, min(rng.randint(1, 4), remaining, len(vocabulary)))
+            dish_name = f"{ingredients[0]}の{rng.choice(COOKING)}"
+        first = False
+        for position, ingredient in enumerate(ingredients):
+            weight = rng.choice((3, 5, 10, 20, 30, 40, 50, 60, 80, 100))
+            rows.append([
+                '',
+                dish_name if position == 0 else '',
+                '',
+                f"{rng.randint(1, 18):02d}{rng.randint(0, 999):03d}:{ingredient}/{rng.choice(COOKING)}用",
+                weight,
+                weight * person_count,
+            ])
+        remaining -= len(ingredients)
+    rows.append(['', '', '', '合計', '', ''])
+    return rows
+
+
+def generate_sheets(days: int = 30, rows_per_sheet: int = 40, vocabulary_size: Optional[int] = None,
+                    start: date = date(2025, 4, 1), seed: int = 0,
+                    person_count: int = DEFAULT_PERSON_COUNT) -> dict:
+    """
+    シート名 → DataFrame の辞書を生成する（同じ引数では同じ内容になる）
+
+    Args:
+        days (int): シート（日付）の数
+        rows_per_sheet (int): 1シートあたりのおおよその行数（区分・合計の行を含む）
+        vocabulary_size (int, optional): 使用する食材の種類数（Noneの場合は栄養価データの全食材）
+        start (date): 最初のシートの日付
+        seed (int): 乱数の種
+        person_count (int): 総使用量の人数
+    """
+    rng = random.Random(seed)
+    vocabulary = load_vocabulary(vocabulary_size)
+    sheets = {}
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        rows = []
+        for meal_type in MEAL_TYPES:
+            row_count = max(int(rows_per_sheet * MEAL_SHARE[meal_type]), 3)
+            rows.extend(_meal_rows(rng, meal_type, row_count, vocabulary, person_count))
+        sheet_name = f"{day.month}月{day.day}日({WEEKDAYS[day.weekday()]})"
+        sheets[sheet_name] = pd.DataFrame(rows, columns=COLUMNS)
+    return sheets
+
+
+def generate_workbook(output_file=None, **options):
+    """
+    献立表のワークブックを生成する（options は generate_sheets と同じ）
+
+    Returns:
+        output_file を指定した場合はそのパス、指定しない場合はワークブックのbytes
+    """
+    sheets = generate_sheets(**options)
+    target = output_file if output_file is not None else io.BytesIO()
+    with pd.ExcelWriter(target, engine='openpyxl') as writer:
+        for sheet_name, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    if output_file is None:
+        return target.getvalue()
+    return output_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ベンチマーク用の献立表を生成します')
+    parser.add_argument('output', help='出力するExcelファイル')
+    parser.add_argument('--days', type=int, default=30, help='日数（シート数）')
+    parser.add_argument('--rows', type=int, default=40, help='1シートあたりの行数')
+    parser.add_argument('--vocabulary', type=int, help='食材の種類数（既定は栄養価データの全食材）')
+    parser.add_argument('--seed', type=int, default=0, help='乱数の種')
+    args = parser.parse_args(argv)
+    generate_workbook(args.output, days=args.days, rows_per_sheet=args.rows,
+                      vocabulary_size=args.vocabulary, seed=args.seed)
+    print(f"献立表を作成しました: {args.output}（{args.days}日分）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+献立表（項目 × 日付）のExcel出力
+
+デザート追加後のメニュー表と一週間献立のエクスポートで共通して使用する。
+列幅はpandasの文字列操作でまとめて計算し、セルは1行ずつ書き出す。
+ファイルパス・BytesIOなどのファイルオブジェクトのどちらへの出力も、既定では constant_memory モード
+（書き出した行をメモリに保持しない）で書き出す。
+"""
+from typing import Dict, Optional, Sequence
+
+import pandas as pd
+
+# セル書式（既存のメニュー表と同じ）
+CELL_FORMAT = {
+    'font_size': 8,
+    'font_name': 'MS Gothic',
+    'text_wrap': True,
+    'align': 'left',
+    'valign': 'top'
+}
+
+# 列幅の範囲
+MIN_COLUMN_WIDTH = 10
+MAX_COLUMN_WIDTH = 50
+
+
+def max_line_length(values: Sequence, split_lines: bool = True) -> int:
+    """セル値の最大文字数（split_lines=Trueの場合は改行ごとの行の最大文字数）"""
+    series = pd.Series(list(values), dtype=object)
+    if series.empty:
+        return 0
+    series = series.where(series.notna(), '').astype(str)
+    if split_lines:
+        series = series.str.split('\n').explode()
+    lengths = series.str.len()
+    return int(lengths.max()) if not lengths.empty else 0
+
+
+def column_width(header, values: Sequence, split_lines: bool = True) -> float:
+    """ヘッダーとセル値から列幅を計算する（10～50の範囲）"""
+    max_width = max(len(str(header)) * 1.2, max_line_length(values, split_lines) * 1.1)
+    return max(MIN_COLUMN_WIDTH, min(max_width, MAX_COLUMN_WIDTH))
+
+
+def write_menu_table(output, index: Sequence, columns: Dict[str, Sequence], index_label: str = '',
+                     sheet_name: str = 'Sheet1', constant_memory: Optional[bool] = None):
+    """
+    項目をA列、日付を1行目とする献立表をExcelに書き出す
+
+    Args:
+        output: 出力先（ファイルパスまたはBytesIOなどのファイルオブジェクト）
+        index (Sequence): A列の項目
+        columns (Dict[str, Sequence]): 日付 → 項目順のセル値
+        index_label (str): A1セルに表示するラベル
+        sheet_name (str): シート名
+        constant_memory (bool): xlsxwriterの constant_memory モードを使用するか
+            （None・True の場合は constant_memory、False の場合は in_memory モード。
+            constant_memory モードは一時ファイルを使用するが、ファイルオブジェクトへの出力でも使える）
+
+    Returns:
+        出力先（outputをそのまま返す）
+    """
+    import xlsxwriter
+
+    index = list(index)
+    headers = list(columns.keys())
+
+    if constant_memory is None:
+        constant_memory = True
+    options = {'constant_memory': True} if constant_memory else {'in_memory': True}
+
+    workbook = xlsxwriter.Workbook(output, options)
+    try:
+        worksheet = workbook.add_worksheet(sheet_name)
+        cell_format = workbook.add_format(CELL_FORMAT)
+        header_format = workbook.add_format(dict(CELL_FORMAT, bold=True, border=1))
+
+        # 列幅を先に設定（インデックス列は改行で分割しない）
+        worksheet.set_column(0, 0, column_width(index_label or 'index', index, split_lines=False))
+        for col_num, header in enumerate(headers, start=1):
+            worksheet.set_column(col_num, col_num, column_width(header, columns[header]))
+
+        # ヘッダー行
+        worksheet.write_string(0, 0, str(index_label), header_format)
+        for col_num, header in enumerate(headers, start=1):
+            worksheet.write_string(0, col_num, str(header), header_format)
+
+        # データ行を1行ずつ書き出す（constant_memoryモードでは行順に書く必要がある）
+        for row_num, label in enumerate(index, start=1):
+            worksheet.write_string(row_num, 0, str(label), header_format)
+            for col_num, header in enumerate(headers, start=1):
+                values = columns[header]
+                value = values[row_num - 1] if row_num - 1 < len(values) else ''
+                if value is None or (isinstance(value, float) and pd.isna(value)):
+                    value = ''
+                worksheet.write_string(row_num, col_num, str(value), cell_format)
+    finally:
+        workbook.close()
+
+    return output
+
+
+def write_menu_dataframe(output, df: pd.DataFrame, index_label: str = '', sheet_name: str = 'Sheet1',
+                         constant_memory: Optional[bool] = None):
+    """項目をインデックス、日付を列とするDataFrameを write_menu_table で書き出す"""
+    columns = {str(col): df[col].tolist() for col in df.columns}
+    return write_menu_table(output, [str(idx) for idx in df.index], columns, index_label=index_label,
+                            sheet_name=sheet_name, constant_memory=constant_memory)
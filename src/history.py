@@ -0,0 +1,288 @@
+"""
+献立の履歴（過去に提供した献立のSQLiteストア）
+
+処理したワークブックと生成した献立を日付ごとに保存し、ファイルをまたいだ多様性の確認
+（前月末と同じ系統の料理が続いていないか）や「サバの味噌煮を最後に出したのはいつか」を調べられるようにする。
+テーブルは days（日付）/ dishes（料理）/ ingredients（食材）/ nutrition（栄養価）で、
+日付・料理名・カテゴリに索引を張る。同じ日付を保存し直した場合は新しい内容で置き換える
+（ただし生成した献立で、ワークブックから保存した日を上書きしない）。
+- MENU_HISTORY_DB: 保存先のSQLiteファイル（既定はホームフォルダの .kondate/menu_history.sqlite）
+- MENU_HISTORY: '0' を指定すると保存しない
+シート名の「4月1日」のように年がない日付は、year を指定しない場合は直近の過去の日
+（MAX_DAYS_AHEAD 日先までは先の日付）とみなす。
+"""
+import os
+import re
+import sqlite3
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from log_config import get_logger
+from menu_model import NUTRIENTS, DayMenu, Dish, Ingredient, Meal, MenuBook, NutritionRecord, identify_dish_category
+
+logger = get_logger(__name__)
+
+# 履歴のSQLiteファイルと、保存の有効・無効
+HISTORY_DB_ENV = 'MENU_HISTORY_DB'
+HISTORY_ENV = 'MENU_HISTORY'
+
+# 保存元
+WORKBOOK = 'workbook'
+WEEKLY_MENU = 'weekly_menu'
+
+_MONTH_DAY_PATTERN = re.compile(r'^(\d{1,2})/(\d{1,2})$')
+_ISO_DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_AMOUNT_PATTERN = re.compile(r'^\s*([\d.]+)\s*(\D*?)\s*$')
+
+# 年がない日付を先の日付とみなす日数（翌月・翌々月分の献立表を先に処理する場合）
+MAX_DAYS_AHEAD = 92
+
+# 生成した献立の栄養価の項目名 → menu_model の栄養素名
+_WEEKLY_NUTRIENT_NAMES = {'カロリー': 'エネルギー'}
+
+_NUTRITION_COLUMNS = [attr for attr, _ in NUTRIENTS.values()]
+
+
+class DishServing(NamedTuple):
+    """料理を提供した日"""
+    served_on: str
+    meal_type: str
+    source: str
+
+
+class DishSummary(NamedTuple):
+    """料理ごとの提供回数と最後に提供した日"""
+    name: str
+    category: str
+    times: int
+    last_served: str
+
+
+def history_enabled() -> bool:
+    return os.getenv(HISTORY_ENV, '1') != '0'
+
+
+def default_db_path() -> str:
+    # 一時フォルダは再起動で消えることがあるため、年単位の履歴はホームフォルダに保存する
+    return os.getenv(HISTORY_DB_ENV) or str(Path.home() / '.kondate' / 'menu_history.sqlite')
+
+
+def _connect(path: Optional[str] = None) -> sqlite3.Connection:
+    path = path or default_db_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    conn.executescript(
+        'CREATE TABLE IF NOT EXISTS days ('
+        'id INTEGER PRIMARY KEY, served_on TEXT NOT NULL, label TEXT, source TEXT, ingested_at REAL);'
+        'CREATE TABLE IF NOT EXISTS dishes ('
+        'id INTEGER PRIMARY KEY, day_id INTEGER NOT NULL REFERENCES days (id) ON DELETE CASCADE, '
+        'meal_type TEXT, position INTEGER, name TEXT NOT NULL, category TEXT);'
+        'CREATE TABLE IF NOT EXISTS ingredients ('
+        'dish_id INTEGER NOT NULL REFERENCES dishes (id) ON DELETE CASCADE, '
+        'name TEXT, amount REAL, unit TEXT, note TEXT);'
+        'CREATE TABLE IF NOT EXISTS nutrition ('
+        'day_id INTEGER PRIMARY KEY REFERENCES days (id) ON DELETE CASCADE, '
+        + ', '.join(f'{column} REAL' for column in _NUTRITION_COLUMNS) + ');'
+        'CREATE UNIQUE INDEX IF NOT EXISTS days_served_on ON days (served_on);'
+        'CREATE INDEX IF NOT EXISTS dishes_name ON dishes (name, day_id);'
+        'CREATE INDEX IF NOT EXISTS dishes_category ON dishes (category, day_id);'
+        'CREATE INDEX IF NOT EXISTS dishes_day ON dishes (day_id);'
+        'CREATE INDEX IF NOT EXISTS ingredients_dish ON ingredients (dish_id);'
+    )
+    return conn
+
+
+def resolve_date(label: str, year: Optional[int] = None, today: Optional[date] = None) -> Optional[date]:
+    """
+    献立の日付（'4/1' または '2024-04-01'）を日付にする（解析できない場合は None）
+
+    年がない場合は year の年、year も指定しない場合は today から MAX_DAYS_AHEAD 日先までの最も遅い日とする。
+    """
+    label = str(label).strip()
+    try:
+        if _ISO_DATE_PATTERN.match(label):
+            return date.fromisoformat(label)
+        match = _MONTH_DAY_PATTERN.match(label)
+        if not match:
+            return None
+        month, day = int(match.group(1)), int(match.group(2))
+        if year is not None:
+            return date(year, month, day)
+        today = today or date.today()
+        candidates = []
+        # 2/29 は直近のうるう年まで遡る
+        for candidate_year in range(today.year - 4, today.year + 2):
+            try:
+                candidates.append(date(candidate_year, month, day))
+            except ValueError:
+                continue
+        candidates = [candidate for candidate in candidates if (candidate - today).days <= MAX_DAYS_AHEAD]
+        return max(candidates) if candidates else None
+    except ValueError:
+        return None
+
+
+def _insert_day(conn: sqlite3.Connection, served_on: date, day: DayMenu, source: str) -> bool:
+    """1日分を保存する（生成した献立はワークブックから保存した日を置き換えない）"""
+    existing = conn.execute('SELECT id, source FROM days WHERE served_on = ?', (served_on.isoformat(),)).fetchone()
+    if existing:
+        if source != WORKBOOK and existing[1] == WORKBOOK:
+            return False
+        conn.execute('DELETE FROM days WHERE id = ?', (existing[0],))
+    day_id = conn.execute(
+        'INSERT INTO days (served_on, label, source, ingested_at) VALUES (?, ?, ?, ?)',
+        (served_on.isoformat(), day.date, source, time.time()),
+    ).lastrowid
+    for meal_type, meal in day.meals.items():
+        for position, dish in enumerate(meal.dishes):
+            dish_id = conn.execute(
+                'INSERT INTO dishes (day_id, meal_type, position, name, category) VALUES (?, ?, ?, ?, ?)',
+                (day_id, meal_type, position, dish.name, identify_dish_category(dish.name)),
+            ).lastrowid
+            conn.executemany(
+                'INSERT INTO ingredients (dish_id, name, amount, unit, note) VALUES (?, ?, ?, ?, ?)',
+                [(dish_id, ing.name, ing.amount, ing.unit, ing.note) for ing in dish.ingredients],
+            )
+    if day.nutrition is not None:
+        conn.execute(
+            f"INSERT INTO nutrition (day_id, {', '.join(_NUTRITION_COLUMNS)}) "
+            f"VALUES (?{', ?' * len(_NUTRITION_COLUMNS)})",
+            (day_id, *(getattr(day.nutrition, column) for column in _NUTRITION_COLUMNS)),
+        )
+    return True
+
+
+def record_book(book: MenuBook, source: str = WORKBOOK, year: Optional[int] = None,
+                path: Optional[str] = None) -> int:
+    """
+    献立を保存し、保存した日数を返す（保存が無効な場合や失敗した場合は0。処理は止めない）
+
+    日付を解析できない日（読み込みに失敗したシートなど）は保存しない。
+    """
+    if not history_enabled() or not len(book):
+        return 0
+    days = [(resolve_date(label, year), day) for label, day in book.days.items()]
+    skipped = [day.date for served_on, day in days if served_on is None]
+    if skipped:
+        logger.debug("日付を解析できないため履歴に保存しません: %s", skipped)
+    try:
+        with _connect(path) as conn:
+            saved = sum(_insert_day(conn, served_on, day, source) for served_on, day in days if served_on)
+        logger.info("献立の履歴を保存しました: %s日分（%s）", saved, source)
+        return saved
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("献立の履歴の保存に失敗しました: %s", e)
+        return 0
+
+
+def _ingredient(name: str, amount_text) -> Ingredient:
+    """生成した献立の食材（量は '80g'、'半分' など）"""
+    match = _AMOUNT_PATTERN.match(str(amount_text))
+    if match:
+        try:
+            return Ingredient(name, float(match.group(1)), match.group(2) or 'g')
+        except ValueError:
+            pass
+    return Ingredient(name, note=str(amount_text))
+
+
+def weekly_menu_book(weekly_menu: dict) -> MenuBook:
+    """generate_weekly_menu の結果（日付 → meals / ingredients / nutrition）を MenuBook にする"""
+    book = MenuBook()
+    for date_key, entry in weekly_menu.items():
+        if not isinstance(entry, dict) or entry.get('fallback'):
+            continue
+        day = DayMenu(date_key)
+        ingredients = entry.get('ingredients', {})
+        for meal_type, dish_names in entry.get('meals', {}).items():
+            meal = day.meals.setdefault(meal_type, Meal(meal_type))
+            for dish_name in dish_names:
+                dish = Dish(dish_name)
+                for ingredient_name, amount in ingredients.get(meal_type, {}).get(dish_name, {}).items():
+                    dish.ingredients.append(_ingredient(ingredient_name, amount))
+                meal.dishes.append(dish)
+        values = {}
+        for nutrient, value in entry.get('nutrition', {}).items():
+            match = _AMOUNT_PATTERN.match(str(value))
+            if match:
+                values[_WEEKLY_NUTRIENT_NAMES.get(nutrient, nutrient)] = float(match.group(1))
+        if values:
+            day.nutrition = NutritionRecord.from_dict(values)
+        book.add_day(day)
+    return book
+
+
+def record_weekly_menu(weekly_menu: dict, path: Optional[str] = None) -> int:
+    """生成した献立を保存する（フォールバックの献立は保存しない。形式が異なる場合は保存せずに0を返す）"""
+    try:
+        book = weekly_menu_book(weekly_menu)
+    except (AttributeError, TypeError, ValueError) as e:
+        logger.warning("生成した献立の形式が異なるため履歴に保存しません: %s", e)
+        return 0
+    return record_book(book, source=WEEKLY_MENU, path=path)
+
+
+def dish_history(dish_name: str, limit: int = 20, path: Optional[str] = None) -> List[DishServing]:
+    """料理を提供した日（新しい順）"""
+    with _connect(path) as conn:
+        rows = conn.execute(
+            'SELECT days.served_on, dishes.meal_type, days.source FROM dishes JOIN days ON days.id = dishes.day_id '
+            'WHERE dishes.name = ? ORDER BY days.served_on DESC LIMIT ?',
+            (dish_name, limit),
+        ).fetchall()
+    return [DishServing(*row) for row in rows]
+
+
+def find_dishes(keyword: str = '', category: Optional[str] = None, limit: int = 50,
+                path: Optional[str] = None) -> List[DishSummary]:
+    """料理名に keyword を含む料理の提供回数と最後に提供した日（最後に提供した日の新しい順、部分一致のため索引は使わない）"""
+    conditions, params = ['dishes.name LIKE ?'], [f"%{keyword}%"]
+    if category:
+        conditions.append('dishes.category = ?')
+        params.append(category)
+    with _connect(path) as conn:
+        rows = conn.execute(
+            'SELECT dishes.name, dishes.category, COUNT(*), MAX(days.served_on) '
+            'FROM dishes JOIN days ON days.id = dishes.day_id '
+            f"WHERE {' AND '.join(conditions)} GROUP BY dishes.name, dishes.category "
+            'ORDER BY MAX(days.served_on) DESC LIMIT ?',
+            (*params, limit),
+        ).fetchall()
+    return [DishSummary(*row) for row in rows]
+
+
+def days_before(served_on: date, days: int = 14, path: Optional[str] = None) -> Dict[str, Dict[str, List[str]]]:
+    """
+    served_on の前日までの days 日間の献立（日付の古い順、{'YYYY-MM-DD': {'朝食': [...], ...}}）
+
+    保存が無効な場合や読み込みに失敗した場合は空の辞書を返す。
+    """
+    if not history_enabled():
+        return {}
+    since = served_on - timedelta(days=days)
+    try:
+        with _connect(path) as conn:
+            rows = conn.execute(
+                'SELECT days.served_on, dishes.meal_type, dishes.name FROM days '
+                'JOIN dishes ON dishes.day_id = days.id '
+                'WHERE days.served_on >= ? AND days.served_on < ? '
+                'ORDER BY days.served_on, dishes.id',
+                (since.isoformat(), served_on.isoformat()),
+            ).fetchall()
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("献立の履歴の読み込みに失敗しました: %s", e)
+        return {}
+    history: Dict[str, Dict[str, List[str]]] = {}
+    for day, meal_type, name in rows:
+        history.setdefault(day, {}).setdefault(meal_type, []).append(name)
+    return history
+
+
+def history_for_menu(date_labels, days: int = 14, path: Optional[str] = None) -> Dict[str, Dict[str, List[str]]]:
+    """献立の最初の日より前の days 日間の献立（date_labels は '4/1' などの献立の日付）"""
+    dates = [served_on for served_on in (resolve_date(label) for label in date_labels) if served_on]
+    return days_before(min(dates), days, path) if dates else {}
@@ -0,0 +1,373 @@
+"""
+献立表画像のレイアウト
+
+日本語フォントの解決・読み込みを1回だけ行い、サイズごとの ImageFont をキャッシュする。
+セルの文字列は文字ごとの送り幅（キャッシュ済み）からピクセル幅を計算して折り返し、
+行の高さは折り返し後の行数とフォントの高さから求める。
+
+長い期間は日付をページ（既定では1週間）ごとに分けてスレッドプールで描画・エンコードし、
+PNGのリストまたは複数ページのPDFとして出力する。ページは描画しながら1ページずつ返すため、
+PDFやファイルへの出力で同時にメモリ上に持つページは期間の長さによらずワーカー数分程度になる。
+"""
+import io
+import math
+import os
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# フォント候補を追加する環境変数（os.pathsep 区切り。先頭ほど優先）
+FONT_PATHS_ENV = 'MENU_FONT_PATHS'
+
+# 日本語を描画できるフォントの候補
+FONT_CANDIDATES = [
+    # Windows
+    'C:\\Windows\\Fonts\\msgothic.ttc',
+    'C:\\Windows\\Fonts\\meiryo.ttc',
+    'C:\\Windows\\Fonts\\YuGothM.ttc',
+    # macOS
+    '/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc',
+    '/System/Library/Fonts/Hiragino Sans GB.ttc',
+    '/Library/Fonts/Osaka.ttf',
+    # Linux
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/opentype/ipaexfont-gothic/ipaexg.ttf',
+    '/usr/share/fonts/truetype/fonts-japanese-gothic.ttf',
+    '/usr/share/fonts/truetype/takao-gothic/TakaoGothic.ttf',
+]
+
+# 表のスタイル
+HEADER_FONT_SIZE = 12
+CELL_FONT_SIZE = 10
+INDEX_COLUMN_WIDTH = 120
+DATE_COLUMN_WIDTH = 150
+CELL_PADDING = 5
+LINE_SPACING = 4
+MIN_ROW_HEIGHT = 30
+HEADER_FILL = '#d3d3d3'
+
+# ページ分割
+DAYS_PER_PAGE = 7
+MAX_RENDER_WORKERS = 4
+
+# ラスターPDFの解像度（dpi）
+PDF_RESOLUTION = 100
+
+
+def font_candidates() -> List[str]:
+    """フォント候補の一覧（環境変数で指定したパスを優先）"""
+    configured = [path for path in os.getenv(FONT_PATHS_ENV, '').split(os.pathsep) if path]
+    return configured + FONT_CANDIDATES
+
+
+@lru_cache(maxsize=1)
+def resolve_font_path() -> Optional[str]:
+    """使用するフォントファイルを決定する（プロセスごとに1回だけ探索する）"""
+    for path in font_candidates():
+        if os.path.exists(path):
+            logger.info("画像出力フォント: %s", path)
+            return path
+    logger.warning("日本語フォントが見つかりません。デフォルトフォントを使用します"
+                   "（%s でフォントのパスを指定できます）", FONT_PATHS_ENV)
+    return None
+
+
+def get_font(size: int):
+    """指定サイズのフォント（スレッド・サイズごとにキャッシュ）"""
+    fonts = _thread_cache('fonts')
+    font = fonts.get(size)
+    if font is None:
+        font = fonts[size] = _load_font(size)
+    return font
+
+
+def _load_font(size: int):
+    font_path = resolve_font_path()
+    if font_path is not None:
+        try:
+            return ImageFont.truetype(font_path, size)
+        except OSError as e:
+            logger.error("フォント読み込みエラー: %s: %s", font_path, e)
+    return ImageFont.load_default()
+
+
+class TextMeasurer:
+    """文字ごとの送り幅をキャッシュして、文字列の幅計算と折り返しを行う"""
+
+    def __init__(self, font):
+        self.font = font
+        self._advances: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        ascent, descent = font.getmetrics() if hasattr(font, 'getmetrics') else (10, 2)
+        self.line_height = ascent + descent + LINE_SPACING
+
+    def measure(self, char: str) -> float:
+        """1文字の送り幅（キャッシュしない）"""
+        return self.font.getlength(char)
+
+    def advance(self, char: str) -> float:
+        width = self._advances.get(char)
+        if width is None:
+            width = self.measure(char)
+            with self._lock:
+                self._advances[char] = width
+        return width
+
+    def text_width(self, text: str) -> float:
+        return sum(self.advance(char) for char in text)
+
+    def wrap(self, text: str, max_width: float) -> List[str]:
+        """改行を保ったまま、max_width を超える行を文字単位で折り返す"""
+        lines = []
+        for paragraph in text.split('\n'):
+            line = ''
+            width = 0.0
+            for char in paragraph:
+                char_width = self.advance(char)
+                if line and width + char_width > max_width:
+                    lines.append(line)
+                    # 折り返し後の行頭の空白は詰める
+                    line, width = ('', 0.0) if char.isspace() else (char, char_width)
+                    continue
+                line += char
+                width += char_width
+            lines.append(line)
+        return lines
+
+    def block_height(self, lines: Sequence[str]) -> int:
+        return len(lines) * self.line_height
+
+
+# FreeTypeのフォントオブジェクトはスレッド間で共有しない（スレッドごとにキャッシュする）
+_thread_local = threading.local()
+
+
+def _thread_cache(name: str) -> dict:
+    cache = getattr(_thread_local, name, None)
+    if cache is None:
+        cache = {}
+        setattr(_thread_local, name, cache)
+    return cache
+
+
+def get_measurer(size: int) -> TextMeasurer:
+    """指定サイズのフォントの TextMeasurer（スレッド・サイズごとにキャッシュ）"""
+    measurers = _thread_cache('measurers')
+    measurer = measurers.get(size)
+    if measurer is None:
+        measurer = measurers[size] = TextMeasurer(get_font(size))
+    return measurer
+
+
+class MenuTableLayout:
+    """項目 × 日付の表の配置（列幅・折り返し済みのセル・行の高さ）"""
+
+    def __init__(self, index: Sequence[str], columns: Dict[str, Sequence[str]], index_label: str = '項目',
+                 index_width: int = INDEX_COLUMN_WIDTH, column_width: int = DATE_COLUMN_WIDTH,
+                 header_measurer: Optional[TextMeasurer] = None, cell_measurer: Optional[TextMeasurer] = None):
+        # 測定器を指定しない場合は画像用のフォントで測定する（PDF出力ではPDFのフォントで測定する）
+        self.header_measurer = header_measurer or get_measurer(HEADER_FONT_SIZE)
+        self.cell_measurer = cell_measurer or get_measurer(CELL_FONT_SIZE)
+        self.headers = [str(index_label)] + [str(header) for header in columns.keys()]
+        self.col_widths = [index_width] + [column_width] * len(columns)
+
+        # ヘッダー行
+        header_cells = [self._wrap(header, width, self.header_measurer)
+                        for header, width in zip(self.headers, self.col_widths)]
+        self.rows: List[List[List[str]]] = [header_cells]
+
+        # データ行
+        column_values = list(columns.values())
+        for row_num, label in enumerate(index):
+            cells = [self._wrap(label, index_width, self.cell_measurer)]
+            for values, width in zip(column_values, self.col_widths[1:]):
+                value = values[row_num] if row_num < len(values) else ''
+                cells.append(self._wrap(value, width, self.cell_measurer))
+            self.rows.append(cells)
+
+        self.row_heights = [self._row_height(cells, self.header_measurer if row_num == 0 else self.cell_measurer)
+                            for row_num, cells in enumerate(self.rows)]
+
+    @staticmethod
+    def _wrap(value, width: int, measurer: TextMeasurer) -> List[str]:
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return []
+        text = str(value)
+        if not text:
+            return []
+        return measurer.wrap(text, width - CELL_PADDING * 2)
+
+    @staticmethod
+    def _row_height(cells: List[List[str]], measurer: TextMeasurer) -> int:
+        max_lines = max((len(lines) for lines in cells), default=0)
+        return max(MIN_ROW_HEIGHT, measurer.block_height([''] * max_lines) + CELL_PADDING * 2)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return sum(self.col_widths), sum(self.row_heights)
+
+    def render(self) -> Image.Image:
+        """表を画像に描画する"""
+        img = Image.new('RGB', self.size, color='white')
+        draw = ImageDraw.Draw(img)
+        header_font = self.header_measurer.font
+        cell_font = self.cell_measurer.font
+
+        y_pos = 0
+        for row_num, (cells, row_height) in enumerate(zip(self.rows, self.row_heights)):
+            is_header = row_num == 0
+            measurer = self.header_measurer if is_header else self.cell_measurer
+            font = header_font if is_header else cell_font
+            x_pos = 0
+            for lines, col_width in zip(cells, self.col_widths):
+                draw.rectangle(
+                    [(x_pos, y_pos), (x_pos + col_width, y_pos + row_height)],
+                    fill=HEADER_FILL if is_header else 'white',
+                    outline='black'
+                )
+                for line_idx, line in enumerate(lines):
+                    if line:
+                        draw.text(
+                            (x_pos + CELL_PADDING, y_pos + CELL_PADDING + line_idx * measurer.line_height),
+                            line,
+                            font=font,
+                            fill='black'
+                        )
+                x_pos += col_width
+            y_pos += row_height
+        return img
+
+
+def split_pages(columns: Dict[str, Sequence[str]], days_per_page: int = DAYS_PER_PAGE) -> List[Dict[str, Sequence[str]]]:
+    """日付列をページごとに分割する"""
+    dates = list(columns.keys())
+    if days_per_page is None or days_per_page <= 0:
+        days_per_page = max(len(dates), 1)
+    return [{date: columns[date] for date in dates[start:start + days_per_page]}
+            for start in range(0, max(len(dates), 1), days_per_page)]
+
+
+def encode_png(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def encode_pdf_page(img: Image.Image) -> Tuple[int, int, bytes]:
+    """PDFに埋め込むページ画像（幅, 高さ, Flate圧縮したRGB）"""
+    img = img.convert('RGB')
+    return img.width, img.height, zlib.compress(img.tobytes(), 6)
+
+
+# ページ描画用のスレッドプール（フォントと送り幅のキャッシュはスレッドごとのため、
+# 呼び出しごとに作り直さずプロセス内で使い続ける）
+_render_executor: Optional[ThreadPoolExecutor] = None
+_render_executor_lock = threading.Lock()
+
+
+def _get_render_executor() -> ThreadPoolExecutor:
+    global _render_executor
+    with _render_executor_lock:
+        if _render_executor is None:
+            _render_executor = ThreadPoolExecutor(max_workers=min(MAX_RENDER_WORKERS, os.cpu_count() or 1),
+                                                  thread_name_prefix='kondate-render')
+        return _render_executor
+
+
+def render_pages(index: Sequence[str], columns: Dict[str, Sequence[str]], encode: Callable = encode_png,
+                 days_per_page: int = DAYS_PER_PAGE, index_label: str = '項目') -> Iterator:
+    """
+    ページごとに表を描画・エンコードし、ページ順に1ページずつ返す（スレッドプールで並列実行）
+
+    描画した画像はワーカー内でエンコードして破棄し、先に描画するページもワーカー数分までに限るため、
+    受け取ったページを順に書き出せば、同時に保持するページは期間の長さによらずワーカー数分程度になる。
+    """
+    index = list(index)
+    pages = split_pages(columns, days_per_page)
+
+    def render(page_columns):
+        return encode(MenuTableLayout(index, page_columns, index_label=index_label).render())
+
+    if len(pages) == 1:
+        yield render(pages[0])
+        return
+    executor = _get_render_executor()
+    pending = deque()
+    for page_columns in pages:
+        pending.append(executor.submit(render, page_columns))
+        if len(pending) > MAX_RENDER_WORKERS:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def write_raster_pdf(pages: Iterable[Tuple[int, int, bytes]], output, resolution: int = PDF_RESOLUTION) -> int:
+    """
+    encode_pdf_page のページ画像を順に書き出して複数ページのPDFを作成する（書き出したページ数を返す）
+
+    ページの画像データは受け取った順に書き出して保持しないため、pages に render_pages の結果を
+    そのまま渡せば全ページの画像をまとめて保持しない（保持するのはページごとのオフセットだけ）。
+    """
+    written = 0
+    offsets = {}
+
+    def write(data: bytes):
+        nonlocal written
+        output.write(data)
+        written += len(data)
+
+    def write_object(num: int, body: bytes, stream: Optional[bytes] = None):
+        offsets[num] = written
+        write(f"{num} 0 obj\n".encode('ascii'))
+        write(body)
+        if stream is not None:
+            write(b"\nstream\n")
+            write(stream)
+            write(b"\nendstream")
+        write(b"\nendobj\n")
+
+    write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    # 3番以降：ページごとに 画像・描画命令・ページ の3オブジェクト
+    page_refs = []
+    next_num = 3
+    scale = 72.0 / resolution
+    for width, height, data in pages:
+        image_num, content_num, page_num = next_num, next_num + 1, next_num + 2
+        next_num += 3
+        page_width, page_height = width * scale, height * scale
+        write_object(image_num, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode /Length {len(data)} >>"
+        ).encode('ascii'), data)
+        content = f"q {page_width:.2f} 0 0 {page_height:.2f} 0 0 cm /Im0 Do Q".encode('ascii')
+        write_object(content_num, f"<< /Length {len(content)} >>".encode('ascii'), content)
+        write_object(page_num, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width:.2f} {page_height:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_num} 0 R >> >> /Contents {content_num} 0 R >>"
+        ).encode('ascii'))
+        page_refs.append(f"{page_num} 0 R")
+
+    write_object(2, f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(page_refs)} >>".encode('ascii'))
+
+    # 相互参照表
+    xref_offset = written
+    write(f"xref\n0 {next_num}\n".encode('ascii'))
+    write(b"0000000000 65535 f \n")
+    for num in range(1, next_num):
+        write(f"{offsets[num]:010d} 00000 n \n".encode('ascii'))
+    write(f"trailer\n<< /Size {next_num} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode('ascii'))
+    return len(page_refs)
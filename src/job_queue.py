@@ -0,0 +1,286 @@
+"""
+時間のかかる処理のジョブキュー（Streamlit の再実行をまたいで処理を続ける）
+
+ジョブはスレッドプールで実行し、状態・進捗・結果を小さなSQLiteのテーブルに保存する。
+- 同じ種類・同じ入力（input_hash）のジョブが順番待ち・実行中なら、新しく実行せずに同じジョブを返す
+  （完了済みのジョブは再利用しないため、同じ条件での再生成は新しいジョブになる）
+- 各ジョブには登録したプロセス（pid と起動ごとのID）を記録し、登録したプロセスが終了している
+  順番待ち・実行中のジョブだけを失敗にする（同じDBを使う別のプロセスのジョブは中断しない）
+- 1人の利用者（owner）が同時に実行できるジョブ数を制限し、超えた分は順番待ちにする
+- 結果は pickle して保存する（BytesIO は bytes に変換してから返すこと）
+"""
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from log_config import get_logger
+from metrics import JOB_QUEUE_JOBS
+
+logger = get_logger(__name__)
+
+# ジョブテーブルのSQLiteファイル
+JOB_DB_ENV = 'MENU_JOB_DB'
+
+# 同時に実行するジョブ数（全体）と、1人あたりの同時実行数
+MAX_JOB_WORKERS = 4
+MAX_JOBS_PER_OWNER = 1
+
+# 完了したジョブを保持する時間（秒）
+JOB_RETENTION_SECONDS = 6 * 60 * 60
+
+# ジョブの状態
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+# このプロセスの起動ごとのID（pid が再利用された場合に前のプロセスのジョブと区別する）
+BOOT_ID = uuid.uuid4().hex
+
+# Windows の GetExitCodeProcess で実行中のプロセスを表す値
+_STILL_ACTIVE = 259
+
+
+class Job(NamedTuple):
+    """ジョブの状態"""
+    id: str
+    kind: str
+    input_hash: str
+    owner: str
+    status: str
+    progress: float
+    message: str
+    error: str
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    result: Any = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+
+def job_key(kind: str, *parts) -> str:
+    """ジョブの入力から重複判定用のハッシュを作る（bytes はそのまま、それ以外はJSONにして連結）"""
+    digest = hashlib.sha256(kind.encode('utf-8'))
+    for part in parts:
+        if isinstance(part, (bytes, bytearray)):
+            digest.update(bytes(part))
+        else:
+            digest.update(json.dumps(part, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def default_db_path() -> str:
+    return os.getenv(JOB_DB_ENV) or os.path.join(tempfile.gettempdir(), 'kondate_jobs.sqlite')
+
+
+def process_alive(pid: Optional[int]) -> bool:
+    """pid のプロセスが実行中かどうか（Windows では os.kill がプロセスを終了させるため使わない）"""
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and \
+                exit_code.value == _STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """SQLiteに状態を保存するスレッドプールのジョブキュー"""
+
+    def __init__(self, db_path: Optional[str] = None, max_workers: int = MAX_JOB_WORKERS,
+                 max_jobs_per_owner: int = MAX_JOBS_PER_OWNER):
+        self.db_path = db_path or default_db_path()
+        self.max_jobs_per_owner = max_jobs_per_owner
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='kondate-job')
+        self._lock = threading.Lock()
+        self._running_by_owner: Dict[str, int] = {}
+        self._waiting_by_owner: Dict[str, deque] = {}
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, kind TEXT, input_hash TEXT, owner TEXT, status TEXT, '
+                'progress REAL, message TEXT, error TEXT, result BLOB, '
+                'created_at REAL, started_at REAL, finished_at REAL, pid INTEGER, boot_id TEXT)'
+            )
+            # 以前のバージョンで作成したテーブルには登録したプロセスの列がない
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for column, column_type in (('pid', 'INTEGER'), ('boot_id', 'TEXT')):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_input_hash ON jobs (kind, input_hash)')
+        self.recover()
+        self.purge()
+
+    def recover(self):
+        """
+        登録したプロセスが終了している順番待ち・実行中のジョブを失敗にする（再開できないため）
+
+        同じ pid でも起動ごとのIDが異なる場合は終了したプロセスのジョブとみなす。
+        pid が別のプロセスに再利用されて残り続けないよう、保持期間を過ぎたものも失敗にする。
+        """
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT id, pid, boot_id, created_at FROM jobs WHERE status IN (?, ?)', ACTIVE_STATUSES
+            ).fetchall()
+            orphaned = [
+                job_id for job_id, pid, boot_id, created_at in rows
+                if (boot_id != BOOT_ID if pid == os.getpid() else not process_alive(pid))
+                or created_at < now - JOB_RETENTION_SECONDS
+            ]
+            conn.executemany(
+                'UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?',
+                [(FAILED, 'サーバーの再起動により中断されました', now, job_id) for job_id in orphaned],
+            )
+        if orphaned:
+            logger.warning("中断されたジョブを失敗にしました: %s件", len(orphaned))
+
+    def submit(self, kind: str, input_hash: str, fn: Callable[[Callable[[float, str], None]], Any],
+               owner: str = '') -> str:
+        """
+        ジョブを登録する（同じ入力のジョブが順番待ち・実行中ならそのIDを返す）
+
+        Args:
+            kind (str): ジョブの種類
+            input_hash (str): 入力のハッシュ（job_key で作成）
+            fn: 実行する関数。進捗を報告する progress(割合 0〜1, メッセージ) を引数に受け取り、結果を返す
+            owner (str): 利用者の識別子（同時実行数の制限に使う）
+
+        Returns:
+            str: ジョブID
+        """
+        with self._lock:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT id FROM jobs WHERE kind = ? AND input_hash = ? AND status IN (?, ?) '
+                    'ORDER BY created_at DESC LIMIT 1',
+                    (kind, input_hash, *ACTIVE_STATUSES),
+                ).fetchone()
+                if row:
+                    logger.info("同じ入力のジョブを再利用します: %s %s", kind, row[0])
+                    return row[0]
+
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    'INSERT INTO jobs (id, kind, input_hash, owner, status, progress, message, error, '
+                    'created_at, pid, boot_id) VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?)',
+                    (job_id, kind, input_hash, owner, QUEUED, '順番待ち', '', time.time(), os.getpid(), BOOT_ID),
+                )
+
+            # 利用者ごとの同時実行数を超える場合は順番待ちにする
+            if self._running_by_owner.get(owner, 0) < self.max_jobs_per_owner:
+                self._start(job_id, fn, owner)
+            else:
+                self._waiting_by_owner.setdefault(owner, deque()).append((job_id, fn))
+        logger.info("ジョブを登録しました: %s %s", kind, job_id)
+        return job_id
+
+    def _start(self, job_id: str, fn, owner: str):
+        """ジョブをスレッドプールに投入する（self._lock を保持した状態で呼ぶ）"""
+        self._running_by_owner[owner] = self._running_by_owner.get(owner, 0) + 1
+        self._executor.submit(self._run, job_id, fn, owner)
+
+    def _run(self, job_id: str, fn, owner: str):
+        self._update(job_id, status=RUNNING, started_at=time.time(), message='処理中')
+        try:
+            result = fn(lambda progress, message='': self.update_progress(job_id, progress, message))
+            self._update(job_id, status=DONE, progress=1.0, message='完了', finished_at=time.time(),
+                         result=pickle.dumps(result))
+        except Exception as e:
+            logger.exception("ジョブが失敗しました: %s %s", job_id, e)
+            self._update(job_id, status=FAILED, message='失敗', error=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                self._running_by_owner[owner] -= 1
+                waiting = self._waiting_by_owner.get(owner)
+                if waiting:
+                    next_id, next_fn = waiting.popleft()
+                    self._start(next_id, next_fn, owner)
+
+    def _update(self, job_id: str, **fields):
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def update_progress(self, job_id: str, progress: float, message: str = ''):
+        """ジョブの進捗を更新する（0〜1）"""
+        self._update(job_id, progress=max(0.0, min(1.0, float(progress))), message=message or '処理中')
+
+    def get(self, job_id: str, with_result: bool = True) -> Optional[Job]:
+        """ジョブの状態を取得する（完了済みで with_result が True の場合は結果も読み込む）"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT id, kind, input_hash, owner, status, progress, message, error, created_at, '
+                'started_at, finished_at, CASE WHEN ? THEN result END FROM jobs WHERE id = ?',
+                (with_result, job_id),
+            ).fetchone()
+        if row is None:
+            return None
+        result = pickle.loads(row[-1]) if row[-1] is not None else None
+        return Job(*row[:-1], result=result)
+
+    def depth(self) -> Dict[tuple, float]:
+        """このプロセスで順番待ち・実行中のジョブ数（計測値のゲージに使う）"""
+        with self._lock:
+            queued = sum(len(waiting) for waiting in self._waiting_by_owner.values())
+            running = sum(self._running_by_owner.values())
+        return {(QUEUED,): queued, (RUNNING,): running}
+
+    def purge(self, older_than: float = JOB_RETENTION_SECONDS):
+        """保持期間を過ぎた完了済みジョブを削除する"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?',
+                         (DONE, FAILED, time.time() - older_than))
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """プロセス内で共有するジョブキュー（Streamlit の再実行やセッションをまたいで同じものを使う）"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+            JOB_QUEUE_JOBS.set_function(_job_queue.depth)
+        return _job_queue
@@ -0,0 +1,300 @@
+"""
+献立システムのコマンドライン
+
+    python kondate.py batch "menus/*.xlsx" --operation desserts --output-dir out --workers 4
+    python kondate.py history サバの味噌煮            # 料理を提供した日（完全一致がなければ部分一致の料理）
+    python kondate.py import-history "archive/2023/*.xlsx" --year 2023  # 過去の献立表を履歴に取り込む
+
+batch は入力ファイル（globパターン）をプロセスプールで並行して処理し、出力ファイルと
+ファイルごとの処理時間（段階ごとの内訳を含む）をまとめたJSONを出力先フォルダに書き出す。
+LLMの応答キャッシュ（SQLite）とレート制限は全ワーカーで共有する。進捗は端末に進捗バーで表示する。
+--profile を指定すると、ファイルごとの処理のプロファイル（HTML）を出力ファイルと同じフォルダに保存する。
+history / import-history は献立の履歴（history.py）を検索・追加する（取り込みではデザートを生成しない）。
+"""
+import argparse
+import glob
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import history
+from llm_client import LLM_CACHE_ENV, configure_rate_limiter
+from log_config import LOG_LEVEL_ENV, configure_logging, get_logger
+from profiling import PROFILE_ENV, profile, profiling_enabled
+from progress import ProgressReporter, TTYProgressBar
+
+# 一括処理の操作
+OPERATIONS = ('desserts', 'reorder', 'image', 'orders')
+
+# 既定のワーカー数とLLMの1分あたりの最大リクエスト数
+DEFAULT_WORKERS = 4
+DEFAULT_RPM = 15
+
+logger = get_logger(__name__)
+
+
+def expand_inputs(patterns):
+    """globパターンを入力ファイルのリストに展開する（Excelの一時ファイル「~$」は除く）"""
+    files = []
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) or ([pattern] if os.path.isfile(pattern) else [])
+        files.extend(path for path in sorted(matches)
+                     if os.path.isfile(path) and not os.path.basename(path).startswith('~$'))
+    return list(dict.fromkeys(os.path.abspath(path) for path in files))
+
+
+def output_path(output_dir: str, input_path: str, suffix: str, ext: str) -> str:
+    """入力ファイル名から出力ファイルのパスを作る"""
+    return os.path.join(output_dir, f"{Path(input_path).stem}_{suffix}{ext}")
+
+
+def _init_worker(cache_path, rpm, lock, last_call):
+    """ワーカープロセスの初期化（キャッシュとレート制限を共有し、自動オープンを無効にする）"""
+    if cache_path:
+        os.environ[LLM_CACHE_ENV] = cache_path
+    os.environ.pop('MENU_AUTO_OPEN', None)
+    configure_rate_limiter(rpm, lock=lock, last_call=last_call)
+    # ログの出力スレッドは子プロセスに引き継がれないため、ワーカーごとに設定し直す
+    configure_logging()
+
+
+def run_operation(operation: str, input_path: str, output_dir: str, options: dict, progress=None) -> list:
+    """1ファイル分の処理を実行し、出力ファイルのリストを返す（progress には desserts・reorder の段階を通知）"""
+    import menu_updater
+
+    if operation == 'desserts':
+        result = menu_updater.update_menu_with_desserts(
+            input_path, output_path(output_dir, input_path, 'desserts', '.xlsx'), progress=progress)
+        outputs = [result] if result else []
+    elif operation == 'reorder':
+        result = menu_updater.update_menu_with_reordering(
+            input_path, output_path(output_dir, input_path, 'reordered', '.xlsx'),
+            reorder_type=options['reorder_type'], progress=progress)
+        outputs = [result] if result else []
+    elif operation == 'image':
+        ext = '.pdf' if options['image_format'] == 'pdf' else '.png'
+        target = output_path(output_dir, input_path, 'menu', ext)
+        if options['image_format'] == 'pdf':
+            result = menu_updater.generate_menu_pdf_output(input_path, target)
+            outputs = [result] if result else []
+        else:
+            outputs = menu_updater.generate_menu_image_output(input_path, target) or []
+    elif operation == 'orders':
+        specs = [{'destination': destination, 'person_count': options['person_count'],
+                  'window_days': options['window_days']} for destination in options['destinations']]
+        if len(specs) == 1:
+            result = menu_updater.create_order_sheets(
+                input_path, output_path(output_dir, input_path, f"発注書_{specs[0]['destination']}", '.xlsx'),
+                **specs[0])
+        else:
+            result = menu_updater.create_order_sheets_batch(
+                input_path, specs, output_path(output_dir, input_path, '発注書', '.zip'))
+        outputs = [result] if result else []
+    else:
+        raise ValueError(f"未対応の操作です: {operation}")
+
+    if not outputs:
+        raise RuntimeError("出力ファイルが作成されませんでした")
+    return [str(path) for path in outputs]
+
+
+def run_batch_job(operation: str, input_path: str, output_dir: str, options: dict) -> dict:
+    """ワーカーで1ファイルを処理し、結果と処理時間（段階ごとの内訳を含む）を返す（例外は結果に記録する）"""
+    started = time.perf_counter()
+    progress = ProgressReporter()
+    profile_path = output_path(output_dir, input_path, f'{operation}_profile', '.html') if profiling_enabled() else None
+    try:
+        if profile_path:
+            with profile(profile_path, title=f"{operation}: {Path(input_path).name}"):
+                outputs = run_operation(operation, input_path, output_dir, options, progress=progress)
+        else:
+            outputs = run_operation(operation, input_path, output_dir, options, progress=progress)
+        result = {'input': input_path, 'status': 'ok', 'outputs': outputs}
+    except Exception as e:
+        logger.exception("処理に失敗しました: %s", input_path)
+        result = {'input': input_path, 'status': 'error', 'outputs': [], 'error': str(e)}
+    if profile_path and os.path.exists(profile_path):
+        result['profile'] = profile_path
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    result['stages'] = {stage: round(seconds, 3) for stage, seconds in progress.durations.items()}
+    return result
+
+
+def run_batch(inputs, operation: str, output_dir: str, options: dict, workers: int = DEFAULT_WORKERS,
+              cache_path: str = None, rpm: float = DEFAULT_RPM) -> dict:
+    """
+    入力ファイルをプロセスプールで処理し、処理結果のまとめを返す
+
+    Args:
+        inputs (list): 入力ファイルのパス
+        operation (str): OPERATIONS のいずれか
+        output_dir (str): 出力先フォルダ
+        options (dict): 操作ごとの設定
+        workers (int): ワーカープロセス数
+        cache_path (str, optional): LLM応答キャッシュのSQLiteファイル（Noneの場合はキャッシュしない）
+        rpm (float): 全ワーカー合計でのLLMの1分あたりの最大リクエスト数（0で制限なし）
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    started_at = datetime.now()
+    started = time.perf_counter()
+
+    # レート制限の状態はワーカー間で共有する
+    lock = multiprocessing.Lock()
+    last_call = multiprocessing.Value('d', 0.0, lock=False)
+
+    results = []
+    bar = TTYProgressBar()
+    progress = ProgressReporter(bar)
+    progress.start('一括処理', len(inputs))
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(inputs) or 1)), initializer=_init_worker,
+                             initargs=(cache_path, rpm, lock, last_call)) as executor:
+        futures = {executor.submit(run_batch_job, operation, path, output_dir, options): path for path in inputs}
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            progress.advance(message=f"{result['status']}: {Path(result['input']).name}（{result['seconds']}秒）")
+    progress.finish()
+    bar.close()
+
+    order = {path: pos for pos, path in enumerate(inputs)}
+    results.sort(key=lambda result: order[result['input']])
+    return {
+        'operation': operation,
+        'options': options,
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'workers': workers,
+        'total_seconds': round(time.perf_counter() - started, 3),
+        'succeeded': sum(result['status'] == 'ok' for result in results),
+        'failed': sum(result['status'] != 'ok' for result in results),
+        'files': results,
+    }
+
+
+def batch_command(args) -> int:
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        print("入力ファイルが見つかりません")
+        return 1
+
+    output_dir = os.path.abspath(args.output_dir)
+    cache_path = None if args.no_cache else os.path.abspath(args.cache or os.path.join(output_dir, 'llm_cache.sqlite'))
+    options = {
+        'reorder_type': args.reorder_type,
+        'image_format': args.image_format,
+        'destinations': args.destination or ['宝成'],
+        'person_count': args.person_count,
+        'window_days': args.window_days,
+    }
+    print(f"一括処理開始: {args.operation}, {len(inputs)}ファイル, ワーカー{args.workers}")
+
+    summary = run_batch(inputs, args.operation, output_dir, options, workers=args.workers,
+                        cache_path=cache_path, rpm=args.rpm)
+
+    summary_path = os.path.join(output_dir, f"batch_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"一括処理完了: 成功{summary['succeeded']}件, 失敗{summary['failed']}件, "
+          f"{summary['total_seconds']}秒 → {summary_path}")
+    return 0 if summary['failed'] == 0 else 1
+
+
+def history_command(args) -> int:
+    started = time.perf_counter()
+    servings = [] if args.category else history.dish_history(args.dish, limit=args.limit)
+    if servings:
+        print(f"{args.dish}: {len(servings)}件（新しい順）")
+        for serving in servings:
+            print(f"  {serving.served_on} {serving.meal_type}（{serving.source}）")
+    else:
+        dishes = history.find_dishes(args.dish, category=args.category, limit=args.limit)
+        if not dishes:
+            print(f"履歴に該当する料理がありません: {args.dish}")
+            return 1
+        print(f"「{args.dish}」を含む料理: {len(dishes)}件（最後に提供した日の新しい順）")
+        for dish in dishes:
+            print(f"  {dish.last_served} {dish.name}（{dish.category}、{dish.times}回）")
+    print(f"（{(time.perf_counter() - started) * 1000:.1f}ms）")
+    return 0
+
+
+def import_history_command(args) -> int:
+    """過去の献立表を解析して履歴に保存する（栄養価は計算し、デザートは生成しない）"""
+    import pandas as pd
+    import menu_updater
+
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        print("入力ファイルが見つかりません")
+        return 1
+    failed = 0
+    for path in inputs:
+        try:
+            with open(path, 'rb') as f:
+                df_dict = pd.read_excel(io.BytesIO(f.read()), sheet_name=None)
+            book = menu_updater.parse_menu_book(df_dict)
+            saved = history.record_book(book, year=args.year)
+            print(f"{Path(path).name}: {saved}日分")
+        except Exception as e:
+            logger.exception("履歴の取り込みに失敗しました: %s", path)
+            print(f"{Path(path).name}: 失敗（{e}）")
+            failed += 1
+    return 0 if failed == 0 else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='kondate', description='献立システムのコマンドライン')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batch = subparsers.add_parser('batch', help='複数の献立ファイルをまとめて処理します')
+    batch.add_argument('inputs', nargs='+', help='入力Excelファイル（globパターン可、例: "menus/**/*.xlsx"）')
+    batch.add_argument('--operation', choices=OPERATIONS, default='desserts', help='処理の種類')
+    batch.add_argument('--output-dir', default='batch_output', help='出力先フォルダ')
+    batch.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='ワーカープロセス数')
+    batch.add_argument('--rpm', type=float, default=DEFAULT_RPM,
+                       help='全ワーカー合計のLLMの1分あたりの最大リクエスト数（0で制限なし）')
+    batch.add_argument('--cache', help='LLM応答キャッシュのSQLiteファイル（既定は出力先フォルダ内）')
+    batch.add_argument('--no-cache', action='store_true', help='LLM応答をキャッシュしない')
+    batch.add_argument('--reorder-type', default='栄養バランス優先並び替え', help='reorder の並び替え戦略')
+    batch.add_argument('--image-format', choices=('png', 'pdf'), default='png', help='image の出力形式')
+    batch.add_argument('--destination', action='append', help='orders の送り先（複数指定でZIPにまとめる）')
+    batch.add_argument('--person-count', type=int, default=45, help='orders の人数')
+    batch.add_argument('--window-days', type=int, default=2, help='orders の発注合計の納品日数')
+    batch.add_argument('--log-level', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+                       help=f'ログの出力レベル（既定は {LOG_LEVEL_ENV} または INFO）')
+    batch.add_argument('--profile', action='store_true',
+                       help=f'ファイルごとの処理のプロファイル（HTML）を出力先フォルダに保存する（{PROFILE_ENV}=1 と同じ）')
+    batch.set_defaults(func=batch_command)
+
+    lookup = subparsers.add_parser('history', help='料理を提供した日を献立の履歴から調べます')
+    lookup.add_argument('dish', nargs='?', default='', help='料理名（完全一致がなければ部分一致で検索）')
+    lookup.add_argument('--category', help='カテゴリで絞り込む（肉・魚・麺類・米・野菜・汁物・デザート・不明）')
+    lookup.add_argument('--limit', type=int, default=20, help='表示する件数')
+    lookup.set_defaults(func=history_command)
+
+    backfill = subparsers.add_parser('import-history', help='過去の献立表を献立の履歴に取り込みます')
+    backfill.add_argument('inputs', nargs='+', help='入力Excelファイル（globパターン可）')
+    backfill.add_argument('--year', type=int, help='シート名の日付の年（既定は今日に最も近い年）')
+    backfill.set_defaults(func=import_history_command)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'log_level', None):
+        # ワーカープロセスにも環境変数で引き継ぐ
+        os.environ[LOG_LEVEL_ENV] = args.log_level
+        configure_logging(args.log_level)
+    if getattr(args, 'profile', False):
+        os.environ[PROFILE_ENV] = '1'
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
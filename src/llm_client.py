@@ -0,0 +1,168 @@
+"""
+Gemini 呼び出しの共通処理（応答キャッシュとレート制限）
+
+- 応答キャッシュ: MENU_LLM_CACHE にSQLiteファイルのパスを指定すると、同じモデル・同じプロンプトの
+  応答を再利用する。SQLiteなので一括処理の複数プロセスから同じファイルを共有できる。
+- レート制限: MENU_LLM_RPM に1分あたりの最大リクエスト数を指定すると、呼び出し間隔を空ける。
+  一括処理ではプロセス間で共有するロックと時刻を configure_rate_limiter で設定する。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from log_config import get_logger
+from tracing import span
+
+logger = get_logger(__name__)
+
+# 応答キャッシュのSQLiteファイル（未設定の場合はキャッシュしない）
+LLM_CACHE_ENV = 'MENU_LLM_CACHE'
+# 1分あたりの最大リクエスト数（未設定または0の場合は制限しない）
+LLM_RPM_ENV = 'MENU_LLM_RPM'
+
+# LLM呼び出しのスパン名（属性: model, prompt_chars, cache, prompt_tokens, completion_tokens）
+LLM_SPAN = 'LLM呼び出し'
+
+
+class CachedResponse(NamedTuple):
+    """キャッシュから返す応答（generate_content の応答と同じく text で本文を参照する）"""
+    text: str
+
+
+class RateLimiter:
+    """呼び出しの最小間隔を守るレート制限（ロックと前回時刻を差し替えるとプロセス間で共有できる）"""
+
+    def __init__(self, min_interval: float = 0.0, lock=None, last_call=None):
+        self.min_interval = min_interval
+        self._lock = lock if lock is not None else threading.Lock()
+        self._last_call = last_call  # multiprocessing.Value('d') など（None の場合はプロセス内のみ）
+        self._local_last_call = 0.0
+
+    def wait(self):
+        """前回の呼び出しから min_interval 秒経つまで待つ"""
+        if self.min_interval <= 0:
+            return
+        with self._lock:
+            last_call = self._last_call.value if self._last_call is not None else self._local_last_call
+            delay = last_call + self.min_interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            now = time.time()
+            if self._last_call is not None:
+                self._last_call.value = now
+            else:
+                self._local_last_call = now
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def rpm_interval(rpm) -> float:
+    """1分あたりのリクエスト数から呼び出し間隔（秒）を求める"""
+    try:
+        rpm = float(rpm or 0)
+    except ValueError:
+        return 0.0
+    return 60.0 / rpm if rpm > 0 else 0.0
+
+
+def configure_rate_limiter(rpm=None, lock=None, last_call=None) -> RateLimiter:
+    """レート制限を設定する（一括処理のワーカー初期化時に共有ロック・時刻を渡す）"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = RateLimiter(rpm_interval(rpm), lock=lock, last_call=last_call)
+        return _rate_limiter
+
+
+def get_rate_limiter() -> RateLimiter:
+    """現在のレート制限（未設定の場合は MENU_LLM_RPM から作成）"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(rpm_interval(os.getenv(LLM_RPM_ENV)))
+        return _rate_limiter
+
+
+def _cache_key(model_name: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model_name}\n{prompt}".encode('utf-8')).hexdigest()
+
+
+def _connect_cache(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS llm_cache ('
+        'key TEXT PRIMARY KEY, model TEXT, response TEXT, created_at REAL)'
+    )
+    return conn
+
+
+def cache_lookup(path: str, key: str) -> Optional[str]:
+    """キャッシュから応答を取得する（無い場合はNone）"""
+    try:
+        with _connect_cache(path) as conn:
+            row = conn.execute('SELECT response FROM llm_cache WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        logger.warning("LLMキャッシュの読み込みに失敗しました: %s", e)
+        return None
+
+
+def cache_store(path: str, key: str, model_name: str, text: str):
+    """応答をキャッシュに保存する"""
+    try:
+        with _connect_cache(path) as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, model, response, created_at) VALUES (?, ?, ?, ?)',
+                (key, model_name, text, time.time()),
+            )
+    except sqlite3.Error as e:
+        logger.warning("LLMキャッシュの保存に失敗しました: %s", e)
+
+
+def usage_attributes(response) -> dict:
+    """応答に含まれるトークン数（使用量が含まれない応答は空の辞書）"""
+    usage = getattr(response, 'usage_metadata', None)
+    attributes = {}
+    for name, field in (('prompt_tokens', 'prompt_token_count'), ('completion_tokens', 'candidates_token_count')):
+        count = getattr(usage, field, None) if usage is not None else None
+        if count:
+            attributes[name] = int(count)
+    return attributes
+
+
+def generate_content(model, prompt: str):
+    """
+    model.generate_content(prompt) をキャッシュとレート制限付きで呼び出す
+
+    Args:
+        model: genai.GenerativeModel
+        prompt (str): プロンプト
+
+    Returns:
+        応答（text 属性で本文を参照する）
+    """
+    cache_path = os.getenv(LLM_CACHE_ENV)
+    model_name = getattr(model, 'model_name', '')
+    key = _cache_key(model_name, prompt) if cache_path else None
+
+    with span(LLM_SPAN, model=model_name, prompt_chars=len(prompt)) as llm_span:
+        if key is not None:
+            cached = cache_lookup(cache_path, key)
+            if cached is not None:
+                logger.debug("LLMの応答をキャッシュから取得しました")
+                llm_span.set(cache='hit')
+                return CachedResponse(cached)
+
+        llm_span.set(cache='miss' if key is not None else 'off')
+        get_rate_limiter().wait()
+        response = model.generate_content(prompt)
+        llm_span.set(**usage_attributes(response))
+
+        if key is not None and response.text:
+            cache_store(cache_path, key, model_name, response.text)
+        return response
@@ -0,0 +1,121 @@
+"""
+ログ出力の設定（レベル・JSON形式・キューによる非同期出力）
+
+各モジュールは get_logger(__name__) でロガーを取得し、logger.debug("... %s", 値) のように
+書式の引数を分けて渡す（出力しないレベルのログは文字列を組み立てない）。
+- MENU_LOG_LEVEL: 出力するレベル（DEBUG / INFO / WARNING / ERROR、既定は INFO）
+- MENU_LOG_FORMAT: 'json' を指定すると1行1件のJSONで出力する（既定はテキスト）
+ログはキューに積んで別スレッドで書き出すため、処理中のスレッドは標準出力への書き込みを待たない。
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+from typing import Optional
+
+# 出力するレベルと出力形式の環境変数
+LOG_LEVEL_ENV = 'MENU_LOG_LEVEL'
+LOG_FORMAT_ENV = 'MENU_LOG_FORMAT'
+
+DEFAULT_LOG_LEVEL = 'INFO'
+
+# このシステムのロガーの親（get_logger で作るロガーはすべてこの下に置く）
+ROOT_LOGGER_NAME = 'kondate'
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+# LogRecord の標準の属性（JSON出力で extra の項目と区別する）
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """ログを1行1件のJSONにする（logger.info(..., extra={...}) の項目も出力する）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """メッセージだけ組み立ててキューに積む（例外情報は出力側の Formatter で整形する）"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level: Optional[str] = None, json_format: Optional[bool] = None, stream=None) -> logging.Logger:
+    """
+    ログ出力を設定する（再度呼ぶと設定し直す）
+
+    Args:
+        level (str, optional): 出力するレベル（Noneの場合は MENU_LOG_LEVEL、未設定なら INFO）
+        json_format (bool, optional): JSON形式で出力するか（Noneの場合は MENU_LOG_FORMAT が 'json' か）
+        stream: 出力先（Noneの場合は標準出力）
+
+    Returns:
+        logging.Logger: このシステムの親ロガー
+    """
+    global _listener
+    level = (level or os.getenv(LOG_LEVEL_ENV) or DEFAULT_LOG_LEVEL).upper()
+    if json_format is None:
+        json_format = os.getenv(LOG_FORMAT_ENV, '').lower() == 'json'
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+        log_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+        _listener.start()
+
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        for old in list(root.handlers):
+            root.removeHandler(old)
+        root.addHandler(_QueueHandler(log_queue))
+        root.setLevel(getattr(logging, level, logging.INFO))
+        root.propagate = False
+    return root
+
+
+def shutdown_logging():
+    """キューに残っているログを書き出して出力スレッドを止める"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """モジュールのロガーを取得する（ログ出力が未設定なら環境変数の設定で初期化する）"""
+    if _listener is None:
+        configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
@@ -0,0 +1,249 @@
+"""
+献立データのインメモリモデル
+
+日付 → 食事区分 → 料理 → 食材 の階層を __slots__ 付きの dataclass で保持する。
+改行区切りの文字列への変換は Excel / 画像出力の直前（to_rows / to_dataframe）でのみ行う。
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# 食事区分
+MEAL_TYPES = ('朝食', '昼食', '夕食')
+
+# 出力表の項目（行）
+ITEM_LABELS = [
+    '栄養素',
+    '朝食',
+    '朝食：食材',
+    '昼食 (主菜/副菜/汁物)',
+    '昼食：食材/1人分/45人分',
+    '夕食 (主菜/副菜/小鉢/汁物)',
+    '夕食：食材/1人分/45人分'
+]
+
+# 各食事区分のメニュー行のインデックス（食材行は +1）
+MENU_ROW_INDEX = {'朝食': 1, '昼食': 3, '夕食': 5}
+
+# 総量計算の基準人数
+DEFAULT_PERSON_COUNT = 45
+
+# 「- 食材名: 10g/450g」形式の材料行
+_MATERIAL_LINE_PATTERN = re.compile(r'^\s*-\s*([^:：]+)[:：]\s*(.+?)\s*$')
+_AMOUNT_PATTERN = re.compile(r'^([\d.]+)\s*([^\d/\s]*)')
+
+# 料理のカテゴリ → 料理名に含まれるキーワード（identify_dish_category で上から順に判定する）
+DISH_CATEGORIES = {
+    '肉': ['肉', 'ミート', 'ハンバーグ', 'ステーキ', 'カツ', '唐揚げ', 'チキン', '鶏', '豚', '牛', 'ウィンナー', 'ソーセージ', 'ベーコン'],
+    '魚': ['魚', '鮭', 'サバ', 'サンマ', 'アジ', 'カレイ', 'ブリ', '刺身', '寿司', '海鮮', 'シーフード'],
+    '麺類': ['麺', 'うどん', 'そば', 'パスタ', 'ラーメン', 'スパゲッティ', '焼きそば'],
+    '米': ['ご飯', '米', 'チャーハン', '炊き込み', 'おにぎり'],
+    '野菜': ['サラダ', '野菜', 'ほうれん草', 'キャベツ', 'ブロッコリー', '人参', 'トマト'],
+    '汁物': ['スープ', '味噌汁', 'みそ汁', '吸い物', 'ポタージュ', 'シチュー'],
+    'デザート': ['ケーキ', 'プリン', 'ゼリー', 'アイス', 'デザート', 'フルーツ', '果物', 'ヨーグルト']
+}
+
+# 栄養素名 → (属性名, 単位)
+NUTRIENTS = {
+    'エネルギー': ('energy', 'kcal'),
+    'タンパク質': ('protein', 'g'),
+    '脂質': ('fat', 'g'),
+    '炭水化物': ('carbs', 'g'),
+    'カルシウム': ('calcium', 'mg'),
+    '鉄分': ('iron', 'mg'),
+    '食物繊維': ('fiber', 'g'),
+}
+
+
+@dataclass(slots=True)
+class NutritionRecord:
+    """1日分の栄養価（数値）。表示用テキストは to_text() で必要な時に生成する"""
+    energy: float = 0.0
+    protein: float = 0.0
+    fat: float = 0.0
+    carbs: float = 0.0
+    calcium: float = 0.0
+    iron: float = 0.0
+    fiber: float = 0.0
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, float]) -> 'NutritionRecord':
+        """{'エネルギー': 1800, ...} 形式の辞書から作成する"""
+        record = cls()
+        for nutrient, (attr, _) in NUTRIENTS.items():
+            if nutrient in values:
+                setattr(record, attr, float(values[nutrient]))
+        return record
+
+    def as_dict(self) -> Dict[str, float]:
+        """{'エネルギー': 1800.0, ...} 形式の辞書に変換する"""
+        return {nutrient: getattr(self, attr) for nutrient, (attr, _) in NUTRIENTS.items()}
+
+    def to_text(self) -> str:
+        """出力表に表示する栄養価テキストを生成する"""
+        return f"""1日の栄養価合計（目安）:
+エネルギー: {self.energy:.0f} kcal
+タンパク質: {self.protein:.1f} g
+脂質: {self.fat:.1f} g
+炭水化物: {self.carbs:.1f} g
+カルシウム: {self.calcium:.0f} mg
+鉄分: {self.iron:.1f} mg
+食物繊維: {self.fiber:.1f} g"""
+
+
+@dataclass(slots=True)
+class Ingredient:
+    """料理の食材（量は1人分）"""
+    name: str
+    amount: Optional[float] = None
+    unit: str = 'g'
+    note: str = ''  # 数値化できない量（「適量」など）
+
+    def format_line(self, person_count: int = DEFAULT_PERSON_COUNT) -> str:
+        """「食材名: 1人分/総量」形式の文字列に変換する"""
+        if self.amount is None:
+            return f"{self.name}: {self.note}"
+        return f"{self.name}: {self.amount}{self.unit}/{self.amount * person_count}{self.unit}"
+
+
+@dataclass(slots=True)
+class Dish:
+    """料理"""
+    name: str
+    ingredients: List[Ingredient] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class Meal:
+    """食事区分（朝食・昼食・夕食）ごとの料理リスト"""
+    meal_type: str
+    dishes: List[Dish] = field(default_factory=list)
+
+    def dish_names(self) -> List[str]:
+        return [dish.name for dish in self.dishes]
+
+    def find_dish(self, name: str) -> Optional[Dish]:
+        for dish in self.dishes:
+            if dish.name == name:
+                return dish
+        return None
+
+
+@dataclass(slots=True)
+class DayMenu:
+    """1日分の献立"""
+    date: str
+    meals: Dict[str, Meal] = field(default_factory=lambda: {meal_type: Meal(meal_type) for meal_type in MEAL_TYPES})
+    nutrition: Optional[NutritionRecord] = None
+    nutrition_note: str = ''  # 栄養価がない場合に栄養価の行に表示するテキスト
+
+    @property
+    def nutrition_text(self) -> str:
+        return self.nutrition.to_text() if self.nutrition is not None else self.nutrition_note
+
+    def menu_names(self) -> Dict[str, List[str]]:
+        """食事区分ごとの料理名リスト（{'朝食': [...], ...}）"""
+        return {meal_type: meal.dish_names() for meal_type, meal in self.meals.items()}
+
+    def ingredient_lines(self, person_count: int = DEFAULT_PERSON_COUNT) -> Dict[str, Dict[str, List[str]]]:
+        """食事区分・料理ごとの食材行（{'朝食': {'料理名': ['食材: 1人分/総量', ...]}}）"""
+        return {
+            meal_type: {dish.name: [ing.format_line(person_count) for ing in dish.ingredients] for dish in meal.dishes}
+            for meal_type, meal in self.meals.items()
+        }
+
+    def to_rows(self, person_count: int = DEFAULT_PERSON_COUNT) -> List[str]:
+        """出力表の1列分（ITEM_LABELSの順）の文字列に変換する"""
+        rows = [''] * len(ITEM_LABELS)
+        rows[0] = self.nutrition_text
+        for meal_type, menu_idx in MENU_ROW_INDEX.items():
+            meal = self.meals.get(meal_type)
+            if meal is None:
+                continue
+            rows[menu_idx] = '\n'.join(meal.dish_names())
+            dish_texts = []
+            for dish in meal.dishes:
+                lines = [dish.name] + [f"  - {ing.format_line(person_count)}" for ing in dish.ingredients]
+                dish_texts.append('\n'.join(lines))
+            rows[menu_idx + 1] = '\n'.join(dish_texts)
+        return rows
+
+
+class MenuBook:
+    """日付順の献立（1ワークブック分）"""
+    __slots__ = ('days',)
+
+    def __init__(self, days: Optional[Dict[str, DayMenu]] = None):
+        self.days: Dict[str, DayMenu] = days if days is not None else {}
+
+    def __len__(self):
+        return len(self.days)
+
+    def dates(self) -> List[str]:
+        return list(self.days.keys())
+
+    def add_day(self, day: DayMenu):
+        self.days[day.date] = day
+
+    def menu_names_by_date(self) -> Dict[str, Dict[str, List[str]]]:
+        """日付ごとの料理名リスト（栄養計算・並び替え・LLMプロンプト用）"""
+        return {date: day.menu_names() for date, day in self.days.items()}
+
+    def nutrition_by_date(self) -> Dict[str, Dict[str, float]]:
+        """日付ごとの栄養価（{'エネルギー': 1800.0, ...}、未計算の日は空の辞書）"""
+        return {date: day.nutrition.as_dict() if day.nutrition is not None else {} for date, day in self.days.items()}
+
+    def reordered(self, order: List[str]) -> 'MenuBook':
+        """指定した日付順に並べ替えた新しいMenuBookを返す（指定外の日付は末尾に残す）"""
+        days = {date: self.days[date] for date in order if date in self.days}
+        for date, day in self.days.items():
+            if date not in days:
+                days[date] = day
+        return MenuBook(days)
+
+    def to_combined_data(self, person_count: int = DEFAULT_PERSON_COUNT) -> dict:
+        """従来の {'項目': [...], '日付': [7項目の文字列]} 形式に変換する"""
+        combined_data = {'項目': list(ITEM_LABELS)}
+        for date, day in self.days.items():
+            combined_data[date] = day.to_rows(person_count)
+        return combined_data
+
+    def to_columns(self, person_count: int = DEFAULT_PERSON_COUNT) -> Dict[str, List[str]]:
+        """日付 → 項目順（ITEM_LABELS）のセル値（Excel出力にDataFrameを作らずに渡す）"""
+        return {date: day.to_rows(person_count) for date, day in self.days.items()}
+
+    def to_dataframe(self, person_count: int = DEFAULT_PERSON_COUNT):
+        """項目を行インデックス、日付を列とするDataFrameに変換する"""
+        import pandas as pd
+        return pd.DataFrame(self.to_columns(person_count), index=list(ITEM_LABELS))
+
+
+def identify_dish_category(dish_name: str) -> str:
+    """料理名からカテゴリを判別する（該当しない場合は '不明'）"""
+    dish_name = dish_name.lower()
+    for category, keywords in DISH_CATEGORIES.items():
+        for keyword in keywords:
+            if keyword in dish_name:
+                return category
+    return '不明'
+
+
+def parse_material_lines(text: str) -> List[Ingredient]:
+    """LLMが返す「材料:\\n  - 食材: 10g/450g」形式のテキストを食材リストに変換する"""
+    ingredients = []
+    for line in text.split('\n'):
+        match = _MATERIAL_LINE_PATTERN.match(line)
+        if not match:
+            continue
+        name = match.group(1).strip()
+        amount_text = match.group(2).strip()
+        amount_match = _AMOUNT_PATTERN.match(amount_text)
+        if amount_match:
+            try:
+                amount = float(amount_match.group(1))
+                ingredients.append(Ingredient(name, amount, amount_match.group(2) or 'g'))
+                continue
+            except ValueError:
+                pass
+        ingredients.append(Ingredient(name, note=amount_text))
+    return ingredients
@@ -6,13 +6,48 @@ import subprocess
 import os
 import sys
 from datetime import datetime, timedelta
-from typing import Tuple, Dict, List
+from typing import Tuple, Dict, List, NamedTuple, Optional
+from collections import OrderedDict
 from dotenv import load_dotenv
 import re
 import csv
 import json
+import hashlib
+import io
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from google.api_core.exceptions import GoogleAPIError
 
+from menu_model import (
+    ITEM_LABELS,
+    Ingredient,
+    Dish,
+    DayMenu,
+    MenuBook,
+    NutritionRecord,
+    identify_dish_category,
+    parse_material_lines
+)
+from excel_export import write_menu_table
+from order_sheet import (
+    aggregate_procurement,
+    delivery_windows,
+    extract_order_ingredients,
+    format_quantity,
+    ingredients_by_date,
+    order_amounts,
+)
+from llm_client import generate_content
+from progress import as_reporter
+from image_layout import DAYS_PER_PAGE, render_pages, split_pages, encode_png, encode_pdf_page, write_raster_pdf
+from log_config import get_logger
+from metrics import FALLBACKS
+from history import days_before, history_for_menu, record_book, record_weekly_menu, resolve_date
+from tracing import in_current_trace, set_attributes, span, traced
+
+logger = get_logger(__name__)
+
 # プロジェクトのルートディレクトリを取得
 ROOT_DIR = Path(__file__).parent.parent
 DATA_DIR = ROOT_DIR / "data"
@@ -43,20 +78,88 @@ try:
     # Streamlitアプリの場合はst.secretsからAPIキーを取得
     import streamlit as st
     GOOGLE_API_KEY = st.secrets.get("GOOGLE_API_KEY", os.getenv('GOOGLE_API_KEY'))
-    print("Streamlit Secretsから設定を読み込みました")
+    logger.info("Streamlit Secretsから設定を読み込みました")
 except:
     # 通常の環境変数からAPIキーを取得
     GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-    print(".envファイルから設定を読み込みました")
+    logger.info(".envファイルから設定を読み込みました")
 
 # APIキーの有無を確認
 if not GOOGLE_API_KEY:
-    print("警告: Google API Keyが設定されていません")
+    logger.warning("Google API Keyが設定されていません")
 else:
-    print("Google API Keyが正常に設定されました")
+    logger.info("Google API Keyが正常に設定されました")
 
 genai.configure(api_key=GOOGLE_API_KEY)
 
+def read_input_bytes(input_file) -> bytes:
+    """入力（ファイルパス・bytes・ファイルオブジェクト）の内容をbytesで取得する"""
+    if isinstance(input_file, (bytes, bytearray)):
+        return bytes(input_file)
+    if hasattr(input_file, 'getvalue'):
+        return input_file.getvalue()
+    if hasattr(input_file, 'read'):
+        if hasattr(input_file, 'seek'):
+            input_file.seek(0)
+        return input_file.read()
+    with open(input_file, 'rb') as f:
+        return f.read()
+
+def as_excel_source(input_file):
+    """pd.read_excel に渡せる形に変換する（bytesとファイルオブジェクトはメモリ上のBytesIOにする）"""
+    if isinstance(input_file, (str, os.PathLike)):
+        return input_file
+    return io.BytesIO(read_input_bytes(input_file))
+
+# 出力ファイルの自動オープン（デスクトップ用ランチャーが MENU_AUTO_OPEN=1 で有効化する）
+AUTO_OPEN_ENV = 'MENU_AUTO_OPEN'
+
+def is_headless() -> bool:
+    """画面のないサーバー環境か（LinuxでX11/Waylandのディスプレイがない場合）"""
+    if sys.platform.startswith('linux'):
+        return not (os.getenv('DISPLAY') or os.getenv('WAYLAND_DISPLAY'))
+    return False
+
+def auto_open_enabled() -> bool:
+    """出力ファイルを自動で開くか（既定は無効。サーバーモードでは常に無効）"""
+    if os.getenv(AUTO_OPEN_ENV, '').strip().lower() not in ('1', 'true', 'yes', 'on'):
+        return False
+    return not is_headless()
+
+def open_output_file(output_file) -> bool:
+    """
+    自動オープンが有効な場合のみ、出力ファイルを既定のアプリケーションで開く
+
+    Returns:
+        bool: ファイルを開くコマンドを実行した場合はTrue
+    """
+    if not auto_open_enabled():
+        return False
+    if not isinstance(output_file, (str, os.PathLike)) or not os.path.exists(output_file):
+        return False
+    try:
+        if os.name == 'nt':   # Windows
+            subprocess.Popen(["start", "", str(output_file)], shell=True)
+        elif sys.platform == 'darwin':  # macOS
+            subprocess.Popen(["open", str(output_file)])
+        else:  # Linux
+            subprocess.Popen(["xdg-open", str(output_file)])
+        return True
+    except Exception as e:
+        logger.warning("ファイルを開けませんでした: %s", e)
+        return False
+
+def describe_input(input_file) -> str:
+    """ログ表示用の入力名（メモリ上のデータは内容を出力しない）"""
+    if isinstance(input_file, (str, os.PathLike)):
+        return str(input_file)
+    name = getattr(input_file, 'name', None)
+    if name:
+        return f"{name}（メモリ上）"
+    if isinstance(input_file, (bytes, bytearray)):
+        return f"メモリ上のデータ（{len(input_file)} bytes）"
+    return "メモリ上のデータ"
+
 def load_nutrition_data():
     """CSVファイルから栄養価データを読み込む"""
     nutrition_data = {}
@@ -74,8 +177,8 @@ def load_nutrition_data():
         
         # CSVファイルが存在しない場合は、初期データを作成
         if not os.path.exists(csv_path):
-            print(f"栄養価データCSVが見つかりません: {csv_path}")
-            print("基本データを使用します")
+            logger.warning("栄養価データCSVが見つかりません: %s", csv_path)
+            logger.warning("基本データを使用します")
             return get_default_nutrition_data()
         
         with open(csv_path, 'r', encoding='utf-8') as f:
@@ -105,11 +208,11 @@ def load_nutrition_data():
                     '食物繊維': float(row[fiber_col]),
                     'カテゴリ': row['カテゴリ']
                 }
-        print(f"{len(nutrition_data)}件の栄養価データを読み込みました")
+        logger.info("%s件の栄養価データを読み込みました", len(nutrition_data))
         return nutrition_data
     
     except Exception as e:
-        print(f"栄養価データの読み込み中にエラーが発生しました: {e}")
+        logger.error("栄養価データの読み込み中にエラーが発生しました: %s", e)
         return get_default_nutrition_data()
 
 def get_default_nutrition_data():
@@ -124,17 +227,117 @@ def get_default_nutrition_data():
         'フルーツ': {'エネルギー': 60, 'タンパク質': 0.5, '脂質': 0.0, '炭水化物': 15.0, 'カルシウム': 10, '鉄分': 0.2, '食物繊維': 2.0, 'カテゴリ': 'フルーツ'}
     }
 
-def calculate_nutrition_for_all_days(all_meals: dict, all_ingredients: dict) -> dict:
-    """全日分の栄養価を一括で計算し、1日の合計として出力"""
+# 処理段階ごとのおおよその所要時間の比（進捗バーの按分に使う）
+MENU_OUTPUT_STAGES = {'読み込み': 1, 'シート解析': 2, '栄養価計算': 1, 'デザート生成': 6, '出力': 2}
+REORDER_STAGES = {'読み込み': 1, 'シート解析': 2, '栄養価計算': 1, 'デザート生成': 6, '並び替え': 6, '出力': 1}
+WEEKLY_MENU_STAGES = {'準備': 1, '献立生成': 15, '応答解析': 1}
+
+# 発注書を並行して書き出す最大数
+MAX_ORDER_WORKERS = 4
+
+# 並び替え・献立生成で参照する過去の献立の日数
+HISTORY_LOOKBACK_DAYS = 14
+
+# 発注先の設定（宛名とカテゴリの割り当て）。order_suppliers.csv が無い場合に使用
+DEFAULT_SUPPLIERS = {
+    "宝成": {'header': "宝成　御中", 'categories': []},
+    "豊中": {'header': "株式会社　豊中商店　御中", 'categories': []},
+}
+
+def load_supplier_config():
+    """
+    order_suppliers.csv から発注先の設定を読み込む
+
+    CSVは「発注先,宛名,カテゴリ」の列を持つ。カテゴリには nutrition_data.csv のカテゴリを
+    「、」区切りで指定し、そのカテゴリの食材は発注合計でその発注先に割り当てる。
+
+    Returns:
+        dict: headers（発注先 → 宛名）と rules（[(食材名, 発注先), ...]）
+    """
+    suppliers = DEFAULT_SUPPLIERS
+    try:
+        # 通常のパスとPyInstallerでバンドルされた場合のパスを確認
+        if getattr(sys, 'frozen', False):
+            application_path = os.path.dirname(sys.executable)
+            csv_path = os.path.join(application_path, 'order_suppliers.csv')
+            if not os.path.exists(csv_path):
+                csv_path = os.path.join(application_path, 'data', 'order_suppliers.csv')
+        else:
+            csv_path = Path(__file__).parent / "order_suppliers.csv"
+
+        if os.path.exists(csv_path):
+            with open(csv_path, 'r', encoding='utf-8') as f:
+                suppliers = {
+                    row['発注先'].strip(): {
+                        'header': (row.get('宛名') or '').strip(),
+                        'categories': [c.strip() for c in re.split('[、,]', row.get('カテゴリ') or '') if c.strip()],
+                    }
+                    for row in csv.DictReader(f) if (row.get('発注先') or '').strip()
+                }
+        else:
+            logger.warning("発注先設定CSVが見つかりません: %s", csv_path)
+    except Exception as e:
+        logger.error("発注先設定の読み込み中にエラーが発生しました: %s", e)
+
+    # カテゴリの割り当てを食材名のルールに展開（長い食材名を優先）
+    category_suppliers = {
+        category: supplier for supplier, config in suppliers.items() for category in config['categories']
+    }
+    rules = []
+    if category_suppliers:
+        for food_name, data in get_nutrition_data().items():
+            supplier = category_suppliers.get(str(data.get('カテゴリ', '')).strip())
+            if supplier:
+                rules.append((food_name, supplier))
+        rules.sort(key=lambda rule: len(rule[0]), reverse=True)
+
+    return {
+        'headers': {supplier: config['header'] for supplier, config in suppliers.items()},
+        'rules': rules,
+    }
+
+# 栄養価データ・発注先設定・Geminiモデルの取得関数（Streamlitアプリでは st.cache_resource で
+# キャッシュした関数を設定し、再実行や処理のたびにCSVの読み込みやモデルの作成を繰り返さない）
+_resource_loaders = {}
+
+def configure_resource_loaders(nutrition_data=None, supplier_config=None, model=None):
+    """
+    栄養価データ・発注先設定・Geminiモデルの取得関数を設定する（一度も設定しない場合は毎回読み込む）
+
+    None の引数の取得関数は変更しない（model だけを指定しても、設定済みの他の取得関数はそのまま使う）。
+    設定した関数が返す値は共有されるため、呼び出し側で変更しないこと。
+    """
+    loaders = dict(nutrition_data=nutrition_data, supplier_config=supplier_config, model=model)
+    _resource_loaders.update({name: loader for name, loader in loaders.items() if loader is not None})
+
+def get_nutrition_data():
+    """栄養価データを取得する（設定された取得関数があればそれを使う）"""
+    return (_resource_loaders.get('nutrition_data') or load_nutrition_data)()
+
+def get_supplier_config():
+    """発注先の設定を取得する（設定された取得関数があればそれを使う）"""
+    return (_resource_loaders.get('supplier_config') or load_supplier_config)()
+
+def get_model(model_name: str):
+    """Geminiモデルを取得する（設定された取得関数があればそれを使う）"""
+    return (_resource_loaders.get('model') or genai.GenerativeModel)(model_name)
+
+@traced('栄養価計算')
+def calculate_nutrition_for_all_days(all_meals: dict, all_ingredients: dict = None,
+                                     progress=None) -> Dict[str, NutritionRecord]:
+    """全日分の栄養価を一括で計算し、1日の合計（NutritionRecord）として返す（progress には日数単位で通知）"""
+    progress = as_reporter(progress)
+    set_attributes(days=len(all_meals))
     try:
         # 栄養価データベースを読み込む
-        nutrition_data = load_nutrition_data()
+        nutrition_data = get_nutrition_data()
         
         # 各日付ごとの栄養価を計算（1日の合計）
         nutrition_results = {}
+        progress.start('栄養価計算', len(all_meals))
         
         for date, meals in all_meals.items():
-            print(f"日付 {date} の栄養価計算を開始...")
+            logger.debug("日付 %s の栄養価計算を開始...", date)
             
             # 1日分の栄養素の初期値
             daily_nutrition = {
@@ -168,7 +371,7 @@ def calculate_nutrition_for_all_days(all_meals: dict, all_ingredients: dict) ->
             
             # 各食事区分を処理
             for meal_type, menu_items in meals.items():
-                print(f"  {meal_type}の栄養価を計算中...")
+                logger.debug("  %sの栄養価を計算中...", meal_type)
                 
                 # 食事タイプによる基本係数
                 meal_factor = 1.0
@@ -187,7 +390,7 @@ def calculate_nutrition_for_all_days(all_meals: dict, all_ingredients: dict) ->
                     for food, values in nutrition_data.items():
                         if food in item.lower():
                             matched_foods.append((food, values))
-                            print(f"      '{item}'に'{food}'を検出")
+                            logger.debug("      '%s'に'%s'を検出", item, food)
                     
                     # マッチ数に基づいて栄養価を加算
                     match_count = len(matched_foods)
@@ -285,29 +488,22 @@ def calculate_nutrition_for_all_days(all_meals: dict, all_ingredients: dict) ->
                     # その他の栄養素は小数点第1位まで
                     daily_nutrition[nutrient] = round(daily_nutrition[nutrient], 1)
             
-            # 見やすい形式に整形
-            formatted_nutrition = f"""1日の栄養価合計（目安）:
-エネルギー: {daily_nutrition['エネルギー']} kcal
-タンパク質: {daily_nutrition['タンパク質']} g
-脂質: {daily_nutrition['脂質']} g
-炭水化物: {daily_nutrition['炭水化物']} g
-カルシウム: {daily_nutrition['カルシウム']} mg
-鉄分: {daily_nutrition['鉄分']} mg
-食物繊維: {daily_nutrition['食物繊維']} g"""
-            
-            nutrition_results[date] = formatted_nutrition
-            print(f"  {date}の栄養価計算完了")
+            # 数値のまま保持（表示用テキストは出力時に生成）
+            nutrition_results[date] = NutritionRecord.from_dict(daily_nutrition)
+            logger.debug("  %sの栄養価計算完了", date)
+            progress.advance(message=date)
         
+        progress.finish()
         return nutrition_results
         
     except Exception as e:
-        print(f"栄養価計算エラー: {str(e)}")
+        logger.error("栄養価計算エラー: %s", e)
         return {}
 
 def generate_desserts_batch(menu_data: List[Dict]) -> List[Tuple[str, str]]:
     """複数のメニューに対するデザートをバッチ処理で生成"""
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_model('gemini-1.5-flash')
         
         # バッチ処理用のプロンプトを作成
         prompt = """以下の複数の食事メニューに対して、それぞれに合った具体的なデザートを作成してください。
@@ -337,7 +533,7 @@ def generate_desserts_batch(menu_data: List[Dict]) -> List[Tuple[str, str]]:
 """
         
         # LLMに一括でリクエスト
-        response = model.generate_content(prompt)
+        response = generate_content(model, prompt)
         
         if not response.text:
             raise ValueError("LLMの応答が空です")
@@ -366,6 +562,7 @@ def generate_desserts_batch(menu_data: List[Dict]) -> List[Tuple[str, str]]:
             # "提案"という単語が含まれている場合は置き換え
             if "提案" in dessert_name:
                 dessert_name = "季節のフルーツゼリー"
+                FALLBACKS.inc(kind='default_dessert')
             
             # 材料部分を抽出
             materials_lines = []
@@ -385,20 +582,23 @@ def generate_desserts_batch(menu_data: List[Dict]) -> List[Tuple[str, str]]:
             desserts.append((dessert_name, dessert_info))
         
         # メニュー数とデザート数が一致しない場合、足りない分をデフォルトデータで補完
+        if len(desserts) < len(menu_data):
+            FALLBACKS.inc(len(menu_data) - len(desserts), kind='default_dessert')
         while len(desserts) < len(menu_data):
             desserts.append(("季節のフルーツゼリー", "材料:\n  - ゼリーの素: 10g/450g\n  - フルーツ缶: 15g/675g"))
         
         return desserts
 
     except Exception as e:
-        print(f"デザート生成エラー: {str(e)}")
+        logger.error("デザート生成エラー: %s", e)
         # エラー時はデフォルトデータを使用
+        FALLBACKS.inc(len(menu_data), kind='default_dessert')
         return [("季節のフルーツゼリー", "材料:\n  - ゼリーの素: 10g/450g\n  - フルーツ缶: 15g/675g") for _ in menu_data]
 
 def generate_dessert_with_llm(meal_type: str, existing_menu: str) -> Tuple[str, str]:
     """その日のメニューに合わせたデザートとその材料を生成"""
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = get_model('gemini-2.0-flash')
         
         prompt = f"""
 以下の{meal_type}メニューに合わせたデザートを1つ提案してください：
@@ -460,7 +660,7 @@ def generate_dessert_with_llm(meal_type: str, existing_menu: str) -> Tuple[str,
   ...
 """
         
-        response = model.generate_content(prompt)
+        response = generate_content(model, prompt)
         
         if response.text:
             result = response.text.strip()
@@ -474,7 +674,8 @@ def generate_dessert_with_llm(meal_type: str, existing_menu: str) -> Tuple[str,
         raise ValueError("LLMの応答が不正な形式です")
 
     except Exception as e:
-        print(f"デザート生成エラー: {str(e)}")
+        logger.error("デザート生成エラー: %s", e)
+        FALLBACKS.inc(kind='mock_dessert')
         return mock_llm_dessert_generator(meal_type)
 
 def mock_llm_dessert_generator(meal_type: str) -> Tuple[str, str]:
@@ -519,10 +720,10 @@ def generate_nutrition_info() -> str:
 def calculate_nutrition_with_llm(meals, ingredients):
     """LLMを使用してメニューの栄養価を計算する関数"""
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_model('gemini-1.5-flash')
         
         # 栄養価データベースを読み込む
-        nutrition_data = load_nutrition_data()
+        nutrition_data = get_nutrition_data()
         
         # メニュー情報を文字列にフォーマット
         menu_text = ""
@@ -553,7 +754,7 @@ def calculate_nutrition_with_llm(meals, ingredients):
 ※数値は1人分の概算値としてください。
 """
         
-        response = model.generate_content(prompt)
+        response = generate_content(model, prompt)
         
         if response.text:
             return response.text.strip()
@@ -562,17 +763,17 @@ def calculate_nutrition_with_llm(meals, ingredients):
             return generate_nutrition_info()
             
     except Exception as e:
-        print(f"栄養価計算エラー（LLM）: {str(e)}")
+        logger.error("栄養価計算エラー（LLM）: %s", e)
         return generate_nutrition_info()
 
 def analyze_excel_structure(df: pd.DataFrame) -> dict:
     """LLMを使用してExcelの構造を解析"""
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = get_model('gemini-2.0-flash')
         
         # 最初の10行を文字列として取得
         sample_data = df.head(10).to_string()
-        print(f"解析対象データ:\n{sample_data}\n")
+        logger.debug("解析対象データ:\n%s\n", sample_data)
         
         prompt = """
 入力された給食献立表のデータ構造を解析してください。
@@ -603,10 +804,10 @@ def analyze_excel_structure(df: pd.DataFrame) -> dict:
 }
 """
         
-        print(f"LLMへのプロンプト:\n{prompt}\n")
+        logger.debug("LLMへのプロンプト:\n%s\n", prompt)
         
-        response = model.generate_content(prompt)
-        print(f"LLMからの応答:\n{response.text}\n")
+        response = generate_content(model, prompt)
+        logger.debug("LLMからの応答:\n%s\n", response.text)
         
         # 応答をPythonの辞書に変換
         import json
@@ -614,10 +815,7 @@ def analyze_excel_structure(df: pd.DataFrame) -> dict:
         return structure_info
     
     except Exception as e:
-        print(f"構造解析エラーの詳細: {str(e)}")
-        print(f"エラーの種類: {type(e)}")
-        import traceback
-        print(f"スタックトレース:\n{traceback.format_exc()}")
+        logger.exception("構造解析エラーの詳細: %s", e)
         
         # デフォルトの構造情報を返す
         return {
@@ -706,7 +904,7 @@ def parse_menu_to_structured_data(df: pd.DataFrame) -> dict:
         return menu_structure
     
     except Exception as e:
-        print(f"データ構造化エラー: {str(e)}")
+        logger.error("データ構造化エラー: %s", e)
         raise
 
 def format_ingredients(ingredients_by_dish: dict) -> str:
@@ -774,9 +972,18 @@ def format_menu_output(structured_data: dict) -> dict:
     
     return output
 
-def process_excel_sheet(df: pd.DataFrame) -> dict:
+def _fallback_day_menu(date_col: str = '') -> DayMenu:
+    """読み込みに失敗した場合の最低限の1日分の献立"""
+    day = DayMenu(date_col)
+    day.meals['朝食'].dishes.append(Dish('米飯'))
+    day.meals['昼食'].dishes.append(Dish('カレーライス'))
+    day.meals['夕食'].dishes.append(Dish('米飯と焼き魚'))
+    return day
+
+@traced('シート解析')
+def process_excel_sheet(df: pd.DataFrame, date_col: str = '') -> DayMenu:
     try:
-        print("=== メニュー処理開始 ===")
+        logger.debug("=== メニュー処理開始 ===")
         
         # データのクリーニングと前処理
         df = df.fillna('')
@@ -785,8 +992,7 @@ def process_excel_sheet(df: pd.DataFrame) -> dict:
         # 食事区分ごとのデータ収集
         current_section = None
         current_dish = None
-        meals = {'朝食': [], '昼食': [], '夕食': []}
-        ingredients = {'朝食': {}, '昼食': {}, '夕食': {}}
+        day = DayMenu(date_col)
 
         # 列のインデックス
         meal_type_col = 0  # A列 = 0
@@ -797,24 +1003,12 @@ def process_excel_sheet(df: pd.DataFrame) -> dict:
         
         # 列の数が足りない場合は安全にスキップするように
         if len(df.columns) <= 5:
-            print(f"警告: 列の数が不足しています（{len(df.columns)}列）。最低6列必要です。")
+            logger.warning("列の数が不足しています（%s列）。最低6列必要です。", len(df.columns))
             # 最低限のデータだけ返す
-            return {
-                'meals': {'朝食': ['米飯'], '昼食': ['カレーライス'], '夕食': ['米飯と焼き魚']},
-                'ingredients': {'朝食': {'米飯': []}, '昼食': {'カレーライス': []}, '夕食': {'米飯と焼き魚': []}},
-                'data': [
-                    '',  # 栄養素（後で計算）
-                    '米飯',
-                    '',
-                    'カレーライス',
-                    '',
-                    '米飯と焼き魚',
-                    ''
-                ]
-            }
+            return _fallback_day_menu(date_col)
 
         # 実際の列名をチェックしてデバッグログ出力
-        print(f"実際の列名: {list(df.columns)}")
+        logger.debug("実際の列名: %s", list(df.columns))
         
         for idx, row in df.iterrows():
             # 行データの長さを確認
@@ -843,13 +1037,14 @@ def process_excel_sheet(df: pd.DataFrame) -> dict:
                     current_section = '夕食'
 
                 if current_section:
+                    meal = day.meals[current_section]
+
                     # メニュー項目の追加
                     if menu_item and menu_item != 'nan':
-                        if menu_item not in meals[current_section]:
-                            meals[current_section].append(menu_item)
-                            current_dish = menu_item
-                            # 新しい料理の食材リストを初期化
-                            ingredients[current_section][current_dish] = []
+                        if meal.find_dish(menu_item) is None:
+                            # 新しい料理を追加
+                            current_dish = Dish(menu_item)
+                            meal.dishes.append(current_dish)
 
                     # 食材情報の追加
                     if food_item and food_item != 'nan' and weight and weight != 'nan':
@@ -873,263 +1068,229 @@ def process_excel_sheet(df: pd.DataFrame) -> dict:
                         except ValueError:
                             # 数値に変換できない場合はデフォルト値を使用
                             weight_num = 1.0
-                            print(f"警告: 重量 '{weight}' を数値に変換できません。デフォルト値を使用します。")
+                            logger.debug("重量 '%s' を数値に変換できません。デフォルト値を使用します。", weight)
                         
-                        # 45人分の総量を計算
-                        total_weight = weight_num * 45
-
-                        # 食材情報を整形
-                        ingredient = f"{food_name}: {weight_num}g/{total_weight}g"
+                        # 1人分の量で保持（総量は出力時に人数を掛けて計算）
+                        ingredient = Ingredient(food_name, weight_num)
                         
                         # 現在の料理に食材を追加
-                        if current_dish and current_dish in ingredients[current_section]:
-                            ingredients[current_section][current_dish].append(ingredient)
+                        if current_dish is not None and any(dish is current_dish for dish in meal.dishes):
+                            current_dish.ingredients.append(ingredient)
                         # 料理が特定できない場合は、最後のメニューに追加
-                        elif meals[current_section]:
-                            last_dish = meals[current_section][-1]
-                            if last_dish not in ingredients[current_section]:
-                                ingredients[current_section][last_dish] = []
-                            ingredients[current_section][last_dish].append(ingredient)
+                        elif meal.dishes:
+                            meal.dishes[-1].ingredients.append(ingredient)
             except Exception as row_error:
-                print(f"行 {idx} の処理中にエラー: {str(row_error)}")
+                logger.warning("行 %s の処理中にエラー: %s", idx, row_error)
                 continue
 
-        # 戻り値の構造を変更
-        formatted_ingredients = {}
-        for meal_type in ['朝食', '昼食', '夕食']:
-            formatted_ingredients[meal_type] = []
-            for dish, ing_list in ingredients[meal_type].items():
-                dish_text = f"{dish}\n" + "\n".join(f"  - {ing}" for ing in ing_list)
-                formatted_ingredients[meal_type].append(dish_text)
-
-        return {
-            'meals': meals,
-            'ingredients': ingredients,
-            'data': [
-                '',  # 栄養素（後で計算）
-                '\n'.join(meals['朝食']),
-                '\n'.join(formatted_ingredients['朝食']),
-                '\n'.join(meals['昼食']),
-                '\n'.join(formatted_ingredients['昼食']),
-                '\n'.join(meals['夕食']),
-                '\n'.join(formatted_ingredients['夕食'])
-            ]
-        }
+        return day
 
     except Exception as e:
-        print(f"\n!!! エラーが発生しました: {str(e)}")
+        logger.exception("!!! エラーが発生しました: %s", e)
         # エラーが発生しても最低限のデータを返す
-        return {
-            'meals': {'朝食': ['米飯'], '昼食': ['カレーライス'], '夕食': ['米飯と焼き魚']},
-            'ingredients': {'朝食': {'米飯': []}, '昼食': {'カレーライス': []}, '夕食': {'米飯と焼き魚': []}},
-            'data': [
-                '',  # 栄養素（後で計算）
-                '米飯',
-                '',
-                'カレーライス',
-                '',
-                '米飯と焼き魚',
-                ''
-            ]
-        }
+        return _fallback_day_menu(date_col)
 
-def process_all_sheets(df_dict: dict) -> dict:
-    """全シートのデータを処理して1つの辞書にまとめる"""
-    try:
-        print("=== 全シートの処理開始 ===")
-        print(f"シート数: {len(df_dict)}")
-        print(f"シート名一覧: {list(df_dict.keys())}")
-        
-        # 全日分のメニューと食材を収集
-        all_meals = {}
-        all_ingredients = {}
-        
-        # 基本データ構造の初期化
-        combined_data = {
-            '項目': [
-                '栄養素',
-                '朝食',
-                '朝食：食材',
-                '昼食 (主菜/副菜/汁物)',
-                '昼食：食材/1人分/45人分',
-                '夕食 (主菜/副菜/小鉢/汁物)',
-                '夕食：食材/1人分/45人分'
-            ]
-        }
+# 献立のシート名（「4月1日」「4月1日(月)」など）
+SHEET_DATE_PATTERN = re.compile(r'(\d+)月(\d+)日(?:\(.\))?')
 
-        # 各シートを処理
-        for sheet_name, df in df_dict.items():
-            try:
-                print(f"シート '{sheet_name}' の処理開始 - 行数: {len(df)}, 列数: {len(df.columns)}")
-                
-                # シート名から月と日を抽出
-                match = re.search(r'(\d+)月(\d+)日(?:\(.\))?', sheet_name)
-                if match:
-                    month = int(match.group(1))
-                    day = int(match.group(2))
-                    date_col = f"{month}/{day}"
-                    print(f"日付として解析: {date_col}")
-                    
-                    # シートのデータを処理
-                    processed_data = process_excel_sheet(df)
-                    
-                    # メニューと食材を保存
-                    all_meals[date_col] = processed_data['meals']
-                    all_ingredients[date_col] = processed_data['ingredients']
-                    
-                    # 結果を結合データに追加
-                    combined_data[date_col] = processed_data['data']
-                    print(f"シート '{sheet_name}' の処理完了")
-                else:
-                    print(f"警告: シート '{sheet_name}' から日付情報を抽出できませんでした")
-                    
-            except Exception as e:
-                print(f"シート '{sheet_name}' の処理中にエラーが発生: {str(e)}")
-                import traceback
-                print(traceback.format_exc())
-                continue
+def sheet_date(sheet_name) -> Optional[str]:
+    """シート名から日付（'4/1' 形式）を取り出す（献立のシートでない場合は None）"""
+    match = SHEET_DATE_PATTERN.search(str(sheet_name))
+    if not match:
+        return None
+    return f"{int(match.group(1))}/{int(match.group(2))}"
+
+def parse_menu_book(df_dict: dict, calculate_nutrition: bool = True, generate_desserts: bool = False,
+                    progress=None) -> MenuBook:
+    """
+    日付のシートを解析して1つのMenuBookにまとめる（シート名が日付でないシートは読み飛ばす）
+
+    Args:
+        df_dict (dict): シート名 → DataFrame
+        calculate_nutrition (bool): 全日分の栄養価を計算するか
+        generate_desserts (bool): デザートを生成して追加するか（LLMを使用する）
+        progress (optional): 進捗の通知先（シート・日数・デザート単位で通知）
+    """
+    progress = as_reporter(progress)
+    logger.info("シート数: %s", len(df_dict))
+    logger.debug("シート名一覧: %s", list(df_dict.keys()))
+    
+    # 全日分の献立を収集
+    book = MenuBook()
 
-        # 結果の確認
-        print(f"処理完了したシート数: {len(combined_data) - 1}")  # '項目'キーを除く
-        if len(combined_data) <= 1:
-            print("警告: 処理できたシートがありません")
+    # 各シートを処理
+    progress.start('シート解析', len(df_dict))
+    for sheet_name, df in df_dict.items():
+        try:
+            logger.debug("シート '%s' の処理開始 - 行数: %s, 列数: %s", sheet_name, len(df), len(df.columns))
             
-        # 全日分の栄養価を一括計算
+            # シート名から月と日を抽出
+            date_col = sheet_date(sheet_name)
+            if date_col:
+                logger.debug("日付として解析: %s", date_col)
+                
+                # シートのデータを処理して追加
+                book.add_day(process_excel_sheet(df, date_col))
+                logger.debug("シート '%s' の処理完了", sheet_name)
+            else:
+                logger.debug("シート '%s' から日付情報を抽出できませんでした", sheet_name)
+                
+        except Exception as e:
+            logger.warning("シート '%s' の処理中にエラーが発生: %s", sheet_name, e, exc_info=True)
+            continue
+        finally:
+            progress.advance(message=sheet_name)
+
+    # 結果の確認
+    logger.info("処理完了したシート数: %s", len(book))
+    if len(book) == 0:
+        logger.warning("処理できたシートがありません")
+        
+    # 全日分の栄養価を一括計算
+    if calculate_nutrition:
         try:
-            print("栄養価計算開始...")
-            nutrition_by_date = calculate_nutrition_for_all_days(all_meals, all_ingredients)
-            print(f"栄養価計算完了: {len(nutrition_by_date)}日分")
+            logger.info("栄養価計算開始...")
+            nutrition_by_date = calculate_nutrition_for_all_days(book.menu_names_by_date(), progress=progress)
+            logger.info("栄養価計算完了: %s日分", len(nutrition_by_date))
             
             # 栄養価を各日付のデータに設定
-            for date_col in nutrition_by_date:
-                if date_col in combined_data:
-                    combined_data[date_col][0] = nutrition_by_date[date_col]
+            for date_col, record in nutrition_by_date.items():
+                if date_col in book.days:
+                    book.days[date_col].nutrition = record
         except Exception as nutrition_err:
-            print(f"栄養価計算中にエラーが発生: {str(nutrition_err)}")
-            import traceback
-            print(traceback.format_exc())
-        
-        # デザートを一括で生成して追加
+            logger.exception("栄養価計算中にエラーが発生: %s", nutrition_err)
+    
+    # デザートを一括で生成して追加
+    if generate_desserts:
         try:
-            print("デザート生成開始...")
-            add_desserts_to_combined_data(combined_data, all_meals)
-            print("デザート生成・追加完了")
+            logger.info("デザート生成開始...")
+            add_desserts_to_menu(book, progress=progress)
+            logger.info("デザート生成・追加完了")
         except Exception as dessert_err:
-            print(f"デザート生成中にエラーが発生: {str(dessert_err)}")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("デザート生成中にエラーが発生: %s", dessert_err)
+
+    return book
+
+def process_all_sheets(df_dict: dict, progress=None) -> MenuBook:
+    """全シートのデータを処理して1つのMenuBookにまとめる（progress にはシート・日数・デザート単位で通知）"""
+    try:
+        logger.info("=== 全シートの処理開始 ===")
+        book = parse_menu_book(df_dict, generate_desserts=True, progress=progress)
 
-        return combined_data
+        # 献立の履歴に保存（次のファイルの並び替えや献立生成で参照する）
+        with span('履歴保存', days=len(book)):
+            record_book(book)
+
+        return book
 
     except Exception as e:
-        print(f"\n!!! 全シート処理でエラーが発生しました: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("!!! 全シート処理でエラーが発生しました: %s", e)
         
         # 最低限のデータ構造を返す
-        return {
-            '項目': [
-                '栄養素',
-                '朝食',
-                '朝食：食材',
-                '昼食 (主菜/副菜/汁物)',
-                '昼食：食材/1人分/45人分',
-                '夕食 (主菜/副菜/小鉢/汁物)',
-                '夕食：食材/1人分/45人分'
-            ],
-            '3/1': ['栄養情報なし', '米飯\n味噌汁', '米飯\n味噌汁', 'カレーライス\nサラダ', 'カレーライス\nサラダ', '米飯\n焼き魚\n野菜炒め', '米飯\n焼き魚\n野菜炒め']
-        }
-
-def add_desserts_to_combined_data(combined_data: dict, all_meals: dict):
-    """全日分のデータにデザートを一括で追加"""
+        day = DayMenu('3/1', nutrition_note='栄養情報なし')
+        for meal_type, dish_names in [
+            ('朝食', ['米飯', '味噌汁']),
+            ('昼食', ['カレーライス', 'サラダ']),
+            ('夕食', ['米飯', '焼き魚', '野菜炒め'])
+        ]:
+            day.meals[meal_type].dishes.extend(Dish(name) for name in dish_names)
+        return MenuBook({day.date: day})
+
+@traced('デザート生成')
+def add_desserts_to_menu(book: MenuBook, progress=None):
+    """全日分の献立にデザートを一括で追加（progress には追加したデザートの数で通知）"""
+    progress = as_reporter(progress)
     try:
-        print("デザート追加処理開始...")
-        print(f"対象日数: {len(combined_data) - 1}日")  # '項目'キーを除く
+        logger.info("デザート追加処理開始...")
+        logger.info("対象日数: %s日", len(book))
         
         # バッチ処理用のメニューデータを準備
         batch_menu_data = []
         
-        for date_col in [col for col in combined_data.keys() if col != '項目']:
-            print(f"日付 {date_col} の処理開始")
-            # 昼食と夕食のメニューを取得
-            lunch_menu_idx = 3  # 昼食メニューのインデックス
-            dinner_menu_idx = 5  # 夕食メニューのインデックス
-            
-            lunch_menu = combined_data[date_col][lunch_menu_idx]
-            dinner_menu = combined_data[date_col][dinner_menu_idx]
-            print(f"昼食メニュー: {lunch_menu[:30]}...")
-            print(f"夕食メニュー: {dinner_menu[:30]}...")
-            
-            # バッチ処理用のデータに追加
-            batch_menu_data.append({
-                'date': date_col,
-                'meal_type': '昼食',
-                'menu_text': lunch_menu,
-                'menu_idx': lunch_menu_idx,
-                'ingredients_idx': lunch_menu_idx + 1
-            })
-            
-            batch_menu_data.append({
-                'date': date_col,
-                'meal_type': '夕食',
-                'menu_text': dinner_menu,
-                'menu_idx': dinner_menu_idx,
-                'ingredients_idx': dinner_menu_idx + 1
-            })
+        for date_col, day in book.days.items():
+            logger.debug("日付 %s の処理開始", date_col)
+            # 昼食と夕食のメニューを対象にする
+            for meal_type in ('昼食', '夕食'):
+                menu_text = '\n'.join(day.meals[meal_type].dish_names())
+                logger.debug("%sメニュー: %s...", meal_type, menu_text[:30])
+                
+                # バッチ処理用のデータに追加
+                batch_menu_data.append({
+                    'date': date_col,
+                    'meal_type': meal_type,
+                    'menu_text': menu_text
+                })
         
         # バッチでデザートを生成
-        print(f"デザートをバッチ処理で生成中... ({len(batch_menu_data)}件)")
+        logger.info("デザートをバッチ処理で生成中... (%s件)", len(batch_menu_data))
+        set_attributes(dishes=len(batch_menu_data))
+        progress.start('デザート生成', len(batch_menu_data), message='LLMで生成中')
         try:
             desserts = generate_desserts_batch(batch_menu_data)
-            print(f"デザート生成完了: {len(desserts)}件")
+            logger.info("デザート生成完了: %s件", len(desserts))
         except Exception as dessert_gen_err:
-            print(f"デザート生成エラー: {str(dessert_gen_err)}")
+            logger.error("デザート生成エラー: %s", dessert_gen_err)
             # デフォルトデザートを使用
+            FALLBACKS.inc(len(batch_menu_data), kind='default_dessert')
             desserts = [("季節のフルーツゼリー", "材料:\n  - ゼリーの素: 10g/450g\n  - フルーツ缶: 15g/675g") 
                        for _ in range(len(batch_menu_data))]
-            print(f"デフォルトデザートを使用します: {len(desserts)}件")
+            logger.warning("デフォルトデザートを使用します: %s件", len(desserts))
         
-        # 生成したデザートをデータに追加
+        # 生成したデザートを献立に追加
         added_count = 0
         for i, menu_item in enumerate(batch_menu_data):
             if i < len(desserts):
                 try:
                     dessert_name, dessert_ingredients = desserts[i]
-                    date_col = menu_item['date']
-                    menu_idx = menu_item['menu_idx']
-                    ingredients_idx = menu_item['ingredients_idx']
-                    
-                    # デザートをメニューに追加（ヘッダーなしで直接追加）
-                    combined_data[date_col][menu_idx] += f"\n{dessert_name}"
+                    meal = book.days[menu_item['date']].meals[menu_item['meal_type']]
                     
-                    # デザートの材料を追加（料理名と材料を整形）
-                    combined_data[date_col][ingredients_idx] += f"\n\n{dessert_name}\n{dessert_ingredients.replace('材料:', '')}"
+                    # デザートを料理として追加（材料は数値化して保持）
+                    meal.dishes.append(Dish(dessert_name, parse_material_lines(dessert_ingredients)))
                     added_count += 1
+                    progress.advance()
                 except Exception as add_err:
-                    print(f"デザート追加エラー（{i}件目）: {str(add_err)}")
+                    logger.warning("デザート追加エラー（%s件目）: %s", i, add_err)
         
-        print(f"デザートの追加が完了しました。追加数: {added_count}/{len(batch_menu_data)}")
+        progress.finish()
+        logger.info("デザートの追加が完了しました。追加数: %s/%s", added_count, len(batch_menu_data))
         
     except Exception as e:
-        print(f"デザート追加エラー: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("デザート追加エラー: %s", e)
 
-def update_menu_with_desserts(input_file: str, output_file: str = None):
-    """メニューファイルを読み込み、デザートを追加して保存し自動的に開く"""
+@traced()
+def update_menu_with_desserts(input_file, output_file=None, output_format: str = 'xlsx', progress=None):
+    """
+    メニューファイルを読み込み、デザートを追加して保存する（自動オープンが有効な場合は開く）
+
+    Args:
+        input_file: 入力ファイルのパス、またはbytes・ファイルオブジェクト
+        output_file: 出力ファイルのパス（指定がない場合はメモリ上に出力する）
+        output_format (str): 'xlsx'、'png'（ページごとの画像）または 'pdf'（ベクターPDF）。
+            'png' と 'pdf' は作成した表からExcelを経由せずに直接出力する
+        progress (optional): 進捗の通知先（ProgressReporter または ProgressEvent を受け取る関数）
+
+    Returns:
+        xlsx/pdf: 出力ファイルのパス（output_file未指定の場合はBytesIO）、失敗した場合はNone
+        png: generate_menu_image_output と同じくページごとのリスト
+    """
     error_info = {}  # エラー情報を保存する辞書
+    progress = as_reporter(progress)
+    progress.plan(MENU_OUTPUT_STAGES)
     
     try:
-        print(f"処理開始: {input_file}")
+        logger.info("処理開始: %s", describe_input(input_file))
         
         # Excelファイルを読み込む
         try:
-            df_dict = pd.read_excel(input_file, sheet_name=None)
-            print(f"Excelファイル読み込み完了: {len(df_dict)}シート")
+            progress.start('読み込み')
+            with span('Excel読み込み') as read_span:
+                df_dict = pd.read_excel(as_excel_source(input_file), sheet_name=None)
+                read_span.set(sheets=len(df_dict))
+            logger.info("Excelファイル読み込み完了: %sシート", len(df_dict))
             error_info['シート数'] = len(df_dict)
             error_info['シート名'] = list(df_dict.keys())
         except Exception as excel_err:
-            print(f"Excelファイル読み込みエラー: {str(excel_err)}")
+            logger.error("Excelファイル読み込みエラー: %s", excel_err)
             error_info['excel_error'] = str(excel_err)
             import traceback
             error_info['excel_traceback'] = traceback.format_exc()
@@ -1139,8 +1300,7 @@ def update_menu_with_desserts(input_file: str, output_file: str = None):
         valid_sheets = []
         invalid_sheets = []
         for sheet_name in df_dict.keys():
-            match = re.search(r'(\d+)月(\d+)日(?:\(.\))?', sheet_name)
-            if match:
+            if sheet_date(sheet_name):
                 valid_sheets.append(sheet_name)
             else:
                 invalid_sheets.append(sheet_name)
@@ -1150,121 +1310,79 @@ def update_menu_with_desserts(input_file: str, output_file: str = None):
         
         if not valid_sheets:
             error_msg = "有効なシートがありません。シート名は「X月Y日」の形式である必要があります。"
-            print(error_msg)
+            logger.error("%s", error_msg)
             error_info['error_reason'] = error_msg
             raise ValueError(error_msg)
         
         # シートを処理
         try:
-            processed_data = process_all_sheets(df_dict)
-            print(f"全シート処理完了: {len(processed_data.keys())}列")
-            error_info['処理列数'] = len(processed_data.keys())
+            book = process_all_sheets(df_dict, progress=progress)
+            logger.info("全シート処理完了: %s日分", len(book))
+            error_info['処理日数'] = len(book)
         except Exception as process_err:
-            print(f"シート処理エラー: {str(process_err)}")
+            logger.exception("シート処理エラー: %s", process_err)
             error_info['process_error'] = str(process_err)
             import traceback
             error_info['process_traceback'] = traceback.format_exc()
-            print(traceback.format_exc())
             raise
         
-        # 項目を行インデックスに、日付を列とするDataFrameを作成
+        progress.start('出力', message=output_format)
+        
+        # 画像・PDFは献立から直接出力（Excelへの書き出し・再読み込みを行わない）
+        if output_format == 'png':
+            output_pages = generate_menu_image_output(book, output_file)
+            progress.finish()
+            return output_pages
+        if output_format == 'pdf':
+            output_pdf = generate_menu_pdf_output(book, output_file)
+            progress.finish()
+            return output_pdf
+        
+        # 献立モデルから日付ごとのセル値に変換（DataFrameは作らずにそのまま書き出す）
         try:
-            items = processed_data['項目']
-            date_cols = [col for col in processed_data.keys() if col != '項目']
-            
-            # 各日付のデータを列に配置
-            data = {}
-            for date_col in date_cols:
-                data[date_col] = processed_data[date_col]
-                
-            # DataFrameを作成（項目をインデックスに設定）
-            result_df = pd.DataFrame(data, index=items)
-            print(f"DataFrameの作成完了: {result_df.shape}")
-            error_info['DataFrame形状'] = f"{result_df.shape[0]}行 x {result_df.shape[1]}列"
-        except Exception as df_err:
-            print(f"DataFrame作成エラー: {str(df_err)}")
-            error_info['dataframe_error'] = str(df_err)
+            columns = book.to_columns()
+            error_info['表の大きさ'] = f"{len(ITEM_LABELS)}行 x {len(columns)}列"
+        except Exception as table_err:
+            logger.exception("表の作成エラー: %s", table_err)
+            error_info['table_error'] = str(table_err)
             import traceback
-            error_info['dataframe_traceback'] = traceback.format_exc()
-            print(traceback.format_exc())
+            error_info['table_traceback'] = traceback.format_exc()
             raise
         
-        # 出力ファイルが指定されていない場合は一時ファイルを作成
+        # 出力ファイルが指定されていない場合はメモリ上に出力（一時ファイルを作成しない）
         if output_file is None:
-            temp_dir = Path(os.getenv('TEMP', '/tmp'))
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_file = temp_dir / f'menu_with_desserts_{timestamp}.xlsx'
+            output_file = io.BytesIO()
         
         # ファイル保存
         try:
-            with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
-                # インデックスをA列に、index_labelをFalseに設定して出力
-                result_df.to_excel(writer, sheet_name='Sheet1', index=True, index_label=False)
-                
-                # 書式設定
-                workbook = writer.book
-                worksheet = writer.sheets['Sheet1']
-                
-                # セル書式
-                cell_format = workbook.add_format({
-                    'font_size': 8,
-                    'font_name': 'MS Gothic',
-                    'text_wrap': True,
-                    'align': 'left',
-                    'valign': 'top'
-                })
-                
-                # 列幅調整と書式適用
-                # インデックス列（A列）を含めた列数でループ
-                for col_num, col in enumerate(result_df.reset_index().columns):
-                    # 列幅を計算（文字数に基づく）
-                    max_width = len(str(col)) * 1.2  # ヘッダー幅
-                    
-                    if col_num == 0:  # インデックス列（項目）
-                        for cell in result_df.index.astype(str):
-                            width = len(cell) * 1.1
-                            max_width = max(max_width, width)
-                    else:  # データ列
-                        col_name = result_df.columns[col_num-1]
-                        for cell in result_df[col_name].astype(str):
-                            lines = cell.split('\n')
-                            for line in lines:
-                                width = len(line) * 1.1
-                                max_width = max(max_width, width)
-                    
-                    # 幅を制限（10～50の範囲）
-                    column_width = max(10, min(max_width, 50))
-                    worksheet.set_column(col_num, col_num, column_width)
-                
-                # 全セルに書式を適用
-                for row in range(len(result_df) + 1):
-                    worksheet.set_row(row, None, cell_format)
-            
-            print(f"ファイル保存完了: {output_file}")
+            # 列幅はまとめて計算し、1行ずつ書き出す
+            with span('Excel書き出し', rows=len(ITEM_LABELS), columns=len(columns)):
+                write_menu_table(output_file, ITEM_LABELS, columns)
+            if isinstance(output_file, io.BytesIO):
+                output_file.seek(0)
+                logger.info("ファイル保存完了: メモリ上（%s bytes）", output_file.getbuffer().nbytes)
+            else:
+                logger.info("ファイル保存完了: %s", output_file)
         except Exception as save_err:
-            print(f"ファイル保存エラー: {str(save_err)}")
+            logger.exception("ファイル保存エラー: %s", save_err)
             error_info['save_error'] = str(save_err)
             import traceback
             error_info['save_traceback'] = traceback.format_exc()
-            print(traceback.format_exc())
             raise
         
-        # ファイルを自動で開く
-        if os.path.exists(output_file):
-            if os.name == 'posix':  # macOS または Linux
-                subprocess.run(["open", str(output_file)])
-            elif os.name == 'nt':   # Windows
-                subprocess.run(["start", str(output_file)], shell=True)
+        # ファイルを自動で開く（デスクトップで有効化されている場合のみ）
+        open_output_file(output_file)
         
+        progress.finish()
         return output_file
         
     except Exception as e:
-        print(f"メニュー更新エラー: {str(e)}")
+        logger.error("メニュー更新エラー: %s", e)
         error_info['final_error'] = str(e)
         import traceback
         traceback_str = traceback.format_exc()
         error_info['final_traceback'] = traceback_str
-        print(f"詳細なエラー情報:\n{traceback_str}")
+        logger.error("詳細なエラー情報:\n%s", traceback_str)
         
         # エラー情報を一時ファイルに保存（デバッグ用）
         try:
@@ -1274,253 +1392,217 @@ def update_menu_with_desserts(input_file: str, output_file: str = None):
             error_file = temp_dir / f'menu_update_error_{timestamp}.json'
             with open(error_file, 'w', encoding='utf-8') as f:
                 json.dump(error_info, f, ensure_ascii=False, indent=2)
-            print(f"エラー情報を保存しました: {error_file}")
+            logger.error("エラー情報を保存しました: %s", error_file)
         except:
             pass
             
         return None
 
-def generate_menu_image_output(input_file: str, output_file: str = None):
+def build_menu_table(input_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    出力済みの献立表（Excel）を、項目をインデックス・日付を列とする表に整形する
+    （画像出力とPDF出力で共通して使用する）
+    """
+    # 項目列を定義
+    items = list(ITEM_LABELS)
+    
+    # 入力データが'項目'列を持っているか確認
+    if '項目' in input_df.columns:
+        # 入力データから項目と日付を特定
+        date_cols = [col for col in input_df.columns if col != '項目']
+        
+        # 項目をインデックスに設定
+        input_df_indexed = input_df.set_index('項目')
+        
+        # テンプレート形式の新しいDataFrameを作成
+        data = {}
+        for date_col in date_cols:
+            data[date_col] = [""] * len(items)  # 各項目のデータを初期化
+        
+        # データを転記
+        for i, item in enumerate(items):
+            if item in input_df_indexed.index:
+                for date_col in date_cols:
+                    if date_col in input_df_indexed.columns:
+                        data[date_col][i] = input_df_indexed.loc[item, date_col]
+        
+        # 結果用DataFrameを作成
+        result_df = pd.DataFrame(data, index=items)
+    else:
+        # 入力データが既に転置された形式である場合
+        result_df = input_df.copy()
+        # インデックスに項目を設定
+        if len(result_df) >= len(items):
+            result_df = result_df.iloc[:len(items)]
+            result_df.index = items
+        else:
+            # 行が足りない場合は拡張
+            new_df = pd.DataFrame(index=items)
+            for col in result_df.columns:
+                new_df[col] = ""
+            # 既存データをコピー
+            for i, idx in enumerate(result_df.index):
+                if i < len(items):
+                    item = items[i]
+                    for col in result_df.columns:
+                        new_df.loc[item, col] = result_df.loc[idx, col]
+            result_df = new_df
+    
+    return result_df
+
+def load_menu_table(source) -> pd.DataFrame:
+    """
+    画像・PDF出力用の表を取得する
+
+    source には処理済みの MenuBook・DataFrame（update_menu_with_desserts の result_df など）、
+    または出力済みの献立表（ファイルパス・bytes・ファイルオブジェクト）を指定できる。
+    処理済みのデータはExcelへの書き出し・読み込みを行わずにそのまま使用する。
+    """
+    if isinstance(source, MenuBook):
+        return source.to_dataframe()
+    if isinstance(source, pd.DataFrame):
+        if list(source.index) == list(ITEM_LABELS):
+            return source
+        return build_menu_table(source)
+    return build_menu_table(pd.read_excel(as_excel_source(source)))
+
+@traced()
+def generate_menu_image_output(input_file, output_file=None, days_per_page: int = DAYS_PER_PAGE,
+                               output_format: str = None):
     """
     メニューファイルを読み込み、画像形式で出力する
     元のExcelファイルと同じ形式（1行目B列以降に日付、A列に項目）で出力する
+    日付は days_per_page 日ごとのページに分けて並列に描画する
 
     Args:
-        input_file (str): 入力ファイルのパス
-        output_file (str): 出力ファイルのパス（指定がない場合は自動生成）
+        input_file: 処理済みの MenuBook・DataFrame、または献立表のファイルパス・bytes・ファイルオブジェクト
+        output_file: 出力ファイルのパス（指定がない場合はメモリ上に出力する）
+        days_per_page (int): 1ページあたりの日数（0以下の場合は全日付を1ページにする）
+        output_format (str): 'png'（ページごとの画像）または 'pdf'（複数ページのPDF）。
+            未指定の場合は output_file の拡張子から判断する（既定は 'png'）
 
     Returns:
-        str: 出力ファイルのパス
+        png: ページごとの出力ファイルパスのリスト（output_file未指定の場合はBytesIOのリスト）
+        pdf: 出力ファイルのパス（output_file未指定の場合はBytesIO）
     """
     try:
-        from PIL import Image, ImageDraw, ImageFont
-        import os
-        import pandas as pd
-        
-        print(f"画像出力処理開始: {input_file}")
-        
-        # 参照用のサンプルExcelを読み込む
-        try:
-            template_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                       "data", "output", "041.xlsx")
-            if os.path.exists(template_path):
-                template_df = pd.read_excel(template_path)
-                print(f"テンプレートExcelを読み込みました: {template_path}")
+        logger.info("画像出力処理開始: %s", describe_input(input_file))
+        
+        # 項目 × 日付の表を取得（処理済みの表はそのまま使い、Excelは必要な場合のみ読み込む）
+        result_df = load_menu_table(input_file)
+        
+        if output_format is None:
+            is_pdf = isinstance(output_file, (str, os.PathLike)) and str(output_file).lower().endswith('.pdf')
+            output_format = 'pdf' if is_pdf else 'png'
+        
+        # 文字幅を測って折り返し・行の高さを計算し、ページごとに描画
+        index = [str(item) for item in result_df.index]
+        columns = {str(col): result_df[col].tolist() for col in result_df.columns}
+        
+        if output_format == 'pdf':
+            if output_file is None:
+                output_file = io.BytesIO()
+            # ページは描画しながら1ページずつ書き出す（全ページの画像をまとめて保持しない）
+            with span('画像描画', format='pdf', days=len(columns)) as render_span:
+                pages = render_pages(index, columns, encode=encode_pdf_page, days_per_page=days_per_page)
+                if not isinstance(output_file, (str, os.PathLike)):
+                    page_count = write_raster_pdf(pages, output_file)
+                    output_file.seek(0)
+                else:
+                    with open(output_file, 'wb') as f:
+                        page_count = write_raster_pdf(pages, f)
+                render_span.set(pages=page_count)
+            if isinstance(output_file, (str, os.PathLike)):
+                logger.info("PDFファイル保存完了: %s（%sページ）", output_file, page_count)
             else:
-                print(f"テンプレートが見つかりません: {template_path}")
-                template_df = None
-        except Exception as e:
-            print(f"テンプレート読み込みエラー: {str(e)}")
-            template_df = None
+                logger.info("PDF保存完了: メモリ上（%sページ）", page_count)
             
-        # 入力されたExcelファイルを読み込む
-        input_df = pd.read_excel(input_file)
+            # ファイルを自動で開く（デスクトップで有効化されている場合のみ）
+            open_output_file(output_file)
+            return output_file
         
-        # 出力ファイルが指定されていない場合は自動生成
         if output_file is None:
-            temp_dir = os.path.dirname(input_file)
-            base_name = os.path.splitext(os.path.basename(input_file))[0]
-            output_file = os.path.join(temp_dir, f'{base_name}_image_output.png')
-        
-        # 項目列を定義
-        items = [
-            "栄養素", 
-            "朝食", 
-            "朝食：食材", 
-            "昼食 (主菜/副菜/汁物)",
-            "昼食：食材/1人分/45人分",
-            "夕食 (主菜/副菜/小鉢/汁物)",
-            "夕食：食材/1人分/45人分"
-        ]
-        
-        # 入力データが'項目'列を持っているか確認
-        if '項目' in input_df.columns:
-            # 入力データから項目と日付を特定
-            date_cols = [col for col in input_df.columns if col != '項目']
-            
-            # 項目をインデックスに設定
-            input_df_indexed = input_df.set_index('項目')
-            
-            # テンプレート形式の新しいDataFrameを作成
-            data = {}
-            for date_col in date_cols:
-                data[date_col] = [""] * len(items)  # 各項目のデータを初期化
-            
-            # データを転記
-            for i, item in enumerate(items):
-                if item in input_df_indexed.index:
-                    for date_col in date_cols:
-                        if date_col in input_df_indexed.columns:
-                            data[date_col][i] = input_df_indexed.loc[item, date_col]
-            
-            # 結果用DataFrameを作成
-            result_df = pd.DataFrame(data, index=items)
+            with span('画像描画', format='png', days=len(columns)) as render_span:
+                outputs = [io.BytesIO(page) for page in
+                           render_pages(index, columns, encode=encode_png, days_per_page=days_per_page)]
+                render_span.set(pages=len(outputs))
+            logger.info("画像保存完了: メモリ上（%sページ）", len(outputs))
+            return outputs
+        
+        # 複数ページの場合はファイル名に連番を付ける
+        page_count = len(split_pages(columns, days_per_page))
+        if page_count == 1:
+            page_files = [output_file]
         else:
-            # 入力データが既に転置された形式である場合
-            result_df = input_df.copy()
-            # インデックスに項目を設定
-            if len(result_df) >= len(items):
-                result_df = result_df.iloc[:len(items)]
-                result_df.index = items
-            else:
-                # 行が足りない場合は拡張
-                new_df = pd.DataFrame(index=items)
-                for col in result_df.columns:
-                    new_df[col] = ""
-                # 既存データをコピー
-                for i, idx in enumerate(result_df.index):
-                    if i < len(items):
-                        item = items[i]
-                        for col in result_df.columns:
-                            new_df.loc[item, col] = result_df.loc[idx, col]
-                result_df = new_df
-        
-        # 行と列の設定
-        num_rows = len(result_df)
-        num_cols = len(result_df.columns) + 1  # インデックス列を含む
-        
-        # 列の幅と行の高さを設定
-        col_widths = [120]  # 項目列の幅
-        for i in range(1, num_cols):
-            col_widths.append(150)  # 日付列の幅
-            
-        row_heights = [30]  # ヘッダー行の高さ
-        for i in range(num_rows):
-            # データの量に応じて行の高さを可変にする
-            max_lines = 1
-            for col in result_df.columns:
-                cell_text = str(result_df.iloc[i][col])
-                lines = len(cell_text.split('\n'))
-                max_lines = max(max_lines, lines)
-            
-            row_height = max(30, max_lines * 20)  # 1行あたり20px、最小30px
-            row_heights.append(row_height)
+            base = Path(output_file)
+            page_files = [str(base.with_name(f"{base.stem}_{page_num}{base.suffix}")) for page_num in range(1, page_count + 1)]
+        # ページは描画しながら1ページずつ書き出す（全ページの画像をまとめて保持しない）
+        with span('画像描画', format='png', days=len(columns), pages=page_count):
+            pages = render_pages(index, columns, encode=encode_png, days_per_page=days_per_page)
+            for page_file, page in zip(page_files, pages):
+                with open(page_file, 'wb') as f:
+                    f.write(page)
+                logger.debug("画像ファイル保存完了: %s", page_file)
         
-        # 画像のサイズを計算
-        total_width = sum(col_widths)
-        total_height = sum(row_heights)
+        # 画像ファイルを自動で開く（デスクトップで有効化されている場合のみ）
+        open_output_file(page_files[0])
         
-        # 画像を作成
-        img = Image.new('RGB', (total_width, total_height), color='white')
-        draw = ImageDraw.Draw(img)
+        return page_files
         
-        # フォントの設定
-        try:
-            font_path = "C:\\Windows\\Fonts\\msgothic.ttc"
-            header_font = ImageFont.truetype(font_path, 12)
-            cell_font = ImageFont.truetype(font_path, 10)
-        except:
-            # フォントが見つからない場合はデフォルトフォント
-            header_font = ImageFont.load_default()
-            cell_font = ImageFont.load_default()
-        
-        # ヘッダー行の描画（項目列と日付列）
-        x_pos = 0
-        y_pos = 0
-        
-        # 左上の空白セル
-        draw.rectangle(
-            [(x_pos, y_pos), (x_pos + col_widths[0], y_pos + row_heights[0])],
-            fill='#d3d3d3',
-            outline='black'
-        )
-        draw.text(
-            (x_pos + 5, y_pos + 5),
-            "項目",
-            font=header_font,
-            fill='black'
-        )
-        x_pos += col_widths[0]
-        
-        # 日付列のヘッダー
-        for col_idx, col_name in enumerate(result_df.columns):
-            draw.rectangle(
-                [(x_pos, y_pos), (x_pos + col_widths[col_idx+1], y_pos + row_heights[0])],
-                fill='#d3d3d3',
-                outline='black'
-            )
-            draw.text(
-                (x_pos + 5, y_pos + 5),
-                str(col_name),
-                font=header_font,
-                fill='black'
-            )
-            x_pos += col_widths[col_idx+1]
-        
-        # データ行の描画
-        current_y = row_heights[0]  # ヘッダー行の後から開始
-        
-        for row_idx, item in enumerate(result_df.index):
-            # 項目列
-            x_pos = 0
-            row_height = row_heights[row_idx + 1]
-            
-            # 項目セルの描画
-            draw.rectangle(
-                [(x_pos, current_y), (x_pos + col_widths[0], current_y + row_height)],
-                outline='black',
-                fill='white'
-            )
-            draw.text(
-                (x_pos + 5, current_y + 5),
-                str(item),
-                font=cell_font,
-                fill='black'
-            )
-            x_pos += col_widths[0]
-            
-            # 各日付のデータセル
-            for col_idx, col_name in enumerate(result_df.columns):
-                cell_value = result_df.loc[item, col_name]
-                cell_text = str(cell_value) if pd.notna(cell_value) else ""
-                
-                # セルの枠線
-                draw.rectangle(
-                    [(x_pos, current_y), (x_pos + col_widths[col_idx+1], current_y + row_height)],
-                    outline='black',
-                    fill='white'  # 白背景
-                )
-                
-                # セルのテキスト描画（複数行対応）
-                if cell_text:
-                    # 長いテキストは複数行に分割
-                    lines = cell_text.split('\n')
-                    for line_idx, line in enumerate(lines):
-                        draw.text(
-                            (x_pos + 5, current_y + 5 + (line_idx * 16)),  # 行間16ピクセル
-                            line,
-                            font=cell_font,
-                            fill='black'
-                        )
-                
-                x_pos += col_widths[col_idx+1]
-            
-            current_y += row_height
+    except Exception as e:
+        logger.exception("画像出力エラー: %s", e)
+        return None
+
+@traced()
+def generate_menu_pdf_output(input_file, output_file=None, days_per_page: int = DAYS_PER_PAGE):
+    """
+    メニューファイルを読み込み、ベクターPDFで出力する（画像出力と同じ表を文字・罫線として描画する）
+
+    Args:
+        input_file: 処理済みの MenuBook・DataFrame、または献立表のファイルパス・bytes・ファイルオブジェクト
+        output_file: 出力ファイルのパス（指定がない場合はメモリ上に出力する）
+        days_per_page (int): 1ページあたりの日数
+
+    Returns:
+        出力ファイルのパス（output_file未指定の場合はBytesIO）、失敗した場合はNone
+    """
+    try:
+        from pdf_export import write_menu_pdf
+        
+        logger.info("PDF出力処理開始: %s", describe_input(input_file))
+        
+        # 画像出力と同じ表を取得
+        result_df = load_menu_table(input_file)
+        index = [str(item) for item in result_df.index]
+        columns = {str(col): result_df[col].tolist() for col in result_df.columns}
         
-        # 画像を保存
-        img.save(output_file)
-        print(f"画像ファイル保存完了: {output_file}")
+        if output_file is None:
+            output_file = io.BytesIO()
+        with span('PDF描画', days=len(columns)) as render_span:
+            page_count = write_menu_pdf(output_file, index, columns, days_per_page=days_per_page)
+            render_span.set(pages=page_count)
+        
+        if isinstance(output_file, io.BytesIO):
+            output_file.seek(0)
+            logger.info("PDF保存完了: メモリ上（%sページ, %s bytes）", page_count, output_file.getbuffer().nbytes)
+        else:
+            logger.info("PDFファイル保存完了: %s（%sページ）", output_file, page_count)
         
-        # 画像ファイルを自動で開く
-        if os.path.exists(output_file):
-            if os.name == 'posix':  # macOS または Linux
-                import subprocess
-                subprocess.run(["open", str(output_file)])
-            elif os.name == 'nt':   # Windows
-                import subprocess
-                subprocess.run(["start", str(output_file)], shell=True)
+        # ファイルを自動で開く（デスクトップで有効化されている場合のみ）
+        open_output_file(output_file)
         
         return output_file
         
+    except ImportError as e:
+        logger.warning("PDF出力にはreportlabが必要です（pip install reportlab）: %s", e)
+        return None
     except Exception as e:
-        print(f"画像出力エラー: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("PDF出力エラー: %s", e)
         return None
 
 def calculate_nutrition_for_menu(menu_data):
     """メニューデータから栄養価を計算する関数"""
-    nutrition_db = load_nutrition_data()
+    nutrition_db = get_nutrition_data()
     nutrition_results = {}
     
     # 基本栄養価の参照値（30-49歳女性の推奨量をベース）
@@ -1648,32 +1730,17 @@ def calculate_nutrition_for_menu(menu_data):
                 formatted_nutrition[nutrient] = round(value * 10) / 10
         
         nutrition_results[date] = formatted_nutrition
-        print(f"  {date}の栄養価計算完了")
+        logger.debug("  %sの栄養価計算完了", date)
     
     return nutrition_results
 
-def identify_dish_category(dish_name):
-    """料理名からカテゴリを判別する"""
-    categories = {
-        '肉': ['肉', 'ミート', 'ハンバーグ', 'ステーキ', 'カツ', '唐揚げ', 'チキン', '鶏', '豚', '牛', 'ウィンナー', 'ソーセージ', 'ベーコン'],
-        '魚': ['魚', '鮭', 'サバ', 'サンマ', 'アジ', 'カレイ', 'ブリ', '刺身', '寿司', '海鮮', 'シーフード'],
-        '麺類': ['麺', 'うどん', 'そば', 'パスタ', 'ラーメン', 'スパゲッティ', '焼きそば'],
-        '米': ['ご飯', '米', 'チャーハン', '炊き込み', 'おにぎり'],
-        '野菜': ['サラダ', '野菜', 'ほうれん草', 'キャベツ', 'ブロッコリー', '人参', 'トマト'],
-        '汁物': ['スープ', '味噌汁', 'みそ汁', '吸い物', 'ポタージュ', 'シチュー'],
-        'デザート': ['ケーキ', 'プリン', 'ゼリー', 'アイス', 'デザート', 'フルーツ', '果物', 'ヨーグルト']
-    }
-    
-    dish_name = dish_name.lower()
-    for category, keywords in categories.items():
-        for keyword in keywords:
-            if keyword in dish_name:
-                return category
-    
-    return '不明'
+def evaluate_menu_balance(menu_data, nutrition_data, history=None):
+    """
+    現在のメニュー構成のバランスを評価する
 
-def evaluate_menu_balance(menu_data, nutrition_data):
-    """現在のメニュー構成のバランスを評価する"""
+    history（history.days_before の結果）を指定し、履歴の最後の日が最初の日の前日の場合は、その間も
+    連続する日として同じカテゴリの数を数える（前のファイルの月末と同じ系統の料理が続かないようにする）。
+    """
     scores = {}
     
     # 栄養バランスの評価
@@ -1739,6 +1806,18 @@ def evaluate_menu_balance(menu_data, nutrition_data):
         common_categories = set(current_categories) & set(next_categories)
         consecutive_same_category += len(common_categories)
     
+    # 履歴の最後の日（前のファイルの最終日）が最初の日の前日であれば、その日と最初の日を比較
+    if history and dates:
+        served_days = {label: resolve_date(label) for label in dates}
+        served_days = {label: served_on for label, served_on in served_days.items() if served_on}
+        last_served_on, previous_day = list(history.items())[-1]
+        last_served_on = resolve_date(last_served_on)
+        if served_days and last_served_on:
+            first_date = min(served_days, key=served_days.get)
+            if last_served_on + timedelta(days=1) == served_days[first_date]:
+                previous_categories = {identify_dish_category(item) for items in previous_day.values() for item in items}
+                consecutive_same_category += len((previous_categories - {'不明'}) & set(daily_categories[first_date]))
+    
     # 同じ曜日の同じカテゴリをチェック
     weekly_pattern = {}
     for date in dates:
@@ -1781,15 +1860,15 @@ def evaluate_menu_balance(menu_data, nutrition_data):
     
     return scores
 
-def optimize_menu_order(menu_data, nutrition_data):
-    """献立の順序を最適化する"""
+def optimize_menu_order(menu_data, nutrition_data, history=None):
+    """献立の順序を最適化する（history は evaluate_menu_balance と同じ）"""
     import random
     
     # 最初のスコアを計算
-    best_scores = evaluate_menu_balance(menu_data, nutrition_data)
+    best_scores = evaluate_menu_balance(menu_data, nutrition_data, history)
     best_menu_data = menu_data.copy()
     
-    print(f"初期スコア: 栄養={best_scores['nutrition']}, 多様性={best_scores['variety']}, 合計={best_scores['total']}")
+    logger.info("初期スコア: 栄養=%s, 多様性=%s, 合計=%s", best_scores['nutrition'], best_scores['variety'], best_scores['total'])
     
     # メニューの日付リスト
     dates = list(menu_data.keys())
@@ -1814,15 +1893,15 @@ def optimize_menu_order(menu_data, nutrition_data):
             new_nutrition_data[date1], new_nutrition_data[date2] = new_nutrition_data[date2], new_nutrition_data[date1]
         
         # 新しいスコアを計算
-        new_scores = evaluate_menu_balance(new_menu_data, new_nutrition_data)
+        new_scores = evaluate_menu_balance(new_menu_data, new_nutrition_data, history)
         
         # スコアが改善していたら採用
         if new_scores['total'] > best_scores['total']:
             best_scores = new_scores
             best_menu_data = new_menu_data.copy()
-            print(f"改善: 栄養={best_scores['nutrition']}, 多様性={best_scores['variety']}, 合計={best_scores['total']}")
+            logger.debug("改善: 栄養=%s, 多様性=%s, 合計=%s", best_scores['nutrition'], best_scores['variety'], best_scores['total'])
     
-    print(f"最終スコア: 栄養={best_scores['nutrition']}, 多様性={best_scores['variety']}, 合計={best_scores['total']}")
+    logger.info("最終スコア: 栄養=%s, 多様性=%s, 合計=%s", best_scores['nutrition'], best_scores['variety'], best_scores['total'])
     
     return best_menu_data
 
@@ -1842,76 +1921,104 @@ def reorder_combined_data(combined_data, best_order):
     
     return reordered_data
 
-def update_menu_with_reordering(input_file: str, output_file: str = None, reorder_type: str = "栄養バランス優先並び替え", 
-                               target_weekday: str = None, target_genre: str = None):
-    """メニューファイルを読み込み、指定した戦略で並び替えて保存し自動的に開く"""
+# 解析済みワークブックのキャッシュ（ワークブックのハッシュ → ParsedMenu）
+_PARSED_MENU_CACHE = OrderedDict()
+_PARSED_MENU_CACHE_SIZE = 8
+_PARSED_MENU_CACHE_LOCK = threading.Lock()
+
+class ParsedMenu(NamedTuple):
+    """ワークブックの解析結果（並び替えプレビュー・並び替え保存で共有する）"""
+    df_dict: dict
+    book: MenuBook
+    all_meals: dict
+    all_nutrition: dict
+
+def clear_parsed_menu_cache():
+    """解析済みワークブックのキャッシュを削除する"""
+    with _PARSED_MENU_CACHE_LOCK:
+        _PARSED_MENU_CACHE.clear()
+
+def workbook_hash(input_file) -> str:
+    """ワークブックの内容からハッシュ値を計算する"""
+    return hashlib.sha256(read_input_bytes(input_file)).hexdigest()
+
+@traced()
+def extract_menu_and_nutrition(input_file, progress=None) -> ParsedMenu:
+    """
+    ワークブックを読み込み、献立と栄養価（数値）を抽出する
+
+    結果はワークブックのハッシュ値でキャッシュされるため、同じ内容のファイルに対する
+    プレビューと保存で読み込み・シート解析・デザート生成が繰り返されない。
+    返される値は共有されるため、呼び出し側で変更しないこと。
+    キャッシュを再利用した場合は progress に通知しない。
+    """
+    progress = as_reporter(progress)
+    data = read_input_bytes(input_file)
+    key = hashlib.sha256(data).hexdigest()
+    with _PARSED_MENU_CACHE_LOCK:
+        cached = _PARSED_MENU_CACHE.get(key)
+        if cached is not None:
+            _PARSED_MENU_CACHE.move_to_end(key)
+            logger.info("解析済みのワークブックを再利用します: %s", key[:12])
+            set_attributes(cache='hit')
+            return cached
+    set_attributes(cache='miss')
+
+    # Excelファイルを読み込む（読み込み済みのbytesから解析し、ファイルを再度開かない）
+    progress.start('読み込み')
+    with span('Excel読み込み') as read_span:
+        df_dict = pd.read_excel(io.BytesIO(data), sheet_name=None)
+        read_span.set(sheets=len(df_dict))
+    
+    # データ前処理
+    book = process_all_sheets(df_dict, progress=progress)
+    
+    # 全日分のメニューと栄養素データを抽出
+    all_meals = book.menu_names_by_date()
+    all_nutrition = book.nutrition_by_date()
+    
+    parsed = ParsedMenu(df_dict, book, all_meals, all_nutrition)
+    with _PARSED_MENU_CACHE_LOCK:
+        _PARSED_MENU_CACHE[key] = parsed
+        while len(_PARSED_MENU_CACHE) > _PARSED_MENU_CACHE_SIZE:
+            _PARSED_MENU_CACHE.popitem(last=False)
+    return parsed
+
+@traced()
+def update_menu_with_reordering(input_file, output_file=None, reorder_type: str = "栄養バランス優先並び替え", 
+                               target_weekday: str = None, target_genre: str = None, progress=None):
+    """
+    メニューファイルを読み込み、指定した戦略で並び替えて保存する
+
+    input_file にはファイルパスのほかbytes・ファイルオブジェクトを指定できる。
+    output_file を指定しない場合はメモリ上に出力し、BytesIOを返す。
+    """
+    progress = as_reporter(progress)
+    progress.plan(REORDER_STAGES)
     try:
-        print(f"処理開始: {input_file}")
-        print(f"並び替え戦略: {reorder_type}")
+        logger.info("処理開始: %s", describe_input(input_file))
+        logger.info("並び替え戦略: %s", reorder_type)
         
         if target_weekday and target_genre:
-            print(f"ターゲット曜日: {target_weekday}, ターゲットジャンル: {target_genre}")
-        
-        # Excelファイルを読み込む
-        df_dict = pd.read_excel(input_file, sheet_name=None)
-        
-        # データ前処理
-        processed_data = process_all_sheets(df_dict)
-        
-        # 全日分のメニューと栄養素データを抽出
-        all_meals = {}
-        all_nutrition = {}
-        date_columns = [col for col in processed_data.keys() if col != '項目']
+            logger.info("ターゲット曜日: %s, ターゲットジャンル: %s", target_weekday, target_genre)
         
-        for date_col in date_columns:
-            # メニューデータの抽出と整形
-            breakfast = processed_data[date_col][1].split('\n') if processed_data[date_col][1] else []
-            lunch = processed_data[date_col][3].split('\n') if processed_data[date_col][3] else []
-            dinner = processed_data[date_col][5].split('\n') if processed_data[date_col][5] else []
-            
-            # メニューデータを辞書に格納
-            all_meals[date_col] = {
-                '朝食': [item for item in breakfast if item.strip()],
-                '昼食': [item for item in lunch if item.strip()],
-                '夕食': [item for item in dinner if item.strip()]
-            }
-            
-            # 栄養データの解析
-            nutrition_text = processed_data[date_col][0]
-            nutrition_dict = {}
-            
-            if nutrition_text:
-                try:
-                    import re
-                    pattern = r'([^:]+):\s*(\d+(?:\.\d+)?)\s*(\w*)'
-                    matches = re.findall(pattern, nutrition_text)
-                    
-                    for nutrient, value, unit in matches:
-                        nutrient = nutrient.strip()
-                        nutrition_dict[nutrient] = float(value)
-                except Exception as e:
-                    print(f"栄養データ解析エラー: {str(e)}")
-                    nutrition_dict = {}
-            
-            all_nutrition[date_col] = nutrition_dict
+        # 献立と栄養価を抽出（同じワークブックはキャッシュを再利用）
+        df_dict, book, all_meals, all_nutrition = extract_menu_and_nutrition(input_file, progress=progress)
         
         # LLMを使用した並び替え
+        progress.start('並び替え', message=reorder_type)
         optimized_menu_order, _ = reorder_with_llm(all_meals, all_nutrition, reorder_type, target_weekday, target_genre)
+        progress.start('出力')
         
         # 新しい日付の順序に基づいて出力データを再構成
-        reordered_data = {'項目': processed_data['項目']}
+        reordered_data = book.reordered(list(optimized_menu_order.keys())).to_combined_data()
         
-        # 日付順の変更を反映
-        for original_date, new_meals in optimized_menu_order.items():
-            # 元の日付で対応するデータをコピー
-            reordered_data[original_date] = processed_data[original_date]
-        
-        # 出力先が指定されていない場合、デフォルトの名前を生成
+        # 出力先が指定されていない場合はメモリ上に出力
         if output_file is None:
-            output_file = 'reordered_menu.xlsx'
+            output_file = io.BytesIO()
         
         # データをExcelファイルに書き込み
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        with span('Excel書き出し', sheets=len(df_dict)), pd.ExcelWriter(output_file, engine='openpyxl') as writer:
             for sheet_name, sheet_data in df_dict.items():
                 # 'Sheet1'の場合は並び替えたデータを使用
                 if sheet_name == 'Sheet1':
@@ -1920,34 +2027,62 @@ def update_menu_with_reordering(input_file: str, output_file: str = None, reorde
                     # それ以外のシートはそのまま書き込み
                     sheet_data.to_excel(writer, sheet_name=sheet_name, index=False)
         
+        if isinstance(output_file, io.BytesIO):
+            output_file.seek(0)
+        
+        progress.finish()
         return output_file
         
     except Exception as e:
-        print(f"献立並び替えエラー: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("献立並び替えエラー: %s", e)
         raise e
 
+def format_menu_history(history) -> str:
+    """過去の献立（history.days_before の結果）をプロンプト用の「- 日付: 料理、料理」の行にする"""
+    if not history:
+        return "なし"
+    return '\n'.join(
+        f"- {day}: {'、'.join(name for names in meals.values() for name in names)}" for day, meals in history.items()
+    )
+
+def parse_reorder_response(response, dates):
+    """
+    並び替えの応答（reordered_dates と rationale のJSON）から日付の順序と理由を取り出す
+
+    応答の日付が元の日付の並べ替えになっていない場合は ValueError を送出する。
+    """
+    response_text = response.text
+    json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', response_text)
+    if json_match:
+        json_str = json_match.group(1)
+    else:
+        json_str = response_text[response_text.find('{'):response_text.rfind('}') + 1]
+    answer = json.loads(json_str)
+    order = [str(date) for date in answer.get('reordered_dates', [])]
+    if sorted(order) != sorted(dates):
+        raise ValueError(f"並び替え後の日付が元の日付と一致しません: {order}")
+    return order, answer.get('rationale', '')
+
 def reorder_with_llm(all_meals, all_nutrition, strategy, target_weekday=None, target_genre=None):
-    """LLMを使用してメニュー並び替えを行う統合関数"""
+    """
+    LLMを使用してメニュー並び替えを行う統合関数
+
+    並び替え後の献立（日付をキーとした辞書）と並び替えの理由を返す。LLMを使用できない場合は
+    従来のアルゴリズムで並び替える（いずれも最初の日より前に提供した献立を考慮する）。
+    """
+    # 最初の日より前に提供した献立（前のファイルの月末と同じ料理が続かないようにする）
+    history = history_for_menu(all_meals.keys(), HISTORY_LOOKBACK_DAYS)
+
+    def reorder_by_algorithm(reason):
+        FALLBACKS.inc(kind='reorder_algorithm')
+        if strategy == "曜日指定並び替え" and target_weekday and target_genre:
+            return reorder_by_weekday_genre(all_meals, all_nutrition, target_weekday, target_genre), reason
+        return reorder_menu_by_strategy(all_meals, all_nutrition, strategy, history), reason
+
     try:
-        # 対象の日付情報を作成
-        date_infos = []
-        for date in all_meals.keys():
-            # 日付から曜日を取得
-            weekday = identify_weekday(date)
-            date_infos.append({
-                "date": date,
-                "display": date,
-                "weekday": weekday if weekday else "不明"
-            })
-        
         if not GOOGLE_API_KEY:
-            print("Google API Keyが設定されていません。従来のアルゴリズムで並び替えを行います。")
-            if strategy == "曜日指定並び替え" and target_weekday and target_genre:
-                return reorder_by_weekday_genre(all_meals, all_nutrition, target_weekday, target_genre), "AIは使用されていません。従来のアルゴリズムで並び替えました。"
-            else:
-                return reorder_menu_by_strategy(all_meals, all_nutrition, strategy), "AIは使用されていません。従来のアルゴリズムで並び替えました。"
+            logger.warning("Google API Keyが設定されていません。従来のアルゴリズムで並び替えを行います。")
+            return reorder_by_algorithm("AIは使用されていません。従来のアルゴリズムで並び替えました。")
         
         # メニューとその栄養情報をJSON形式に変換
         menu_data = {}
@@ -1957,6 +2092,8 @@ def reorder_with_llm(all_meals, all_nutrition, strategy, target_weekday=None, ta
                 "nutrition": all_nutrition.get(date, {})
             }
         
+        recent_history = format_menu_history(history)
+        
         # 各戦略に応じたプロンプトの追加情報
         strategy_prompt = ""
         if strategy == "栄養バランス優先並び替え":
@@ -1996,10 +2133,14 @@ def reorder_with_llm(all_meals, all_nutrition, strategy, target_weekday=None, ta
         3. 曜日ごとの特性を考慮する（例：月曜日は消化の良いもの、金曜日は子どもが喜ぶメニューなど）
         4. 季節感や彩りを考慮する
         5. 週を通して多様な食材が提供されるようにする
+        6. 直前に提供した献立と同じ料理・同じ系統の料理が最初の日に続かないようにする
 
         【メニューデータ】
         {json.dumps(menu_data, ensure_ascii=False, indent=2)}
 
+        【直前に提供した献立（最初の日より前の{HISTORY_LOOKBACK_DAYS}日間）】
+        {recent_history}
+
         【指示】
         最適な並び替え順序を、日付をキーとした辞書形式で出力してください。変更理由も簡潔に説明してください。
         出力形式は以下のJSONのみとしてください：
@@ -2010,204 +2151,34 @@ def reorder_with_llm(all_meals, all_nutrition, strategy, target_weekday=None, ta
         """
         
         # デバッグ出力を追加
-        print("=== LLM呼び出し開始 ===")
-        print(f"APIキー: {GOOGLE_API_KEY[:4]}...{GOOGLE_API_KEY[-4:] if len(GOOGLE_API_KEY) > 8 else '***'}")
-        print(f"対象日数: {len(all_meals)}日分")
-        print(f"開始日: {list(all_meals.keys())[0]}")
+        logger.info("=== LLM呼び出し開始 ===")
+        logger.debug("APIキー: %s...%s", GOOGLE_API_KEY[:4], GOOGLE_API_KEY[-4:] if len(GOOGLE_API_KEY) > 8 else '***')
+        logger.info("対象日数: %s日分", len(all_meals))
+        logger.info("開始日: %s", list(all_meals.keys())[0])
         
         # LLMでの処理
         try:
-            print("Geminiモデルを初期化します...")
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            print("Geminiモデルへのリクエストを実行します...")
-            response = model.generate_content(prompt)
-            print("Geminiモデルからの応答を受信しました")
+            logger.debug("Geminiモデルを初期化します...")
+            model = get_model('gemini-1.5-flash')
+            logger.debug("Geminiモデルへのリクエストを実行します...")
+            response = generate_content(model, prompt)
+            logger.debug("Geminiモデルからの応答を受信しました")
         except Exception as llm_error:
-            print(f"LLM呼び出しエラー: {str(llm_error)}")
-            print("フォールバックメニューを使用します")
-            return create_fallback_menu(date_infos)
+            logger.error("LLM呼び出しエラー: %s", llm_error)
+            return reorder_by_algorithm("AIの呼び出しに失敗したため、従来のアルゴリズムで並び替えました。")
         
-        # 応答をパース
-        try:
-            response_text = response.text
-            
-            # デバッグ出力
-            print("LLM応答テキスト:")
-            print(response_text[:200] + "..." if len(response_text) > 200 else response_text)
-            
-            # JSON部分を抽出（マークダウンコードブロックが含まれる可能性がある）
-            import re
-            json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', response_text)
-            if json_match:
-                json_str = json_match.group(1)
-                print("JSONブロックを抽出しました")
-            else:
-                # コードブロックがない場合は、可能な限りJSONと思われる部分を抽出
-                print("JSONブロックが見つかりません。全テキストから抽出を試みます。")
-                # 波括弧の最初と最後を探す
-                first_brace = response_text.find('{')
-                last_brace = response_text.rfind('}')
-                if first_brace != -1 and last_brace != -1 and first_brace < last_brace:
-                    json_str = response_text[first_brace:last_brace+1]
-                    print(f"JSON部分を抽出しました: {first_brace}〜{last_brace}")
-                else:
-                    json_str = response_text
-                    print("JSON構造が見つかりませんでした。全テキストを使用します。")
-            
-            # JSONを整形する前処理
-            # コメントの削除
-            json_str = re.sub(r'//.*?\n', '\n', json_str)
-            json_str = re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
-            
-            # 末尾のカンマを削除（JSON配列や辞書の最後の要素の後のカンマ）
-            json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
-            
-            # プロパティ名の引用符がない場合に追加
-            json_str = re.sub(r'(\s*)([a-zA-Z0-9_]+)(\s*):(\s*)', r'\1"\2"\3:\4', json_str)
-            
-            # テンプレート文字列を実際の値に置換（{{...}} を解決）
-            json_str = re.sub(r'{{([^}]+)}}', r'{\1}', json_str)
-
-            # 不正な形式の配列を修正 ({"key": value, item1, item2} → {"key": value, "items": [item1, item2]})
-            json_str = re.sub(r'({[^{}]*)"([^"]+)"(\s*:\s*{[^{}]*}),\s*"([^"]+)",\s*"([^"]+)"([^{}]*})', 
-                            r'\1"\2"\3, "\4": "", "\5": ""\6', json_str)
-            
-            # JSONの修復：不正な形式のmealオブジェクトを修正 {"meals": {"朝食": {"メニュー1", "メニュー2"}}} → {"meals": {"朝食": ["メニュー1", "メニュー2"]}}
-            json_str = re.sub(r'"(朝食|昼食|夕食)"\s*:\s*{([^{}]+)}', lambda m: f'"{m.group(1)}": [{m.group(2).replace("\"", "").replace(",", "\",\"")}]', json_str)
-            
-            # 追加の修復パターン: 値リストがない配列形式
-            json_str = re.sub(r'"(朝食|昼食|夕食)"\s*:\s*{([^{}]*)}', r'"\1": ["\2"]', json_str)
-            
-            # ヌル文字の除去
-            json_str = json_str.replace('\x00', '')
-            
-            # 追加のデバッグ情報
-            print("JSON処理後の一部:")
-            print(json_str[:500] + "..." if len(json_str) > 500 else json_str)
-            
-            # 標準のJSONパーサーでパース
-            try:
-                print("JSONパースを試みます...")
-                result = json.loads(json_str)
-                print("JSONパース成功")
-            except json.JSONDecodeError as je:
-                # エラー位置の周辺テキストを表示
-                print(f"JSON解析エラー: {str(je)}")
-                error_pos = je.pos
-                context_start = max(0, error_pos - 40)
-                context_end = min(len(json_str), error_pos + 40)
-                error_context = json_str[context_start:context_end]
-                print(f"エラー周辺: ...{error_context}...")
-                print(f"エラー位置: {'^'.rjust(min(40, error_pos - context_start) + 3)}")
-                
-                # 最終手段として日付ごとに分割処理
-                try:
-                    print("日付ごとの部分パース処理を試みます")
-                    # 結果を格納する辞書
-                    result = {}
-                    
-                    # 日付ごとのJSONブロックを抽出
-                    date_pattern = r'"(\d{4}-\d{2}-\d{2})"\s*:\s*\{([^{]*?(?:\{[^{]*?\}[^{]*?)*?)\}'
-                    date_matches = re.finditer(date_pattern, json_str)
-                    
-                    for match in date_matches:
-                        date_key = match.group(1)
-                        date_content = '{' + match.group(2) + '}'
-                        
-                        try:
-                            # 各日付ブロックを個別にパース
-                            date_obj = json.loads(date_content)
-                            result[date_key] = date_obj
-                            print(f"日付 {date_key} のパース成功")
-                        except json.JSONDecodeError:
-                            print(f"日付 {date_key} のパースに失敗")
-                            # ここでもフォールバック
-                            pass
-                    
-                    # 日付が一つも抽出できなかった場合
-                    if not result:
-                        raise ValueError("日付ごとのパースにも失敗しました")
-                
-                except Exception as parse_err:
-                    print(f"分割パース中のエラー: {str(parse_err)}")
-                    # JSON修復を試みる
-                    try:
-                        # 辞書内の配列表記の修正 ({"key": "value", "elem1", "elem2"} → {"key": "value", "items": ["elem1", "elem2"]})
-                        corrected_json = re.sub(r'("[^"]+"):\s*{("[^"]+")\s*:\s*("[^"]+")\s*,\s*("[^"]+")\s*,\s*("[^"]+")}', 
-                                            r'\1: {\2: \3, "items": [\4, \5]}', json_str)
-                        
-                        # もう一度パースを試みる
-                        try:
-                            result = json.loads(corrected_json)
-                            print("JSON修復に成功しました")
-                        except:
-                            # 修復に失敗した場合はフォールバック
-                            raise
-                    except:
-                        # バックアッププランとして、より簡易的な構造を作成
-                        print("完全なフォールバックメニューを生成します")
-                        print(f"date_infos存在確認: {date_infos is not None}")
-                        print(f"date_infos内容: {date_infos}")
-                        result = create_fallback_menu(date_infos)
-            
-            # 日付形式が正しいか確認し、必要に応じて修正
-            corrected_result = {}
-            for i, date_info in enumerate(date_infos):
-                expected_date = date_info['date']
-                # 結果に期待する日付が含まれていない場合は追加
-                if expected_date not in result:
-                    # 何らかの別の日付キーが使われている可能性があるため検索
-                    found = False
-                    for key in result.keys():
-                        if isinstance(key, str) and (key.endswith(expected_date[-5:]) or key.startswith(expected_date[:7])):
-                            corrected_result[expected_date] = result[key]
-                            found = True
-                            break
-                    # それでも見つからない場合はi番目のデータを使用（ある場合）
-                    if not found and i < len(list(result.keys())):
-                        corrected_result[expected_date] = result[list(result.keys())[i]]
-                else:
-                    corrected_result[expected_date] = result[expected_date]
-            
-            # 食材情報がない場合は空のオブジェクトを追加
-            for date_key, menu_data in corrected_result.items():
-                if "ingredients" not in menu_data:
-                    menu_data["ingredients"] = {}
-                    # メニュー項目ごとに空の食材情報を追加
-                    for meal_type, items in menu_data.get("meals", {}).items():
-                        if meal_type not in menu_data["ingredients"]:
-                            menu_data["ingredients"][meal_type] = {}
-                        # 各料理に空の食材情報を追加
-                        for item in items:
-                            if item not in menu_data["ingredients"][meal_type]:
-                                menu_data["ingredients"][meal_type][item] = {"材料情報なし": "量不明"}
-            
-            # 少なくとも1つの結果があれば修正結果を返す
-            if corrected_result:
-                return corrected_result
-            else:
-                return result  # 元の結果を返す
-            
-        except Exception as e:
-            print(f"LLMの応答解析エラー: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            
-            # フォールバック：基本的な構造のデータを返す
-            fallback_data = create_fallback_menu(date_infos)
-            return fallback_data
+        # 応答をパース（日付の並べ替えになっていない場合は従来のアルゴリズムで並び替える）
+        order, rationale = parse_reorder_response(response, list(all_meals.keys()))
+        return {date: all_meals[date] for date in order}, rationale
             
     except Exception as e:
-        print(f"LLM並び替え中の予期せぬエラー: {str(e)}")
+        logger.error("LLM並び替え中の予期せぬエラー: %s", e)
         # フォールバック: 標準的な並び替えを使用
-        if strategy == "曜日指定並び替え" and target_weekday and target_genre:
-            return reorder_by_weekday_genre(all_meals, all_nutrition, target_weekday, target_genre), "予期せぬエラーのため、従来のアルゴリズムで並び替えました。"
-        else:
-            return reorder_menu_by_strategy(all_meals, all_nutrition, strategy), "予期せぬエラーのため、従来のアルゴリズムで並び替えました。"
+        return reorder_by_algorithm("予期せぬエラーのため、従来のアルゴリズムで並び替えました。")
 
 def reorder_by_weekday_genre(all_meals, all_nutrition, target_weekday, target_genre):
     """指定した曜日と料理ジャンルに基づいてメニューを並び替える"""
-    print(f"曜日指定並び替え: {target_weekday}に{target_genre}")
+    logger.info("曜日指定並び替え: %sに%s", target_weekday, target_genre)
     
     # 日付リストと曜日の対応を作成
     dates = list(all_meals.keys())
@@ -2272,13 +2243,13 @@ def identify_weekday(date_str):
         if len(parts) == 2:
             month, day = map(int, parts)
             # 2023年と仮定（任意の年で問題ない）
-            date_obj = datetime.date(2023, month, day)
+            date_obj = datetime(2023, month, day)
             weekday = date_obj.weekday()  # 0=月曜日, 1=火曜日, ...
             weekday_names = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
             return weekday_names[weekday]
         return None
     except Exception as e:
-        print(f"曜日特定エラー: {str(e)}")
+        logger.error("曜日特定エラー: %s", e)
         return None
 
 # コマンドラインから実行する場合
@@ -2287,16 +2258,25 @@ if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(description='メニューにデザートを追加します')
     parser.add_argument('input_file', help='入力Excelファイルのパス')
-    parser.add_argument('--output_file', help='出力Excelファイルのパス（省略時は一時ファイルを作成）')
+    parser.add_argument('--output_file', help='出力Excelファイルのパス（省略時は入力ファイルと同じフォルダに作成）')
+    parser.add_argument('--open', action='store_true', help='保存後に出力ファイルを自動で開く')
     
     args = parser.parse_args()
+    if args.open:
+        os.environ[AUTO_OPEN_ENV] = '1'
     
-    update_menu_with_desserts(args.input_file, args.output_file) 
+    output_file = args.output_file
+    if output_file is None:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output_file = Path(args.input_file).with_name(f'menu_with_desserts_{timestamp}.xlsx')
+    
+    update_menu_with_desserts(args.input_file, output_file) 
 
+@traced()
 def get_nutritionist_response(prompt, message_history):
     """栄養士としての応答を生成する"""
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_model('gemini-1.5-flash')
         
         # チャット履歴を構築
         chat_history = []
@@ -2326,101 +2306,73 @@ def get_nutritionist_response(prompt, message_history):
         
         return response.text
     except Exception as e:
-        print(f"栄養士応答の生成エラー: {str(e)}")
+        logger.error("栄養士応答の生成エラー: %s", e)
         return "申し訳ありません。現在、回答の生成に問題が発生しています。しばらくしてからもう一度お試しください。"
 
-def preview_reordering(input_file: str, **params):
-    """献立の並び替えプレビューを生成する"""
+@traced()
+def preview_reordering(input_file, progress=None, **params):
+    """献立の並び替えプレビューを生成する（input_file はファイルパス・bytes・ファイルオブジェクト）"""
+    progress = as_reporter(progress)
+    progress.plan(REORDER_STAGES)
     try:
-        print(f"並び替えプレビュー生成: {input_file}")
+        logger.info("並び替えプレビュー生成: %s", describe_input(input_file))
         reorder_type = params.get("reorder_type", "栄養バランス優先並び替え")
-        print(f"並び替え戦略: {reorder_type}")
+        logger.info("並び替え戦略: %s", reorder_type)
         
         target_weekday = params.get("target_weekday")
         target_genre = params.get("target_genre")
         
         if target_weekday and target_genre:
-            print(f"ターゲット曜日: {target_weekday}, ターゲットジャンル: {target_genre}")
-        
-        # Excelファイルを読み込む
-        df_dict = pd.read_excel(input_file, sheet_name=None)
-        
-        # データ前処理
-        processed_data = process_all_sheets(df_dict)
+            logger.info("ターゲット曜日: %s, ターゲットジャンル: %s", target_weekday, target_genre)
         
-        # 全日分のメニューと栄養素データを抽出
-        all_meals = {}
-        all_nutrition = {}
-        date_columns = [col for col in processed_data.keys() if col != '項目']
-        
-        for date_col in date_columns:
-            # メニューデータの抽出と整形
-            breakfast = processed_data[date_col][1].split('\n') if processed_data[date_col][1] else []
-            lunch = processed_data[date_col][3].split('\n') if processed_data[date_col][3] else []
-            dinner = processed_data[date_col][5].split('\n') if processed_data[date_col][5] else []
-            
-            # メニューデータを辞書に格納
-            all_meals[date_col] = {
-                '朝食': [item for item in breakfast if item.strip()],
-                '昼食': [item for item in lunch if item.strip()],
-                '夕食': [item for item in dinner if item.strip()]
-            }
-            
-            # 栄養データの解析
-            nutrition_text = processed_data[date_col][0]
-            nutrition_dict = {}
-            
-            if nutrition_text:
-                try:
-                    import re
-                    pattern = r'([^:]+):\s*(\d+(?:\.\d+)?)\s*(\w*)'
-                    matches = re.findall(pattern, nutrition_text)
-                    
-                    for nutrient, value, unit in matches:
-                        nutrient = nutrient.strip()
-                        nutrition_dict[nutrient] = float(value)
-                except Exception as e:
-                    print(f"栄養データ解析エラー: {str(e)}")
-                    nutrition_dict = {}
-            
-            all_nutrition[date_col] = nutrition_dict
+        # 献立と栄養価を抽出（同じワークブックはキャッシュを再利用）
+        _, book, all_meals, all_nutrition = extract_menu_and_nutrition(input_file, progress=progress)
         
         # LLMを使用した並び替え - 理由も取得
+        progress.start('並び替え', message=reorder_type)
         optimized_menu_order, reorder_rationale = reorder_with_llm(all_meals, all_nutrition, reorder_type, target_weekday, target_genre)
+        progress.start('出力')
         
         # 新しい日付の順序に基づいて出力データを再構成
-        reordered_data = {'項目': processed_data['項目']}
-        
-        # 日付順の変更を反映
-        for original_date, new_meals in optimized_menu_order.items():
-            # 元の日付で対応するデータをコピー
-            reordered_data[original_date] = processed_data[original_date]
+        reordered_data = book.reordered(list(optimized_menu_order.keys())).to_combined_data()
         
         # DataFrameに変換
         result_df = pd.DataFrame(reordered_data)
         
         # 詳細なメニュー情報と並び替え理由も返す
+        progress.finish()
         return result_df, optimized_menu_order, reorder_rationale
         
     except Exception as e:
-        print(f"プレビュー生成エラー: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("プレビュー生成エラー: %s", e)
         raise e
 
 # 新しく追加する一週間献立生成関数
-def generate_weekly_menu(days, params):
+@traced()
+def generate_weekly_menu(days, params, progress=None):
     """
     LLMを活用して一週間の献立を生成する関数
     
     Args:
         days (int): 何日分の献立を生成するか
         params (dict): 生成パラメータ（好み、予算など）
+        progress (optional): 進捗の通知先（ProgressReporter または ProgressEvent を受け取る関数）
         
     Returns:
         dict: 日付をキーとした献立情報
     """
+    progress = as_reporter(progress)
+    progress.plan(WEEKLY_MENU_STAGES)
+    set_attributes(days=days)
+    try:
+        return _generate_weekly_menu(days, params, progress)
+    finally:
+        progress.finish()
+
+def _generate_weekly_menu(days, params, progress):
+    """generate_weekly_menu の本体（準備・献立生成・応答解析の段階を progress に通知する）"""
     try:
+        progress.start('準備')
         # APIキーの確認
         if not GOOGLE_API_KEY:
             raise ValueError("Google API Keyが設定されていません。")
@@ -2467,6 +2419,9 @@ def generate_weekly_menu(days, params):
         formatted_dates = ', '.join([d['date'] for d in date_infos])
         formatted_displays = ', '.join([f"{d['display']}（{d['weekday']}）" for d in date_infos])
         
+        # 開始日より前に提供した献立（同じ料理を繰り返さないようにプロンプトに含める）
+        recent_history = format_menu_history(days_before(start_date, HISTORY_LOOKBACK_DAYS))
+        
         # LLMプロンプトの簡素化 - 入れ子の深さによるエラーを回避
         prompt_header = f"""
         あなたはシルバー向け給食を専門とするプロの栄養士です。以下の条件に基づいて、{days}日分の献立を作成してください。
@@ -2482,6 +2437,9 @@ def generate_weekly_menu(days, params):
         【日程】
         {formatted_displays}
         
+        【直前に提供した献立（開始日より前の{HISTORY_LOOKBACK_DAYS}日間。同じ料理を繰り返さないでください）】
+        {recent_history}
+        
         【重要な指示】
         - 各日のメニューは必ず異なる料理にしてください。同じ日のメニューを別の日に使いまわさないでください。
         - 曜日ごとに異なる特徴を持たせてください（例：月曜日は和食、水曜日は魚料理が中心など）
@@ -2556,7 +2514,7 @@ def generate_weekly_menu(days, params):
         - 添付したサンプルと同じ正確なJSON形式で出力してください
         - meals部分は必ず配列（"朝食": ["メニュー1", "メニュー2", ...] ）の形式で記述してください
         - ingredients部分は二重の辞書構造になるようにしてください
-        - 正しくない例: "昼食": {"ご飯": "チキンカツ", "ポテトサラダ", "キャベツの浅漬け"}
+        - 正しくない例: "昼食": {{"ご飯": "チキンカツ", "ポテトサラダ", "キャベツの浅漬け"}}
         - 正しい例: "昼食": ["ご飯", "チキンカツ", "ポテトサラダ", "キャベツの浅漬け"]
         - 各日付には必ず異なるメニューを用意してください。同じメニューを別の日にコピー&ペーストしないでください。
         - すべての日付で献立の内容を変えてください。週を通して各日のメニューに多様性を持たせてください。
@@ -2569,200 +2527,38 @@ def generate_weekly_menu(days, params):
         complete_prompt = prompt_header + prompt_format + sample_json + prompt_footer
         
         # デバッグ出力を追加
-        print("=== LLM呼び出し開始 ===")
-        print(f"APIキー: {GOOGLE_API_KEY[:4]}...{GOOGLE_API_KEY[-4:] if len(GOOGLE_API_KEY) > 8 else '***'}")
-        print(f"対象日数: {days}日分")
-        print(f"開始日: {start_date}")
+        logger.info("=== LLM呼び出し開始 ===")
+        logger.debug("APIキー: %s...%s", GOOGLE_API_KEY[:4], GOOGLE_API_KEY[-4:] if len(GOOGLE_API_KEY) > 8 else '***')
+        logger.info("対象日数: %s日分", days)
+        logger.info("開始日: %s", start_date)
         
         # LLMでの処理
         try:
-            print("Geminiモデルを初期化します...")
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            print("Geminiモデルへのリクエストを実行します...")
-            response = model.generate_content(complete_prompt)
-            print("Geminiモデルからの応答を受信しました")
+            progress.start('献立生成', message=f"{days}日分")
+            logger.debug("Geminiモデルを初期化します...")
+            model = get_model('gemini-1.5-flash')
+            logger.debug("Geminiモデルへのリクエストを実行します...")
+            response = generate_content(model, complete_prompt)
+            logger.debug("Geminiモデルからの応答を受信しました")
         except Exception as llm_error:
-            print(f"LLM呼び出しエラー: {str(llm_error)}")
-            print("フォールバックメニューを使用します")
+            logger.error("LLM呼び出しエラー: %s", llm_error)
+            logger.warning("フォールバックメニューを使用します")
             return create_fallback_menu(date_infos)
         
         # 応答をパース
-        try:
-            response_text = response.text
-            
-            # デバッグ出力
-            print("LLM応答テキスト:")
-            print(response_text[:200] + "..." if len(response_text) > 200 else response_text)
-            
-            # JSON部分を抽出（マークダウンコードブロックが含まれる可能性がある）
-            import re
-            json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', response_text)
-            if json_match:
-                json_str = json_match.group(1)
-                print("JSONブロックを抽出しました")
-            else:
-                # コードブロックがない場合は、可能な限りJSONと思われる部分を抽出
-                print("JSONブロックが見つかりません。全テキストから抽出を試みます。")
-                # 波括弧の最初と最後を探す
-                first_brace = response_text.find('{')
-                last_brace = response_text.rfind('}')
-                if first_brace != -1 and last_brace != -1 and first_brace < last_brace:
-                    json_str = response_text[first_brace:last_brace+1]
-                    print(f"JSON部分を抽出しました: {first_brace}〜{last_brace}")
-                else:
-                    json_str = response_text
-                    print("JSON構造が見つかりませんでした。全テキストを使用します。")
-            
-            # JSONを整形する前処理
-            # コメントの削除
-            json_str = re.sub(r'//.*?\n', '\n', json_str)
-            json_str = re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
-            
-            # 末尾のカンマを削除（JSON配列や辞書の最後の要素の後のカンマ）
-            json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
-            
-            # プロパティ名の引用符がない場合に追加
-            json_str = re.sub(r'(\s*)([a-zA-Z0-9_]+)(\s*):(\s*)', r'\1"\2"\3:\4', json_str)
-            
-            # テンプレート文字列を実際の値に置換（{{...}} を解決）
-            json_str = re.sub(r'{{([^}]+)}}', r'{\1}', json_str)
-
-            # 不正な形式の配列を修正 ({"key": value, item1, item2} → {"key": value, "items": [item1, item2]})
-            json_str = re.sub(r'({[^{}]*)"([^"]+)"(\s*:\s*{[^{}]*}),\s*"([^"]+)",\s*"([^"]+)"([^{}]*})', 
-                            r'\1"\2"\3, "\4": "", "\5": ""\6', json_str)
-            
-            # JSONの修復：不正な形式のmealオブジェクトを修正 {"meals": {"朝食": {"メニュー1", "メニュー2"}}} → {"meals": {"朝食": ["メニュー1", "メニュー2"]}}
-            json_str = re.sub(r'"(朝食|昼食|夕食)"\s*:\s*{([^{}]+)}', lambda m: f'"{m.group(1)}": [{m.group(2).replace("\"", "").replace(",", "\",\"")}]', json_str)
-            
-            # 追加の修復パターン: 値リストがない配列形式
-            json_str = re.sub(r'"(朝食|昼食|夕食)"\s*:\s*{([^{}]*)}', r'"\1": ["\2"]', json_str)
-            
-            # ヌル文字の除去
-            json_str = json_str.replace('\x00', '')
-            
-            # 追加のデバッグ情報
-            print("JSON処理後の一部:")
-            print(json_str[:500] + "..." if len(json_str) > 500 else json_str)
-            
-            # 標準のJSONパーサーでパース
-            try:
-                print("JSONパースを試みます...")
-                result = json.loads(json_str)
-                print("JSONパース成功")
-            except json.JSONDecodeError as je:
-                # エラー位置の周辺テキストを表示
-                print(f"JSON解析エラー: {str(je)}")
-                error_pos = je.pos
-                context_start = max(0, error_pos - 40)
-                context_end = min(len(json_str), error_pos + 40)
-                error_context = json_str[context_start:context_end]
-                print(f"エラー周辺: ...{error_context}...")
-                print(f"エラー位置: {'^'.rjust(min(40, error_pos - context_start) + 3)}")
-                
-                # 最終手段として日付ごとに分割処理
-                try:
-                    print("日付ごとの部分パース処理を試みます")
-                    # 結果を格納する辞書
-                    result = {}
-                    
-                    # 日付ごとのJSONブロックを抽出
-                    date_pattern = r'"(\d{4}-\d{2}-\d{2})"\s*:\s*\{([^{]*?(?:\{[^{]*?\}[^{]*?)*?)\}'
-                    date_matches = re.finditer(date_pattern, json_str)
-                    
-                    for match in date_matches:
-                        date_key = match.group(1)
-                        date_content = '{' + match.group(2) + '}'
-                        
-                        try:
-                            # 各日付ブロックを個別にパース
-                            date_obj = json.loads(date_content)
-                            result[date_key] = date_obj
-                            print(f"日付 {date_key} のパース成功")
-                        except json.JSONDecodeError:
-                            print(f"日付 {date_key} のパースに失敗")
-                            # ここでもフォールバック
-                            pass
-                    
-                    # 日付が一つも抽出できなかった場合
-                    if not result:
-                        raise ValueError("日付ごとのパースにも失敗しました")
-                
-                except Exception as parse_err:
-                    print(f"分割パース中のエラー: {str(parse_err)}")
-                    # JSON修復を試みる
-                    try:
-                        # 辞書内の配列表記の修正 ({"key": "value", "elem1", "elem2"} → {"key": "value", "items": ["elem1", "elem2"]})
-                        corrected_json = re.sub(r'("[^"]+"):\s*{("[^"]+")\s*:\s*("[^"]+")\s*,\s*("[^"]+")\s*,\s*("[^"]+")}', 
-                                            r'\1: {\2: \3, "items": [\4, \5]}', json_str)
-                        
-                        # もう一度パースを試みる
-                        try:
-                            result = json.loads(corrected_json)
-                            print("JSON修復に成功しました")
-                        except:
-                            # 修復に失敗した場合はフォールバック
-                            raise
-                    except:
-                        # バックアッププランとして、より簡易的な構造を作成
-                        print("完全なフォールバックメニューを生成します")
-                        print(f"date_infos存在確認: {date_infos is not None}")
-                        print(f"date_infos内容: {date_infos}")
-                        result = create_fallback_menu(date_infos)
-            
-            # 日付形式が正しいか確認し、必要に応じて修正
-            corrected_result = {}
-            for i, date_info in enumerate(date_infos):
-                expected_date = date_info['date']
-                # 結果に期待する日付が含まれていない場合は追加
-                if expected_date not in result:
-                    # 何らかの別の日付キーが使われている可能性があるため検索
-                    found = False
-                    for key in result.keys():
-                        if isinstance(key, str) and (key.endswith(expected_date[-5:]) or key.startswith(expected_date[:7])):
-                            corrected_result[expected_date] = result[key]
-                            found = True
-                            break
-                    # それでも見つからない場合はi番目のデータを使用（ある場合）
-                    if not found and i < len(list(result.keys())):
-                        corrected_result[expected_date] = result[list(result.keys())[i]]
-                else:
-                    corrected_result[expected_date] = result[expected_date]
-            
-            # 食材情報がない場合は空のオブジェクトを追加
-            for date_key, menu_data in corrected_result.items():
-                if "ingredients" not in menu_data:
-                    menu_data["ingredients"] = {}
-                    # メニュー項目ごとに空の食材情報を追加
-                    for meal_type, items in menu_data.get("meals", {}).items():
-                        if meal_type not in menu_data["ingredients"]:
-                            menu_data["ingredients"][meal_type] = {}
-                        # 各料理に空の食材情報を追加
-                        for item in items:
-                            if item not in menu_data["ingredients"][meal_type]:
-                                menu_data["ingredients"][meal_type][item] = {"材料情報なし": "量不明"}
-            
-            # 少なくとも1つの結果があれば修正結果を返す
-            if corrected_result:
-                return corrected_result
-            else:
-                return result  # 元の結果を返す
-            
-        except Exception as e:
-            print(f"LLMの応答解析エラー: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            
-            # フォールバック：基本的な構造のデータを返す
-            fallback_data = create_fallback_menu(date_infos)
-            return fallback_data
+        progress.start('応答解析')
+        weekly_menu = parse_menu_response(response, date_infos)
+        
+        # 献立の履歴に保存（フォールバックの献立は保存しない）
+        with span('履歴保存', days=len(weekly_menu)):
+            record_weekly_menu(weekly_menu)
+        return weekly_menu
             
     except Exception as e:
-        print(f"献立生成中のエラー: {str(e)}")
-        print(f"date_infos変数の存在: {locals().get('date_infos') is not None}")
+        logger.exception("献立生成中のエラー: %s", e)
+        logger.debug("date_infos変数の存在: %s", locals().get('date_infos') is not None)
         if 'date_infos' in locals():
-            print(f"date_infos内容: {locals()['date_infos']}")
-        import traceback
-        traceback.print_exc()
+            logger.debug("date_infos内容: %s", locals()['date_infos'])
         
         # エラーが発生した場合でもデフォルトのデータを返す
         if 'date_infos' in locals() and locals()['date_infos']:
@@ -2775,9 +2571,188 @@ def generate_weekly_menu(days, params):
             ]
             return create_fallback_menu(default_dates)
 
+@traced('JSON解析')
+def parse_menu_response(response, date_infos):
+    """
+    LLMの献立の応答（JSON）を解析し、日付をキーとした献立情報にする
+
+    コードブロックの抽出・JSONの修復・日付ごとの部分パースを順に試し、解析できない場合は
+    フォールバックメニューを返す（どこまで修復したかはスパンの json_repair 属性に記録する）。
+    """
+    try:
+        response_text = response.text
+        set_attributes(response_chars=len(response_text), json_repair='none')
+        
+        # デバッグ出力
+        logger.debug("LLM応答テキスト:\n%s", response_text[:200] + "..." if len(response_text) > 200 else response_text)
+        
+        # JSON部分を抽出（マークダウンコードブロックが含まれる可能性がある）
+        import re
+        json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', response_text)
+        if json_match:
+            json_str = json_match.group(1)
+            logger.debug("JSONブロックを抽出しました")
+        else:
+            # コードブロックがない場合は、可能な限りJSONと思われる部分を抽出
+            logger.debug("JSONブロックが見つかりません。全テキストから抽出を試みます。")
+            # 波括弧の最初と最後を探す
+            first_brace = response_text.find('{')
+            last_brace = response_text.rfind('}')
+            if first_brace != -1 and last_brace != -1 and first_brace < last_brace:
+                json_str = response_text[first_brace:last_brace+1]
+                logger.debug("JSON部分を抽出しました: %s〜%s", first_brace, last_brace)
+            else:
+                json_str = response_text
+                logger.debug("JSON構造が見つかりませんでした。全テキストを使用します。")
+        
+        # JSONを整形する前処理
+        # コメントの削除
+        json_str = re.sub(r'//.*?\n', '\n', json_str)
+        json_str = re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
+        
+        # 末尾のカンマを削除（JSON配列や辞書の最後の要素の後のカンマ）
+        json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
+        
+        # プロパティ名の引用符がない場合に追加
+        json_str = re.sub(r'(\s*)([a-zA-Z0-9_]+)(\s*):(\s*)', r'\1"\2"\3:\4', json_str)
+        
+        # テンプレート文字列を実際の値に置換（{{...}} を解決）
+        json_str = re.sub(r'{{([^}]+)}}', r'{\1}', json_str)
+
+        # 不正な形式の配列を修正 ({"key": value, item1, item2} → {"key": value, "items": [item1, item2]})
+        json_str = re.sub(r'({[^{}]*)"([^"]+)"(\s*:\s*{[^{}]*}),\s*"([^"]+)",\s*"([^"]+)"([^{}]*})', 
+                        r'\1"\2"\3, "\4": "", "\5": ""\6', json_str)
+        
+        # JSONの修復：不正な形式のmealオブジェクトを修正 {"meals": {"朝食": {"メニュー1", "メニュー2"}}} → {"meals": {"朝食": ["メニュー1", "メニュー2"]}}
+        json_str = re.sub(r'"(朝食|昼食|夕食)"\s*:\s*{([^{}]+)}', lambda m: f'"{m.group(1)}": [{m.group(2).replace("\"", "").replace(",", "\",\"")}]', json_str)
+        
+        # 追加の修復パターン: 値リストがない配列形式
+        json_str = re.sub(r'"(朝食|昼食|夕食)"\s*:\s*{([^{}]*)}', r'"\1": ["\2"]', json_str)
+        
+        # ヌル文字の除去
+        json_str = json_str.replace('\x00', '')
+        
+        # 追加のデバッグ情報
+        logger.debug("JSON処理後の一部:\n%s", json_str[:500] + "..." if len(json_str) > 500 else json_str)
+        
+        # 標準のJSONパーサーでパース
+        try:
+            logger.debug("JSONパースを試みます...")
+            result = json.loads(json_str)
+            logger.debug("JSONパース成功")
+        except json.JSONDecodeError as je:
+            # エラー位置の周辺テキストを表示
+            logger.error("JSON解析エラー: %s", je)
+            error_pos = je.pos
+            context_start = max(0, error_pos - 40)
+            context_end = min(len(json_str), error_pos + 40)
+            error_context = json_str[context_start:context_end]
+            logger.debug("エラー周辺: ...%s...", error_context)
+            logger.debug("エラー位置: %s", '^'.rjust(min(40, error_pos - context_start) + 3))
+            
+            # 最終手段として日付ごとに分割処理
+            try:
+                logger.info("日付ごとの部分パース処理を試みます")
+                set_attributes(json_repair='per_date')
+                # 結果を格納する辞書
+                result = {}
+                
+                # 日付ごとのJSONブロックを抽出
+                date_pattern = r'"(\d{4}-\d{2}-\d{2})"\s*:\s*\{([^{]*?(?:\{[^{]*?\}[^{]*?)*?)\}'
+                date_matches = re.finditer(date_pattern, json_str)
+                
+                for match in date_matches:
+                    date_key = match.group(1)
+                    date_content = '{' + match.group(2) + '}'
+                    
+                    try:
+                        # 各日付ブロックを個別にパース
+                        date_obj = json.loads(date_content)
+                        result[date_key] = date_obj
+                        logger.info("日付 %s のパース成功", date_key)
+                    except json.JSONDecodeError:
+                        logger.warning("日付 %s のパースに失敗", date_key)
+                        # ここでもフォールバック
+                        pass
+                
+                # 日付が一つも抽出できなかった場合
+                if not result:
+                    raise ValueError("日付ごとのパースにも失敗しました")
+            
+            except Exception as parse_err:
+                logger.error("分割パース中のエラー: %s", parse_err)
+                # JSON修復を試みる
+                try:
+                    # 辞書内の配列表記の修正 ({"key": "value", "elem1", "elem2"} → {"key": "value", "items": ["elem1", "elem2"]})
+                    corrected_json = re.sub(r'("[^"]+"):\s*{("[^"]+")\s*:\s*("[^"]+")\s*,\s*("[^"]+")\s*,\s*("[^"]+")}', 
+                                        r'\1: {\2: \3, "items": [\4, \5]}', json_str)
+                    
+                    # もう一度パースを試みる
+                    try:
+                        result = json.loads(corrected_json)
+                        logger.info("JSON修復に成功しました")
+                        set_attributes(json_repair='corrected')
+                    except:
+                        # 修復に失敗した場合はフォールバック
+                        raise
+                except:
+                    # バックアッププランとして、より簡易的な構造を作成
+                    logger.warning("完全なフォールバックメニューを生成します")
+                    set_attributes(json_repair='fallback')
+                    logger.debug("date_infos存在確認: %s", date_infos is not None)
+                    logger.debug("date_infos内容: %s", date_infos)
+                    result = create_fallback_menu(date_infos)
+        
+        # 日付形式が正しいか確認し、必要に応じて修正
+        corrected_result = {}
+        for i, date_info in enumerate(date_infos):
+            expected_date = date_info['date']
+            # 結果に期待する日付が含まれていない場合は追加
+            if expected_date not in result:
+                # 何らかの別の日付キーが使われている可能性があるため検索
+                found = False
+                for key in result.keys():
+                    if isinstance(key, str) and (key.endswith(expected_date[-5:]) or key.startswith(expected_date[:7])):
+                        corrected_result[expected_date] = result[key]
+                        found = True
+                        break
+                # それでも見つからない場合はi番目のデータを使用（ある場合）
+                if not found and i < len(list(result.keys())):
+                    corrected_result[expected_date] = result[list(result.keys())[i]]
+            else:
+                corrected_result[expected_date] = result[expected_date]
+        
+        # 食材情報がない場合は空のオブジェクトを追加
+        for date_key, menu_data in corrected_result.items():
+            if "ingredients" not in menu_data:
+                menu_data["ingredients"] = {}
+                # メニュー項目ごとに空の食材情報を追加
+                for meal_type, items in menu_data.get("meals", {}).items():
+                    if meal_type not in menu_data["ingredients"]:
+                        menu_data["ingredients"][meal_type] = {}
+                    # 各料理に空の食材情報を追加
+                    for item in items:
+                        if item not in menu_data["ingredients"][meal_type]:
+                            menu_data["ingredients"][meal_type][item] = {"材料情報なし": "量不明"}
+        
+        # 少なくとも1つの結果があれば修正結果を返す
+        if corrected_result:
+            return corrected_result
+        else:
+            return result  # 元の結果を返す
+        
+    except Exception as e:
+        logger.exception("LLMの応答解析エラー: %s", e)
+        set_attributes(json_repair='fallback')
+        
+        # フォールバック：基本的な構造のデータを返す
+        fallback_data = create_fallback_menu(date_infos)
+        return fallback_data
+
 # フォールバックメニュー作成関数（コードの分割）
 def create_fallback_menu(date_infos):
     """エラー時のフォールバックメニューを生成する関数"""
+    FALLBACKS.inc(kind='fallback_menu')
     fallback_data = {}
     
     # 曜日に応じたメニューバリエーション
@@ -2860,340 +2835,347 @@ def create_fallback_menu(date_infos):
                 "脂質": "50g",
                 "炭水化物": "240g",
                 "塩分": "7.5g"
-            }
+            },
+            # 献立の履歴に保存しない目印
+            "fallback": True
         }
     
     return fallback_data
 
 # 献立並び替え関数の追加（未定義エラーを解消）
-def reorder_menu_by_strategy(menu_data, strategy):
+def reorder_menu_by_strategy(menu_data, nutrition_data, strategy, history=None):
     """
     献立を指定された戦略に基づいて並び替える関数
     
     Args:
         menu_data (dict): 献立データ
+        nutrition_data (dict): 日付ごとの栄養価
         strategy (str): 並び替え戦略
+        history (dict, optional): 最初の日より前に提供した献立（history.days_before の結果）
         
     Returns:
         dict: 並び替え後の献立データ
     """
-    # 戦略に基づいた並び替えロジックを実装
-    # （今回は仮実装としてオリジナルを返す）
-    return menu_data
+    # どの戦略も栄養バランスと料理系統の多様性のスコアで並び替える
+    logger.info("アルゴリズムで並び替えます: %s", strategy)
+    optimized = optimize_menu_order(menu_data, nutrition_data, history)
+    # optimize_menu_order は日付の位置ごとに献立を入れ替えるため、元の日付の並び順にする
+    source_dates = {id(meals): date for date, meals in menu_data.items()}
+    return {source_dates[id(meals)]: meals for meals in optimized.values()}
+
+def write_procurement_totals(writer, totals, sheet_name="発注合計"):
+    """
+    納品期間・発注先ごとの発注合計をシートに書き込む
 
-def create_order_sheets(input_file, output_file, person_count=45, destination="宝成"):
+    Args:
+        writer: pd.ExcelWriter（openpyxl）
+        totals (pd.DataFrame): aggregate_procurement の結果
+        sheet_name (str): シート名
     """
-    献立表から発注書を作成する関数
-    
+    from openpyxl.styles import Font, Alignment
+
+    rows = []
+    for (window, supplier), group in totals.groupby(['window', 'supplier'], sort=False):
+        for record in group.itertuples(index=False):
+            rows.append([window, supplier, record.name, format_quantity(record.quantity, record.unit),
+                         record.days, record.unparsed])
+        rows.append(['', f"{supplier or '発注先未設定'} 小計", f"{len(group)}品目", '', '', ''])
+
+    headers = ['納品期間', '発注先', '食品名', '合計量', '使用日数', '備考']
+    pd.DataFrame(rows, columns=headers).to_excel(writer, sheet_name=sheet_name, index=False)
+
+    worksheet = writer.sheets[sheet_name]
+    for col, width in zip('ABCDEF', [22, 20, 20, 12, 10, 30]):
+        worksheet.column_dimensions[col].width = width
+    for cell in worksheet[1]:
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal='center')
+
+
+@traced('Excel読み込み')
+def read_order_ingredients(input_file):
+    """
+    献立表を読み込み、発注対象の食材を抽出する
+
     Args:
-        input_file (str): 入力ファイルのパス
-        output_file (str): 出力ファイルのパス
-        person_count (int): 発注する人数
-        destination (str): 発注書の送り先（宝成または豊中）
-        
+        input_file: 入力ファイルのパス、またはbytes・ファイルオブジェクト
+
     Returns:
-        str: 作成された発注書のファイルパス、失敗した場合はNone
+        Tuple[list, pd.DataFrame]: 日付列のリストと extract_order_ingredients の結果
     """
-    try:
-        print(f"発注書作成開始: 入力={input_file}, 出力={output_file}")
-        
-        # Excelファイルの読み込み
-        menu_df = pd.read_excel(input_file)
-        print(f"Excelファイル読み込み完了: {len(menu_df)}行")
-        
-        # データフレームの列情報を出力
-        print(f"列一覧: {menu_df.columns.tolist()}")
-        
-        # 最初の列をアイテム列として使用
-        item_col = menu_df.columns[0]
-        print(f"アイテム列: {item_col}")
-        
-        # 日付列の特定（最初の列を除く全列）
-        date_columns = [col for col in menu_df.columns if col != item_col]
-        print(f"日付列: {date_columns}")
-        
-        # 各日付ごとの食材リスト
-        all_ingredients_by_date = {}
-        
-        # 食材以外の項目を除外するキーワードリスト
-        exclude_keywords = [
-            'エネルギー', 'タンパク質', '脂質', '炭水化物', 'カルシウム', '鉄分', '食物繊維',
-            '栄養価', '栄養素', 'kcal', 'mg', '栄養価合計', '1日の栄養'
-        ]
-        
-        # 調味料リスト - これらは発注書から除外
-        seasonings = [
-            '砂糖', '三温糖', '上白糖', '黒砂糖', 'グラニュー糖', 'きび砂糖', '塩', '塩分', '食塩', '岩塩',
-            '醤油', 'しょうゆ', '薄口醤油', '濃口醤油', 'だし', '出汁', 'だし汁', '和風だし', '昆布だし',
-            '鰹だし', 'めんつゆ', 'みりん', '料理酒', '酒', '味噌', 'みそ', '赤みそ', '白みそ', 'レモン汁',
-            'レモン果汁', '油', 'サラダ油', 'オリーブオイル', 'ごま油', 'マヨネーズ', 'ケチャップ', '酢',
-            '米酢', '穀物酢', 'バルサミコ酢', 'ソース', 'ウスターソース', '中濃ソース', 'カレー粉',
-            'カレールウ', '胡椒', 'こしょう', 'コショウ', '七味唐辛子', '一味唐辛子', 'わさび', '山葵',
-            'からし', '辛子', '柚子胡椒', '柚子こしょう', 'にんにく', 'ニンニク', 'しょうが', '生姜',
-            'バター', 'マーガリン', '顆粒だし', '中華だし', '鶏がらスープ', '味の素', 'アミノ酸',
-            'コンソメ', '固形スープ', 'ブイヨン', '調味料', 'スパイス', 'ハーブ', 'タレ', 'たれ',
-            'カラースプレー', '適量'
-        ]
-        
-        # 食材かどうかを判定する関数
-        def is_food_item(item_name, amount):
-            # 項目名が文字列でない場合はFalse
-            if not isinstance(item_name, str):
-                return False
-                
-            # 除外キーワードを含む場合はFalse
-            for keyword in exclude_keywords:
-                if keyword in item_name:
-                    return False
-            
-            # 調味料リストに含まれる場合はFalse
-            for seasoning in seasonings:
-                if seasoning in item_name:
-                    return False
-            
-            # 単位がgやkg、個などが含まれていたり、数値を含む場合はTrue
-            if isinstance(amount, str):
-                has_unit = any(unit in amount for unit in ['g', 'kg', '個', 'ml', 'L', 'cc', '本', '枚', '袋'])
-                has_number = any(char.isdigit() for char in amount)
-                return has_unit or has_number
-            elif isinstance(amount, (int, float)):
-                # 数値そのものの場合もTrue
-                return True
-            
-            return False
-        
-        # 数量の小数点以下を切り捨てる関数
-        def truncate_decimal(amount_str):
-            if not isinstance(amount_str, str):
-                return str(amount_str)
-                
-            import re
-            match = re.search(r'([\d.]+)([^0-9.]*)', amount_str)
-            if match:
-                number_part = match.group(1)
-                unit_part = match.group(2)
-                if '.' in number_part:
-                    integer_part = number_part.split('.')[0]
-                    return f"{integer_part}{unit_part}"
-            return amount_str
-        
-        # 日付列ごとに食材を抽出
-        for date_col in date_columns:
-            print(f"処理中の日付: {date_col}")
-            ingredients_list = []
+    # Excelファイルの読み込み
+    menu_df = pd.read_excel(as_excel_source(input_file))
+    logger.info("Excelファイル読み込み完了: %s行", len(menu_df))
+    
+    # データフレームの列情報を出力
+    logger.debug("列一覧: %s", menu_df.columns.tolist())
+    
+    # 最初の列をアイテム列として使用
+    item_col = menu_df.columns[0]
+    logger.debug("アイテム列: %s", item_col)
+    
+    # 日付列の特定（最初の列を除く全列）
+    date_columns = [col for col in menu_df.columns if col != item_col]
+    logger.debug("日付列: %s", date_columns)
+    
+    # 食材を列単位でまとめて抽出
+    ingredients = extract_order_ingredients(menu_df)
+    return date_columns, ingredients
+
+
+def write_order_workbook(output_file, date_columns, ingredients, person_count=45, destination="宝成",
+                         window_days=2, cutoff_dates=None, supplier_rules=None, supplier_config=None):
+    """
+    抽出済みの食材から発注書のExcelを書き出す（引数は create_order_sheets と同じ）
+
+    Args:
+        output_file: 出力ファイルのパスまたはBytesIO
+        date_columns (list): 献立表の日付列
+        ingredients (pd.DataFrame): read_order_ingredients で抽出した食材（変更しない）
+        supplier_config (dict, optional): load_supplier_config の結果（省略時は読み込む）
+    """
+    if supplier_config is None:
+        supplier_config = get_supplier_config()
+    if supplier_rules is None:
+        supplier_rules = supplier_config['rules']
+
+    # 1人分の量に発注人数を掛ける（献立表の総量は作成時の人数のため使わない）
+    ingredients = ingredients.assign(amount=order_amounts(ingredients, person_count))
+    all_ingredients_by_date = ingredients_by_date(ingredients)
+    for date_col in date_columns:
+        food_count = len(all_ingredients_by_date.get(date_col, []))
+        if food_count:
+            logger.debug("日付 %s の食材数: %s", date_col, food_count)
+        else:
+            logger.debug("日付 %s の食材は見つかりませんでした", date_col)
+    
+    # 日付を2日ごとにグループ化
+    date_pairs = []
+    for i in range(0, len(date_columns), 2):
+        if i + 1 < len(date_columns):
+            date_pairs.append((date_columns[i], date_columns[i+1]))
+        else:
+            date_pairs.append((date_columns[i], None))
+    
+    # 送り先に応じたヘッダーテキストを設定
+    header_text = supplier_config['headers'].get(destination, "")
+    
+    logger.info("食材データ抽出完了。発注書作成開始...")
+    
+    # 出力用のExcelファイルを作成
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        for pair_idx, (date1, date2) in enumerate(date_pairs):
+            # シート名の設定
+            sheet_name = f"発注書_{pair_idx+1}"
+            
+            # 発注書データの作成（食材数が多い日は行数を増やす）
+            row_count = max(100, 4 + max(len(all_ingredients_by_date.get(date1, [])),
+                                         len(all_ingredients_by_date.get(date2, [])) if date2 else 0))
+            order_data = {
+                'A': [''] * row_count,
+                'B': [''] * row_count,
+                'C': [''] * row_count,
+                'D': [''] * row_count,
+                'E': [''] * row_count
+            }
             
-            # 各行を処理
-            for i in range(len(menu_df)):
-                # 項目名と内容を取得（NaNや欠損値対策）
-                try:
-                    dish_name = menu_df.iloc[i][item_col]
-                    # セルの内容がNaNの場合は空文字に変換
-                    if pd.isna(dish_name):
-                        dish_name = ""
-                except:
-                    dish_name = ""
+            # ヘッダー部分の設定
+            order_data['C'][0] = header_text
+            order_data['B'][1] = '発注書'
+            
+            # 食品名と使用量のヘッダー
+            order_data['A'][3] = '食品名'
+            # 日付列のフォーマット (安全に str() 変換)
+            date1_str = str(date1)
+            order_data['B'][3] = f'{date1_str}使用分'
+            
+            if date2:
+                date2_str = str(date2)
+                order_data['C'][3] = ''
+                order_data['D'][3] = '食品名'
+                order_data['E'][3] = f'{date2_str}使用分'
+            
+            # 1日目の食材を追加
+            food_items1 = all_ingredients_by_date.get(date1, [])
+            for i, (name, amount) in enumerate(food_items1):
+                row_idx = i + 4  # ヘッダー行の後ろから開始
+                order_data['A'][row_idx] = name
                 
-                try:
-                    cell_content = menu_df.iloc[i][date_col]
-                    # セルの内容がNaNの場合は空文字に変換
-                    if pd.isna(cell_content):
-                        cell_content = ""
-                except:
-                    cell_content = ""
-                
-                # 有効なセル内容のみ処理
-                if dish_name and cell_content:
-                    # 数値を文字列に変換
-                    dish_name_str = str(dish_name)
-                    cell_content_str = str(cell_content)
-                    
-                    # 1日の栄養価合計などの行は除外
-                    if any(keyword in dish_name_str for keyword in exclude_keywords):
-                        continue
-                    
-                    # 改行で分割できる場合は複数行データとして処理
-                    if "\n" in cell_content_str:
-                        # 行に分割
-                        lines = cell_content_str.split('\n')
-                        for line in lines:
-                            # 各行を処理
-                            line = line.strip()
-                            # 箇条書き形式の行を処理
-                            if line.startswith("- "):
-                                # 「- 食材名: 量」の形式を解析
-                                parts = line[2:].split(":", 1)
-                                if len(parts) == 2:
-                                    food_name = parts[0].strip()
-                                    amount = parts[1].strip()
-                                    
-                                    # 食材として有効か確認
-                                    if is_food_item(food_name, amount):
-                                        # 小数点以下を切り捨て
-                                        if '/' in amount:
-                                            parts = amount.split('/')
-                                            truncated_amount = '/'.join([truncate_decimal(p) for p in parts])
-                                        else:
-                                            truncated_amount = truncate_decimal(amount)
-                                        
-                                        ingredients_list.append((food_name, truncated_amount))
-                    # コロン区切りのデータを処理
-                    elif ":" in cell_content_str or "：" in cell_content_str:
-                        # コロンで区切る（全角コロンも対応）
-                        parts = cell_content_str.replace("：", ":").split(":", 1)
-                        if len(parts) == 2:
-                            food_name = parts[0].strip()
-                            amount = parts[1].strip()
-                            
-                            # 食材として有効か確認
-                            if is_food_item(food_name, amount):
-                                # 小数点以下を切り捨て
-                                if '/' in amount:
-                                    parts = amount.split('/')
-                                    truncated_amount = '/'.join([truncate_decimal(p) for p in parts])
-                                else:
-                                    truncated_amount = truncate_decimal(amount)
-                                
-                                ingredients_list.append((food_name, truncated_amount))
-                    # その他の形式（dish_nameが食材名、cell_contentが量）
-                    elif dish_name and cell_content and not dish_name_str.startswith("朝食") and not dish_name_str.startswith("昼食") and not dish_name_str.startswith("夕食"):
-                        # 食事区分のタイトル行を除外
-                        if not any(keyword in dish_name_str for keyword in ['(主菜', '(副菜', '(汁物']):
-                            amount = cell_content_str
-                            
-                            # 食材として有効か確認
-                            if is_food_item(dish_name_str, amount):
-                                # 小数点以下を切り捨て
-                                if '/' in amount:
-                                    parts = amount.split('/')
-                                    truncated_amount = '/'.join([truncate_decimal(p) for p in parts])
-                                else:
-                                    truncated_amount = truncate_decimal(amount)
-                                
-                                ingredients_list.append((dish_name_str, truncated_amount))
+                # 「/」で個人分と総量が指定されている場合は総量のみ使用
+                amount_str = str(amount)  # 安全に文字列変換
+                if "/" in amount_str:
+                    try:
+                        total_amount = amount_str.split("/")[-1]
+                        order_data['B'][row_idx] = total_amount
+                    except:
+                        order_data['B'][row_idx] = amount_str
+                else:
+                    order_data['B'][row_idx] = amount_str
             
-            # この日付の食材リストを保存
-            if ingredients_list:
-                print(f"日付 {date_col} の食材数: {len(ingredients_list)}")
-                all_ingredients_by_date[date_col] = ingredients_list
-            else:
-                print(f"日付 {date_col} の食材は見つかりませんでした")
-        
-        # 日付を2日ごとにグループ化
-        date_pairs = []
-        for i in range(0, len(date_columns), 2):
-            if i + 1 < len(date_columns):
-                date_pairs.append((date_columns[i], date_columns[i+1]))
-            else:
-                date_pairs.append((date_columns[i], None))
-        
-        # 送り先に応じたヘッダーテキストを設定
-        header_text = ""
-        if destination == "宝成":
-            header_text = "宝成　御中"
-        elif destination == "豊中":
-            header_text = "株式会社　豊中商店　御中"
-        
-        print(f"食材データ抽出完了。発注書作成開始...")
-        
-        # 出力用のExcelファイルを作成
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            for pair_idx, (date1, date2) in enumerate(date_pairs):
-                # シート名の設定
-                sheet_name = f"発注書_{pair_idx+1}"
-                
-                # 発注書データの作成
-                order_data = {
-                    'A': [''] * 100,
-                    'B': [''] * 100,
-                    'C': [''] * 100,
-                    'D': [''] * 100,
-                    'E': [''] * 100
-                }
-                
-                # ヘッダー部分の設定
-                order_data['C'][0] = header_text
-                order_data['B'][1] = '発注書'
-                
-                # 食品名と使用量のヘッダー
-                order_data['A'][3] = '食品名'
-                # 日付列のフォーマット (安全に str() 変換)
-                date1_str = str(date1)
-                order_data['B'][3] = f'{date1_str}使用分'
-                
-                if date2:
-                    date2_str = str(date2)
-                    order_data['C'][3] = ''
-                    order_data['D'][3] = '食品名'
-                    order_data['E'][3] = f'{date2_str}使用分'
-                
-                # 1日目の食材を追加
-                food_items1 = all_ingredients_by_date.get(date1, [])
-                for i, (name, amount) in enumerate(food_items1):
+            # 2日目の食材を追加
+            if date2:
+                food_items2 = all_ingredients_by_date.get(date2, [])
+                for i, (name, amount) in enumerate(food_items2):
                     row_idx = i + 4  # ヘッダー行の後ろから開始
-                    order_data['A'][row_idx] = name
+                    order_data['D'][row_idx] = name
                     
                     # 「/」で個人分と総量が指定されている場合は総量のみ使用
                     amount_str = str(amount)  # 安全に文字列変換
                     if "/" in amount_str:
                         try:
                             total_amount = amount_str.split("/")[-1]
-                            order_data['B'][row_idx] = total_amount
+                            order_data['E'][row_idx] = total_amount
                         except:
-                            order_data['B'][row_idx] = amount_str
-                    else:
-                        order_data['B'][row_idx] = amount_str
-                
-                # 2日目の食材を追加
-                if date2:
-                    food_items2 = all_ingredients_by_date.get(date2, [])
-                    for i, (name, amount) in enumerate(food_items2):
-                        row_idx = i + 4  # ヘッダー行の後ろから開始
-                        order_data['D'][row_idx] = name
-                        
-                        # 「/」で個人分と総量が指定されている場合は総量のみ使用
-                        amount_str = str(amount)  # 安全に文字列変換
-                        if "/" in amount_str:
-                            try:
-                                total_amount = amount_str.split("/")[-1]
-                                order_data['E'][row_idx] = total_amount
-                            except:
-                                order_data['E'][row_idx] = amount_str
-                        else:
                             order_data['E'][row_idx] = amount_str
-                
-                # DataFrameに変換
-                order_df = pd.DataFrame(order_data)
-                
-                # シートに書き込み
-                order_df.to_excel(writer, sheet_name=sheet_name, header=False, index=False)
-                
-                # シートの書式設定
-                worksheet = writer.sheets[sheet_name]
-                
-                # 列幅の調整
-                worksheet.column_dimensions['A'].width = 20
-                worksheet.column_dimensions['B'].width = 15
-                worksheet.column_dimensions['C'].width = 5
-                worksheet.column_dimensions['D'].width = 20
-                worksheet.column_dimensions['E'].width = 15
-                
-                # タイトル行のスタイル
-                from openpyxl.styles import Font, Alignment
-                worksheet['C1'].font = Font(size=14, bold=True)
-                worksheet['B2'].font = Font(size=14, bold=True)
-                
-                # ヘッダー行の設定
-                for col in ['A', 'B', 'D', 'E']:
-                    cell = worksheet[f'{col}4']
-                    cell.font = Font(bold=True)
-                    cell.alignment = Alignment(horizontal='center')
+                    else:
+                        order_data['E'][row_idx] = amount_str
+            
+            # DataFrameに変換
+            order_df = pd.DataFrame(order_data)
+            
+            # シートに書き込み
+            order_df.to_excel(writer, sheet_name=sheet_name, header=False, index=False)
+            
+            # シートの書式設定
+            worksheet = writer.sheets[sheet_name]
+            
+            # 列幅の調整
+            worksheet.column_dimensions['A'].width = 20
+            worksheet.column_dimensions['B'].width = 15
+            worksheet.column_dimensions['C'].width = 5
+            worksheet.column_dimensions['D'].width = 20
+            worksheet.column_dimensions['E'].width = 15
+            
+            # タイトル行のスタイル
+            from openpyxl.styles import Font, Alignment
+            worksheet['C1'].font = Font(size=14, bold=True)
+            worksheet['B2'].font = Font(size=14, bold=True)
+            
+            # ヘッダー行の設定
+            for col in ['A', 'B', 'D', 'E']:
+                cell = worksheet[f'{col}4']
+                cell.font = Font(bold=True)
+                cell.alignment = Alignment(horizontal='center')
+
+        # 納品期間ごとの発注合計
+        windows = delivery_windows(date_columns, window_days=window_days, cutoff_dates=cutoff_dates)
+        totals = aggregate_procurement(ingredients, windows, supplier_rules, default_supplier=destination,
+                                       person_count=person_count)
+        write_procurement_totals(writer, totals)
+        logger.info("発注合計: %s期間, %s品目", totals['window'].nunique(), len(totals))
+    
+    if isinstance(output_file, io.BytesIO):
+        output_file.seek(0)
+    return output_file
+
+
+@traced()
+def create_order_sheets(input_file, output_file=None, person_count=45, destination="宝成",
+                        window_days=2, cutoff_dates=None, supplier_rules=None):
+    """
+    献立表から発注書を作成する関数
+
+    2日ごとの発注書シートに加えて、納品期間ごとに同じ食材の量を合計した「発注合計」シートを作成する。
+    
+    Args:
+        input_file: 入力ファイルのパス、またはbytes・ファイルオブジェクト
+        output_file: 出力ファイルのパス（指定がない場合はメモリ上に出力する）
+        person_count: 発注する人数。食事区分ごと（{'朝食': 40, '昼食': 45, '夕食': 30}）や
+            日付ごと（{'5/1': 45, '5/2': {'昼食': 50}}）の辞書も指定できる。
+            献立表の「1人分/総量」の1人分にこの人数を掛けて発注量を求める
+        destination (str): 発注書の送り先（order_suppliers.csv の発注先。宝成または豊中）
+        window_days (int): 発注合計で1回の納品にまとめる日数（2なら2日ごと、7なら1週間ごと）
+        cutoff_dates (list, optional): 発注合計の納品期間の開始日（指定時は window_days より優先）
+        supplier_rules (list, optional): 食材名のキーワードと発注先の組 [(キーワード, 発注先), ...]。
+            省略時は order_suppliers.csv のカテゴリ割り当てを使い、一致しない食材は destination に発注する
         
-        print(f"発注書の作成が完了しました: {output_file}")
+    Returns:
+        作成された発注書のファイルパス（output_file未指定の場合はBytesIO）、失敗した場合はNone
+    """
+    try:
+        if output_file is None:
+            output_file = io.BytesIO()
+        logger.info("発注書作成開始: 入力=%s, 出力=%s", describe_input(input_file), describe_input(output_file))
+        
+        date_columns, ingredients = read_order_ingredients(input_file)
+        with span('発注書書き出し', destination=destination, ingredients=len(ingredients)):
+            write_order_workbook(output_file, date_columns, ingredients, person_count=person_count,
+                                 destination=destination, window_days=window_days, cutoff_dates=cutoff_dates,
+                                 supplier_rules=supplier_rules)
+        
+        logger.info("発注書の作成が完了しました: %s", describe_input(output_file))
         return output_file
         
     except Exception as e:
-        import traceback
-        print("=== 発注書作成エラー詳細 ===")
-        print(e)
-        traceback.print_exc()
-        return None
\ No newline at end of file
+        logger.exception("発注書作成エラー: %s", e)
+        return None
+
+
+def normalize_order_spec(spec) -> dict:
+    """発注書の作成条件を辞書に揃える（(送り先, 人数, 納品日数) のタプルも受け付ける）"""
+    if isinstance(spec, dict):
+        order_spec = dict(spec)
+    else:
+        keys = ['destination', 'person_count', 'window_days']
+        order_spec = dict(zip(keys, spec))
+    order_spec.setdefault('destination', "宝成")
+    order_spec.setdefault('person_count', 45)
+    order_spec.setdefault('window_days', 2)
+    order_spec.setdefault('cutoff_dates', None)
+    return order_spec
+
+
+def order_file_name(index: int, spec: dict) -> str:
+    """一括作成したZIP内の発注書ファイル名"""
+    person_count = spec['person_count']
+    persons = f"_{person_count}人" if not isinstance(person_count, dict) else ""
+    return f"{index + 1:02d}_発注書_{spec['destination']}{persons}.xlsx"
+
+
+@traced()
+def create_order_sheets_batch(input_file, specs, output_file=None, max_workers=MAX_ORDER_WORKERS):
+    """
+    複数の送り先・人数・納品間隔の発注書をまとめて作成し、ZIPにする
+
+    献立表の読み込みと食材の抽出は1回だけ行い、各発注書の書き出しを並行して実行する。
+
+    Args:
+        input_file: 入力ファイルのパス、またはbytes・ファイルオブジェクト
+        specs (list): 作成条件のリスト。各要素は (送り先, 人数, 納品日数) のタプル、または
+            destination・person_count・window_days・cutoff_dates・supplier_rules をキーとする辞書
+        output_file: 出力するZIPファイルのパス（指定がない場合はメモリ上に出力する）
+        max_workers (int): 並行して書き出す発注書の数
+
+    Returns:
+        作成されたZIPファイルのパス（output_file未指定の場合はBytesIO）、失敗した場合はNone
+    """
+    try:
+        if output_file is None:
+            output_file = io.BytesIO()
+        specs = [normalize_order_spec(spec) for spec in specs]
+        logger.info("発注書一括作成開始: 入力=%s, %s件", describe_input(input_file), len(specs))
+
+        date_columns, ingredients = read_order_ingredients(input_file)
+        supplier_config = get_supplier_config()
+
+        @in_current_trace
+        def write_one(spec):
+            with span('発注書書き出し', destination=spec['destination'], ingredients=len(ingredients)):
+                return write_order_workbook(io.BytesIO(), date_columns, ingredients, supplier_config=supplier_config,
+                                            **spec).getvalue()
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(specs)))) as executor:
+            workbooks = list(executor.map(write_one, specs))
+
+        with zipfile.ZipFile(output_file, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for index, (spec, data) in enumerate(zip(specs, workbooks)):
+                archive.writestr(order_file_name(index, spec), data)
+
+        if isinstance(output_file, io.BytesIO):
+            output_file.seek(0)
+        logger.info("発注書の一括作成が完了しました: %s", describe_input(output_file))
+        return output_file
+
+    except Exception as e:
+        logger.exception("発注書一括作成エラー: %s", e)
+        return None
@@ -0,0 +1,242 @@
+"""
+稼働状況の計測値（Prometheus のテキスト形式）
+
+カウンター・ゲージ・ヒストグラムをプロセス内で集計し、MENU_METRICS_PORT を指定した場合は
+start_metrics_server で別ポートの /metrics に公開する（Streamlit とは別のスレッドで応答する）。
+認証はないため、既定では 127.0.0.1 でだけ待ち受ける（監視サーバーから直接取得する場合は
+MENU_METRICS_HOST で待ち受けるアドレスを指定する）。
+- kondate_requests_total / kondate_span_duration_seconds: 処理（トレースの最も外側のスパン）の件数と各区間の所要時間
+- kondate_llm_call_duration_seconds / kondate_llm_tokens_total: LLM呼び出しの所要時間とトークン数
+- kondate_cache_requests_total: キャッシュのヒット/ミス（ヒット率は hit / (hit + miss) で求める）
+- kondate_fallbacks_total: フォールバック（固定の献立・既定のデザート・従来のアルゴリズム）の使用回数
+- kondate_job_queue_jobs: ジョブキューの順番待ち・実行中のジョブ数
+"""
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from llm_client import LLM_SPAN
+from log_config import get_logger
+from tracing import add_span_listener
+
+logger = get_logger(__name__)
+
+# 計測値を公開するポート（未設定の場合は公開しない）と待ち受けるアドレス
+METRICS_PORT_ENV = 'MENU_METRICS_PORT'
+METRICS_HOST_ENV = 'MENU_METRICS_HOST'
+DEFAULT_METRICS_HOST = '127.0.0.1'
+
+# 所要時間（秒）のヒストグラムの区切り
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    """ラベルごとの値を持つ計測値"""
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} のラベルは {self.labelnames} です: {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """(名前の接尾辞, ラベルの値, 追加のラベル, 値) の列"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """増えるだけの件数"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('_total' if not self.name.endswith('_total') else '', key, (), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """現在の値（set_function を指定した場合は出力のたびに値を取得する）"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]):
+        """値を返す関数（ラベルの値のタプル → 値の辞書）を登録する"""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                values = self._function()
+            except Exception as e:
+                logger.warning("%s の値を取得できませんでした: %s", self.name, e)
+                values = {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [('', key, (), value) for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """値の分布（区切りごとの累積件数・合計・件数）"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                samples.append(('_bucket', key, (('le', _format_value(bound)),), count))
+            samples.append(('_sum', key, (), total))
+            samples.append(('_count', key, (), counts[-1]))
+        return samples
+
+
+REGISTRY = []
+
+
+def render_metrics() -> str:
+    """全ての計測値を Prometheus のテキスト形式にする"""
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+REQUESTS = Counter('kondate_requests_total', '処理の件数（トレースの最も外側のスパン）', ('operation', 'status'))
+SPAN_DURATION = Histogram('kondate_span_duration_seconds', '処理の区間（スパン）ごとの所要時間', ('span', 'status'))
+LLM_CALL_DURATION = Histogram('kondate_llm_call_duration_seconds', 'LLM呼び出しの所要時間（キャッシュからの取得を含む）',
+                              ('model', 'cache', 'status'))
+LLM_TOKENS = Counter('kondate_llm_tokens_total', 'LLMのトークン数（応答に使用量が含まれる場合のみ）', ('model', 'kind'))
+CACHE_REQUESTS = Counter('kondate_cache_requests_total', 'キャッシュの参照回数', ('cache', 'result'))
+FALLBACKS = Counter('kondate_fallbacks_total', 'フォールバックの使用回数', ('kind',))
+JOB_QUEUE_JOBS = Gauge('kondate_job_queue_jobs', 'ジョブキューのジョブ数', ('status',))
+
+
+def _record_span(span):
+    """
+    終了したスパンを集計する
+
+    処理件数と区間ごとの所要時間のほか、LLM呼び出しのスパンからは所要時間・トークン数を、
+    cache 属性（'hit' / 'miss'）を持つスパンからはキャッシュのヒット/ミスを集計する。
+    """
+    SPAN_DURATION.observe(span.duration_ms / 1000, span=span.name, status=span.status)
+    if span.parent_span_id is None:
+        REQUESTS.inc(operation=span.name, status=span.status)
+
+    attributes = span.attributes
+    cache = attributes.get('cache')
+    if cache in ('hit', 'miss'):
+        CACHE_REQUESTS.inc(cache=span.name, result=cache)
+    if span.name == LLM_SPAN:
+        model = attributes.get('model', '')
+        LLM_CALL_DURATION.observe(span.duration_ms / 1000, model=model, cache=cache or 'off', status=span.status)
+        for kind in ('prompt', 'completion'):
+            if attributes.get(f'{kind}_tokens'):
+                LLM_TOKENS.inc(attributes[f'{kind}_tokens'], model=model, kind=kind)
+
+
+add_span_listener(_record_span)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics: " + format, *args)
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    /metrics を公開するサーバーを別スレッドで起動する（プロセスごとに1回だけ起動する）
+
+    port を省略した場合は MENU_METRICS_PORT を使い、未設定なら起動しない。
+    host を省略した場合は MENU_METRICS_HOST を使い、未設定なら 127.0.0.1 で待ち受ける。
+    """
+    global _server
+    port = port or os.getenv(METRICS_PORT_ENV)
+    host = host or os.getenv(METRICS_HOST_ENV) or DEFAULT_METRICS_HOST
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            except (OSError, ValueError) as e:
+                logger.warning("計測値のサーバーを起動できませんでした（ポート %s）: %s", port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, name='kondate-metrics', daemon=True).start()
+            logger.info("計測値を公開しています: http://%s:%s/metrics", host, port)
+        return _server
@@ -0,0 +1,364 @@
+"""
+発注書用の食材抽出と発注量の集計
+
+献立表（1列目が項目、2列目以降が日付）の全セルを縦持ちの表に変換し、
+複数行のセルの展開・「- 食材: 量」行の解析・除外語/調味料の判定を列単位でまとめて行う。
+集計では量を基準単位（g・ml・個数）の数値に変換し、納品期間・発注先・食材ごとに合計する。
+発注量は「1人分/総量」の1人分に発注時の人数（食事ごと・日ごとに指定可）を掛けて求める。
+"""
+import re
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from menu_model import DEFAULT_PERSON_COUNT, MEAL_TYPES
+
+# 発注人数：全体で1つ、食事区分ごと（{'昼食': 45}）、日付ごと（{'5/1': 45} や {'5/1': {'昼食': 45}}）
+PersonCount = Union[int, Dict[str, Union[int, Dict[str, int]]]]
+
+# 食材以外の項目を除外するキーワード
+EXCLUDE_KEYWORDS = [
+    'エネルギー', 'タンパク質', '脂質', '炭水化物', 'カルシウム', '鉄分', '食物繊維',
+    '栄養価', '栄養素', 'kcal', 'mg', '栄養価合計', '1日の栄養'
+]
+
+# 調味料 - これらは発注書から除外
+SEASONINGS = [
+    '砂糖', '三温糖', '上白糖', '黒砂糖', 'グラニュー糖', 'きび砂糖', '塩', '塩分', '食塩', '岩塩',
+    '醤油', 'しょうゆ', '薄口醤油', '濃口醤油', 'だし', '出汁', 'だし汁', '和風だし', '昆布だし',
+    '鰹だし', 'めんつゆ', 'みりん', '料理酒', '酒', '味噌', 'みそ', '赤みそ', '白みそ', 'レモン汁',
+    'レモン果汁', '油', 'サラダ油', 'オリーブオイル', 'ごま油', 'マヨネーズ', 'ケチャップ', '酢',
+    '米酢', '穀物酢', 'バルサミコ酢', 'ソース', 'ウスターソース', '中濃ソース', 'カレー粉',
+    'カレールウ', '胡椒', 'こしょう', 'コショウ', '七味唐辛子', '一味唐辛子', 'わさび', '山葵',
+    'からし', '辛子', '柚子胡椒', '柚子こしょう', 'にんにく', 'ニンニク', 'しょうが', '生姜',
+    'バター', 'マーガリン', '顆粒だし', '中華だし', '鶏がらスープ', '味の素', 'アミノ酸',
+    'コンソメ', '固形スープ', 'ブイヨン', '調味料', 'スパイス', 'ハーブ', 'タレ', 'たれ',
+    'カラースプレー', '適量'
+]
+
+# 量として扱う単位
+AMOUNT_UNITS = ['g', 'kg', '個', 'ml', 'L', 'cc', '本', '枚', '袋']
+
+# 単位 → (基準単位, 倍率)
+UNIT_CONVERSIONS = {
+    'g': ('g', 1), 'kg': ('g', 1000),
+    'ml': ('ml', 1), 'cc': ('ml', 1), 'l': ('ml', 1000),
+    '個': ('個', 1), '本': ('本', 1), '枚': ('枚', 1), '袋': ('袋', 1),
+}
+
+# 基準単位を表示用に繰り上げる単位（1000以上で kg・L 表示）
+DISPLAY_UNITS = {'g': ('kg', 1000), 'ml': ('L', 1000)}
+
+# 食事区分のタイトル行（項目名が食材名ではない行）
+MEAL_TITLE_PREFIXES = ('朝食', '昼食', '夕食')
+MEAL_TITLE_KEYWORDS = ['(主菜', '(副菜', '(汁物']
+
+
+def _alternation(words) -> re.Pattern:
+    """部分一致判定用の正規表現（長い語から順に並べた選択）"""
+    return re.compile('|'.join(re.escape(word) for word in sorted(set(words), key=len, reverse=True)))
+
+
+_EXCLUDE_PATTERN = _alternation(EXCLUDE_KEYWORDS)
+_SEASONING_PATTERN = _alternation(SEASONINGS)
+_MEAL_TITLE_PATTERN = _alternation(MEAL_TITLE_KEYWORDS)
+_MEAL_TYPE_PATTERN = re.compile('(' + _alternation(MEAL_TYPES).pattern + ')')
+_AMOUNT_PATTERN = re.compile(r'\d|' + _alternation(AMOUNT_UNITS).pattern)
+
+# 「- 食材名: 量」形式の行
+_BULLET_LINE_PATTERN = re.compile(r'^- (?P<name>[^:]*):(?P<amount>.*)$')
+# 小数点以下（「60.0g」→「60g」）
+_DECIMAL_PATTERN = re.compile(r'(\d+)\.\d*')
+# 数値と単位（「2.7kg」「450 g」）
+_QUANTITY_PATTERN = re.compile(
+    r'(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>' + _alternation(UNIT_CONVERSIONS).pattern + ')?',
+    re.IGNORECASE,
+)
+# 食材名の補足（「鶏肉(国産)」の括弧部分）
+_NAME_NOTE_PATTERN = re.compile(r'[(（][^)）]*[)）]')
+
+
+def _food_mask(names: pd.Series, amounts: pd.Series) -> pd.Series:
+    """食材として発注対象になる行か（除外語・調味料を含まず、量に数値か単位がある）"""
+    return (
+        ~names.str.contains(_EXCLUDE_PATTERN, na=True)
+        & ~names.str.contains(_SEASONING_PATTERN, na=True)
+        & amounts.str.contains(_AMOUNT_PATTERN, na=False)
+    )
+
+
+def extract_order_ingredients(menu_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    献立表から発注対象の食材を抽出する
+
+    Args:
+        menu_df (pd.DataFrame): 1列目が項目、2列目以降が日付の献立表
+
+    Returns:
+        pd.DataFrame: date・meal・name・amount・raw_amount 列の表（日付順、各日付内は献立表の記載順）。
+            meal は項目名から判定した食事区分（判定できない場合は空文字）、
+            amount は小数点以下を切り捨てた表示用、raw_amount は献立表の表記のまま
+    """
+    columns = ['date', 'meal', 'name', 'amount', 'raw_amount']
+    if menu_df.empty or len(menu_df.columns) < 2:
+        return pd.DataFrame(columns=columns)
+
+    item_col = menu_df.columns[0]
+    date_columns = list(menu_df.columns[1:])
+
+    # 縦持ちに変換（日付順 → 行順）
+    cells = menu_df.reset_index(drop=True).reset_index(names='row')
+    cells = cells.melt(id_vars=['row', item_col], value_vars=date_columns, var_name='date', value_name='cell')
+    cells['date_pos'] = cells['date'].map({date: pos for pos, date in enumerate(date_columns)})
+    cells = cells.dropna(subset=[item_col, 'cell'])
+    cells['item'] = cells[item_col].astype(str)
+    cells['cell'] = cells['cell'].astype(str)
+    cells = cells[(cells['item'] != '') & (cells['cell'] != '')]
+
+    # 栄養価などの行を除外
+    cells = cells[~cells['item'].str.contains(_EXCLUDE_PATTERN)]
+    cells['meal'] = cells['item'].str.extract(_MEAL_TYPE_PATTERN, expand=False).fillna('')
+
+    multiline = cells['cell'].str.contains('\n', regex=False)
+    has_colon = cells['cell'].str.contains('[:：]')
+
+    # 1. 複数行のセル：行に展開し「- 食材: 量」の行だけを解析
+    lines = cells.loc[multiline, ['date', 'date_pos', 'row', 'meal', 'cell']]
+    lines = lines.assign(line=lines['cell'].str.split('\n')).explode('line')
+    lines['line_no'] = lines.groupby(level=0).cumcount()
+    parsed = lines['line'].str.strip().str.extract(_BULLET_LINE_PATTERN)
+    bullet = lines.assign(name=parsed['name'].str.strip(), amount=parsed['amount'].str.strip())
+    bullet = bullet.dropna(subset=['name'])
+
+    # 2. 1行の「食材: 量」形式のセル
+    single = cells.loc[~multiline & has_colon, ['date', 'date_pos', 'row', 'meal', 'cell']]
+    split = single['cell'].str.replace('：', ':', regex=False).str.split(':', n=1, expand=True)
+    split = split.reindex(columns=[0, 1]).astype(object)
+    single = single.assign(name=split[0].str.strip(), amount=split[1].str.strip(), line_no=0)
+
+    # 3. その他：項目名が食材名、セルが量（食事区分のタイトル行は除く）
+    other = cells.loc[~multiline & ~has_colon, ['date', 'date_pos', 'row', 'meal', 'item', 'cell']]
+    other = other[~other['item'].str.startswith(MEAL_TITLE_PREFIXES)
+                  & ~other['item'].str.contains(_MEAL_TITLE_PATTERN)]
+    other = other.assign(name=other['item'], amount=other['cell'], line_no=0)
+
+    result = pd.concat([frame[['date', 'date_pos', 'row', 'line_no', 'meal', 'name', 'amount']]
+                        for frame in (bullet, single, other)], ignore_index=True)
+    result = result[_food_mask(result['name'], result['amount'])]
+
+    # 小数点以下を切り捨て（集計用に元の表記も残す）
+    result['raw_amount'] = result['amount']
+    result['amount'] = result['amount'].str.replace(_DECIMAL_PATTERN, r'\1', regex=True)
+
+    result = result.sort_values(['date_pos', 'row', 'line_no'], kind='stable')
+    return result[columns].reset_index(drop=True)
+
+
+def ingredients_by_date(ingredients: pd.DataFrame) -> Dict[str, List[Tuple[str, str]]]:
+    """日付ごとの (食材名, 量) のリストに変換する"""
+    return {
+        date: list(zip(group['name'], group['amount']))
+        for date, group in ingredients.groupby('date', sort=False)
+    }
+
+
+def canonical_names(names: pd.Series) -> pd.Series:
+    """集計用の食材名（全角/半角の統一、括弧書きの補足と空白の除去）"""
+    names = names.astype(str).str.normalize('NFKC')
+    names = names.str.replace(_NAME_NOTE_PATTERN, '', regex=True)
+    return names.str.replace(r'\s+', '', regex=True)
+
+
+def resolve_person_counts(ingredients: pd.DataFrame, person_count: PersonCount = DEFAULT_PERSON_COUNT) -> pd.Series:
+    """
+    食材行ごとの発注人数を求める
+
+    Args:
+        ingredients (pd.DataFrame): extract_order_ingredients の結果（date・meal 列）
+        person_count: 全体の人数、食事区分ごとの辞書、または日付ごとの辞書（値は人数か食事区分ごとの辞書）。
+            辞書に無い日付・食事区分は、その日（日付が無い場合は全体）で指定された人数の最大値で発注する
+
+    Returns:
+        pd.Series: 行ごとの人数
+    """
+    if not isinstance(person_count, dict):
+        return pd.Series(float(person_count), index=ingredients.index)
+
+    def fallback(counts) -> float:
+        values = [value for value in counts.values() if not isinstance(value, dict)]
+        values += [v for value in counts.values() if isinstance(value, dict) for v in value.values()]
+        return float(max(values)) if values else float(DEFAULT_PERSON_COUNT)
+
+    default = fallback(person_count)
+    if set(person_count) <= set(MEAL_TYPES):
+        return ingredients['meal'].map(person_count).astype(float).fillna(default)
+
+    # 日付ごと：日付・食事区分の組 → 人数の表を作ってから行に割り当てる
+    keys = pd.MultiIndex.from_frame(ingredients[['date', 'meal']])
+    table = {}
+    for date, counts in person_count.items():
+        if isinstance(counts, dict):
+            table.update({(date, meal): counts.get(meal, fallback(counts)) for meal in MEAL_TYPES + ('',)})
+        else:
+            table.update({(date, meal): counts for meal in MEAL_TYPES + ('',)})
+    counts = pd.Series(table, dtype=float).reindex(keys)
+    return pd.Series(counts.to_numpy(), index=ingredients.index).fillna(default)
+
+
+def parse_quantities(amounts: pd.Series, person_counts: Optional[pd.Series] = None) -> pd.DataFrame:
+    """
+    量の表記を基準単位の数値に変換する
+
+    「1人分/総量」の表記は、person_counts を指定した場合は1人分 × 人数、指定しない場合は総量を使う。
+    「/」の無い表記はそのままの量とする。単位のない数値は単位なし（''）として扱う。
+
+    Args:
+        amounts (pd.Series): 量の表記（「60g/2700g」「1.5kg」「45個」など）
+        person_counts (pd.Series, optional): 行ごとの発注人数（resolve_person_counts の結果）
+
+    Returns:
+        pd.DataFrame: quantity（数値、読み取れない場合はNaN）・unit（基準単位）列の表
+    """
+    parts = amounts.astype(str).str.normalize('NFKC').str.split('/')
+    per_person = parts.str.len() > 1
+    if person_counts is not None:
+        texts = parts.str[0].where(per_person, parts.str[-1])
+    else:
+        texts = parts.str[-1]
+    parsed = texts.str.extract(_QUANTITY_PATTERN)
+    units = parsed['unit'].str.lower()
+    base_units = units.map({unit: base for unit, (base, _) in UNIT_CONVERSIONS.items()})
+    factors = units.map({unit: factor for unit, (_, factor) in UNIT_CONVERSIONS.items()})
+    quantity = parsed['value'].astype(float) * factors.fillna(1)
+    if person_counts is not None:
+        quantity = quantity.where(~per_person, quantity * person_counts)
+    unit = base_units.where(parsed['value'].notna(), None).fillna('')
+    return pd.DataFrame({'quantity': quantity, 'unit': unit}, index=amounts.index)
+
+
+def order_amounts(ingredients: pd.DataFrame, person_count: PersonCount = DEFAULT_PERSON_COUNT) -> pd.Series:
+    """
+    発注書に記載する量（1人分 × 人数、小数点以下切り捨て）
+
+    量を読み取れない表記（「適量」など）はそのまま返す。
+    """
+    amounts = ingredients['raw_amount'] if 'raw_amount' in ingredients else ingredients['amount']
+    quantities = parse_quantities(amounts, resolve_person_counts(ingredients, person_count))
+    rounded = quantities['quantity'].where(quantities['quantity'] < 1, quantities['quantity'] // 1)
+    texts = rounded.round(2).map('{:g}'.format, na_action='ignore') + quantities['unit']
+    return texts.where(quantities['quantity'].notna(), ingredients['amount'])
+
+
+def delivery_windows(date_columns: Sequence, window_days: int = 2,
+                     cutoff_dates: Optional[Sequence] = None) -> Dict:
+    """
+    日付を納品期間に割り当てる
+
+    Args:
+        date_columns (Sequence): 献立表の日付（献立表の並び順）
+        window_days (int): 1回の納品でまとめる日数（2なら2日ごと、7なら1週間ごと）
+        cutoff_dates (Sequence, optional): 納品期間の開始日。指定した場合は window_days より優先する
+
+    Returns:
+        Dict: 日付 → 納品期間の表示名（「5月1日〜5月2日」）
+    """
+    date_columns = list(date_columns)
+    if cutoff_dates is not None:
+        cutoffs = set(cutoff_dates)
+        starts = [pos for pos, date in enumerate(date_columns) if pos == 0 or date in cutoffs]
+    else:
+        starts = list(range(0, len(date_columns), max(1, int(window_days))))
+
+    windows = {}
+    for start, end in zip(starts, starts[1:] + [len(date_columns)]):
+        dates = date_columns[start:end]
+        label = str(dates[0]) if len(dates) == 1 else f"{dates[0]}〜{dates[-1]}"
+        for date in dates:
+            windows[date] = label
+    return windows
+
+
+def assign_suppliers(names: pd.Series, supplier_rules: Optional[Sequence[Tuple[str, str]]] = None,
+                     default_supplier: str = '') -> pd.Series:
+    """
+    食材名のキーワードで発注先を割り当てる（先に一致したルールを優先）
+
+    Args:
+        names (pd.Series): 食材名
+        supplier_rules (Sequence[Tuple[str, str]], optional): (キーワード, 発注先) のリスト
+        default_supplier (str): どのルールにも一致しない食材の発注先
+    """
+    suppliers = pd.Series(default_supplier, index=names.index, dtype=object)
+    assigned = pd.Series(False, index=names.index)
+    for keyword, supplier in supplier_rules or []:
+        matched = ~assigned & names.str.contains(keyword, regex=False, na=False)
+        suppliers[matched] = supplier
+        assigned |= matched
+    return suppliers
+
+
+def aggregate_procurement(ingredients: pd.DataFrame, windows: Dict,
+                          supplier_rules: Optional[Sequence[Tuple[str, str]]] = None,
+                          default_supplier: str = '',
+                          person_count: Optional[PersonCount] = None) -> pd.DataFrame:
+    """
+    食材の量を納品期間・発注先・食材・単位ごとに合計する
+
+    Args:
+        ingredients (pd.DataFrame): extract_order_ingredients の結果
+        windows (Dict): 日付 → 納品期間（delivery_windows の結果）
+        supplier_rules (Sequence[Tuple[str, str]], optional): 発注先の割り当てルール
+        default_supplier (str): ルールに一致しない食材の発注先
+        person_count (optional): 発注人数（resolve_person_counts と同じ指定）。
+            省略時は献立表に記載された総量を合計する
+
+    Returns:
+        pd.DataFrame: window・supplier・name・unit・quantity・days・unparsed 列の表。
+            量を読み取れなかった表記は quantity を NaN とし、unparsed にまとめる
+    """
+    columns = ['window', 'supplier', 'name', 'unit', 'quantity', 'days', 'unparsed']
+    if ingredients.empty:
+        return pd.DataFrame(columns=columns)
+
+    amounts = ingredients['raw_amount'] if 'raw_amount' in ingredients else ingredients['amount']
+    person_counts = None if person_count is None else resolve_person_counts(ingredients, person_count)
+    table = parse_quantities(amounts, person_counts)
+    table['date'] = ingredients['date']
+    table['window'] = ingredients['date'].map(windows)
+    table['name'] = canonical_names(ingredients['name'])
+    table['supplier'] = assign_suppliers(table['name'], supplier_rules, default_supplier)
+    table['unparsed'] = amounts.where(table['quantity'].isna())
+    table = table.dropna(subset=['window'])
+
+    # 納品期間・発注先の並びは献立表の順、食材は最初に出てきた順
+    window_order = {window: pos for pos, window in enumerate(dict.fromkeys(windows.values()))}
+    table['first_seen'] = range(len(table))
+
+    keys = ['window', 'supplier', 'name', 'unit']
+    grouped = table.groupby(keys, sort=False)
+    totals = grouped.agg(
+        quantity=('quantity', 'sum'),
+        parsed_count=('quantity', 'count'),
+        days=('date', 'nunique'),
+        first_seen=('first_seen', 'min'),
+    )
+    totals['quantity'] = totals['quantity'].where(totals['parsed_count'] > 0)
+
+    # 読み取れなかった表記は該当行だけ連結する
+    unparsed = table.dropna(subset=['unparsed']).groupby(keys, sort=False)['unparsed'].agg('、'.join)
+    totals['unparsed'] = unparsed.reindex(totals.index).fillna('')
+    totals = totals.reset_index()
+    totals['window_pos'] = totals['window'].map(window_order)
+    totals = totals.sort_values(['window_pos', 'supplier', 'first_seen'], kind='stable')
+    return totals[columns].reset_index(drop=True)
+
+
+def format_quantity(quantity: float, unit: str) -> str:
+    """合計量の表示（1000g以上は kg、1000ml以上は L に繰り上げる）"""
+    if pd.isna(quantity):
+        return ''
+    if unit in DISPLAY_UNITS:
+        display_unit, factor = DISPLAY_UNITS[unit]
+        if quantity >= factor:
+            quantity, unit = quantity / factor, display_unit
+    return f"{round(quantity, 2):g}{unit}"
@@ -0,0 +1,145 @@
+"""
+献立表（項目 × 日付）のベクターPDF出力
+
+画像出力と同じ MenuTableLayout で折り返し・行の高さを計算し、ReportLab で文字と罫線を
+ベクターとして描画する。日本語フォントはサブセット化して埋め込む（TrueType フォントが
+見つからない場合は ReportLab 組み込みの日本語CIDフォントを使用する）。
+"""
+import threading
+from functools import lru_cache
+from typing import Dict, Sequence
+
+from image_layout import (
+    CELL_FONT_SIZE,
+    CELL_PADDING,
+    DAYS_PER_PAGE,
+    HEADER_FILL,
+    HEADER_FONT_SIZE,
+    LINE_SPACING,
+    MenuTableLayout,
+    TextMeasurer,
+    resolve_font_path,
+    split_pages,
+)
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# 埋め込みフォントの登録名と、埋め込めない場合の組み込みフォント
+PDF_FONT_NAME = 'MenuGothic'
+CID_FALLBACK_FONT = 'HeiseiKakuGo-W5'
+
+# ページ余白（pt）
+PAGE_MARGIN = 20
+
+
+@lru_cache(maxsize=1)
+def register_pdf_font() -> str:
+    """PDF用の日本語フォントを登録し、フォント名を返す（プロセスごとに1回）"""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    font_path = resolve_font_path()
+    if font_path is not None:
+        try:
+            options = {'subfontIndex': 0} if font_path.lower().endswith('.ttc') else {}
+            pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, font_path, **options))
+            logger.info("PDF出力フォント（サブセット埋め込み）: %s", font_path)
+            return PDF_FONT_NAME
+        except Exception as e:
+            # CFFアウトラインのOpenTypeなどReportLabで埋め込めないフォント
+            logger.warning("PDFにフォントを埋め込めません: %s: %s", font_path, e)
+
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    pdfmetrics.registerFont(UnicodeCIDFont(CID_FALLBACK_FONT))
+    logger.info("PDF出力フォント（組み込みCIDフォント）: %s", CID_FALLBACK_FONT)
+    return CID_FALLBACK_FONT
+
+
+class PdfTextMeasurer(TextMeasurer):
+    """PDFフォントの文字幅（pt）で折り返しを計算する TextMeasurer"""
+
+    def __init__(self, font_name: str, size: float):
+        from reportlab.pdfbase import pdfmetrics
+
+        self.font = font_name
+        self.size = size
+        self._advances = {}
+        self._lock = threading.Lock()
+        ascent, descent = pdfmetrics.getAscentDescent(font_name, size)
+        self.ascent = ascent
+        self.line_height = ascent - descent + LINE_SPACING
+
+    def measure(self, char: str) -> float:
+        from reportlab.pdfbase import pdfmetrics
+        return pdfmetrics.stringWidth(char, self.font, self.size)
+
+
+def write_menu_pdf(output, index: Sequence[str], columns: Dict[str, Sequence[str]], index_label: str = '項目',
+                   days_per_page: int = DAYS_PER_PAGE, pagesize=None):
+    """
+    献立表をベクターPDFとして書き出す（days_per_page 日ごとに1ページ、A4横に縮小して配置）
+
+    Args:
+        output: 出力先（ファイルパスまたはBytesIOなどのファイルオブジェクト）
+        index (Sequence[str]): 項目
+        columns (Dict[str, Sequence[str]]): 日付 → 項目順のセル値
+        index_label (str): 左上セルのラベル
+        days_per_page (int): 1ページあたりの日数
+        pagesize: ページサイズ（既定はA4横）
+
+    Returns:
+        int: ページ数
+    """
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.pdfgen import canvas
+
+    font_name = register_pdf_font()
+    header_measurer = PdfTextMeasurer(font_name, HEADER_FONT_SIZE)
+    cell_measurer = PdfTextMeasurer(font_name, CELL_FONT_SIZE)
+    header_fill = HexColor(HEADER_FILL)
+    cell_fill = HexColor('#ffffff')
+    text_color = HexColor('#000000')
+    index = list(index)
+
+    page_width, page_height = pagesize or landscape(A4)
+    pdf = canvas.Canvas(output, pagesize=(page_width, page_height), pageCompression=1)
+    pdf.setTitle('献立表')
+
+    pages = split_pages(columns, days_per_page)
+    for page_columns in pages:
+        layout = MenuTableLayout(index, page_columns, index_label=index_label,
+                                 header_measurer=header_measurer, cell_measurer=cell_measurer)
+        table_width, table_height = layout.size
+        scale = min(1.0, (page_width - PAGE_MARGIN * 2) / table_width,
+                    (page_height - PAGE_MARGIN * 2) / table_height)
+
+        # 左上を原点にし、下方向を負のy座標として描画する
+        pdf.saveState()
+        pdf.translate(PAGE_MARGIN, page_height - PAGE_MARGIN)
+        pdf.scale(scale, scale)
+        pdf.setLineWidth(0.5)
+
+        y_pos = 0
+        for row_num, (cells, row_height) in enumerate(zip(layout.rows, layout.row_heights)):
+            is_header = row_num == 0
+            measurer = header_measurer if is_header else cell_measurer
+            x_pos = 0
+            for lines, col_width in zip(cells, layout.col_widths):
+                pdf.setFillColor(header_fill if is_header else cell_fill)
+                pdf.rect(x_pos, -(y_pos + row_height), col_width, row_height, stroke=1, fill=1)
+                pdf.setFillColor(text_color)
+                pdf.setFont(font_name, measurer.size)
+                for line_idx, line in enumerate(lines):
+                    if line:
+                        baseline = y_pos + CELL_PADDING + line_idx * measurer.line_height + measurer.ascent
+                        pdf.drawString(x_pos + CELL_PADDING, -baseline, line)
+                x_pos += col_width
+            y_pos += row_height
+
+        pdf.restoreState()
+        pdf.showPage()
+
+    pdf.save()
+    return len(pages)
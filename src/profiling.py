@@ -0,0 +1,179 @@
+"""
+処理のプロファイル（どの関数に時間がかかっているかのHTMLレポート）
+
+    with profile(report_path('menu_output'), title='メニュー出力'):
+        update_menu_with_desserts(...)
+
+pyinstrument がインストールされている場合はサンプリングプロファイラでフレームグラフ形式のHTMLを、
+ない場合は cProfile で関数ごとの時間の表（HTML）と、snakeviz などで開ける .prof ファイルを保存する。
+- MENU_PROFILE: '1' を指定すると全ての処理をプロファイルする（Streamlit では管理者に限り、URLの
+  ?profile=1 や管理者向けのチェックボックスでも切り替えられる）
+- MENU_PROFILE_DIR: レポートの保存先（既定は一時フォルダの kondate_profiles）
+プロファイラはプロセス内で同時に1つしか動かせないため、別の処理をプロファイル中の場合は
+プロファイルせずにそのまま実行する。
+"""
+import cProfile
+import functools
+import html
+import io
+import os
+import pstats
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# プロファイルの有効化とレポートの保存先の環境変数
+PROFILE_ENV = 'MENU_PROFILE'
+PROFILE_DIR_ENV = 'MENU_PROFILE_DIR'
+
+# 保存先に残すレポートの数（古いものから削除する）
+MAX_REPORTS = 50
+
+# cProfile のレポートに表示する関数の数
+REPORT_TOP_FUNCTIONS = 60
+
+# pyinstrument のサンプリング間隔（秒）
+SAMPLING_INTERVAL = 0.001
+
+_profile_lock = threading.Lock()
+
+
+class ProfileReport(NamedTuple):
+    """保存済みのレポート"""
+    path: str
+    name: str
+    created: float
+    size: int
+
+
+def profiling_enabled() -> bool:
+    return os.getenv(PROFILE_ENV, '') == '1'
+
+
+def profile_dir() -> str:
+    return os.getenv(PROFILE_DIR_ENV) or os.path.join(tempfile.gettempdir(), 'kondate_profiles')
+
+
+def report_path(name: str) -> str:
+    """保存先フォルダ内の新しいレポートのパス（日時・処理名・ランダムな接尾辞。古いレポートはここで削除する）"""
+    _prune_reports(profile_dir())
+    return os.path.join(profile_dir(), f"{datetime.now():%Y%m%d_%H%M%S}_{name}_{uuid.uuid4().hex[:6]}.html")
+
+
+def _render_cprofile(profiler: cProfile.Profile, title: str, elapsed: float) -> str:
+    """cProfile の結果を、累積時間の長い順の関数の表にする"""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:REPORT_TOP_FUNCTIONS]
+    body = []
+    for (filename, line, function), (primitive_calls, calls, own, cumulative, _) in rows:
+        share = cumulative / elapsed * 100 if elapsed else 0.0
+        location = f"{os.path.basename(filename)}:{line}" if line else filename
+        body.append(
+            f"<tr><td class='num'>{calls if calls == primitive_calls else f'{calls}/{primitive_calls}'}</td>"
+            f"<td class='num'>{own:.4f}</td><td class='num'>{cumulative:.4f}</td>"
+            f"<td><div class='bar' style='width:{min(share, 100):.1f}%'></div>{share:.1f}%</td>"
+            f"<td>{html.escape(function)}</td><td class='loc'>{html.escape(location)}</td></tr>"
+        )
+    return (
+        "<!DOCTYPE html><html lang='ja'><head><meta charset='utf-8'>"
+        f"<title>{html.escape(title)}</title><style>"
+        "body{font-family:sans-serif;margin:1.5em}table{border-collapse:collapse;font-size:13px}"
+        "th,td{border-bottom:1px solid #ddd;padding:3px 8px;text-align:left}.num{text-align:right}"
+        ".loc{color:#666}.bar{display:inline-block;height:9px;background:#4c78a8;margin-right:4px}"
+        "</style></head><body>"
+        f"<h2>{html.escape(title)}</h2>"
+        f"<p>実行時間 {elapsed:.3f}秒（{datetime.now():%Y-%m-%d %H:%M:%S}、cProfile。"
+        "累積時間の長い順。同じファイル名の .prof を snakeviz などで開くと呼び出し関係を確認できます）</p>"
+        "<table><tr><th>呼び出し回数</th><th>自身の時間(秒)</th><th>累積時間(秒)</th><th>割合</th>"
+        "<th>関数</th><th>場所</th></tr>"
+        + ''.join(body) + "</table></body></html>"
+    )
+
+
+def _prune_reports(folder: str):
+    """保存先のレポートが MAX_REPORTS を超えたら古いものから削除する"""
+    reports = recent_reports(limit=None, folder=folder)
+    for report in reports[MAX_REPORTS:]:
+        for path in (report.path, os.path.splitext(report.path)[0] + '.prof'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+@contextmanager
+def profile(path: str, title: str = ''):
+    """
+    ブロックの実行をプロファイルし、HTMLレポートを path に保存する
+
+    別の処理をプロファイル中の場合や、レポートの保存に失敗した場合も処理は止めない。
+    """
+    if not _profile_lock.acquire(blocking=False):
+        logger.warning("別の処理をプロファイル中のため、プロファイルせずに実行します: %s", title or path)
+        yield
+        return
+
+    try:
+        try:
+            from pyinstrument import Profiler
+            sampler, profiler = Profiler(interval=SAMPLING_INTERVAL), None
+        except ImportError:
+            sampler, profiler = None, cProfile.Profile()
+        started = time.perf_counter()
+        if sampler:
+            sampler.start()
+        else:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if sampler:
+                sampler.stop()
+            else:
+                profiler.disable()
+            elapsed = time.perf_counter() - started
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                if sampler:
+                    report = sampler.output_html()
+                else:
+                    report = _render_cprofile(profiler, title or os.path.basename(path), elapsed)
+                    profiler.dump_stats(os.path.splitext(path)[0] + '.prof')
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(report)
+                logger.info("プロファイルを保存しました: %s（%.2f秒）", path, elapsed)
+            except Exception as e:
+                logger.warning("プロファイルの保存に失敗しました: %s", e)
+    finally:
+        _profile_lock.release()
+
+
+def profiled(func, path: str, title: str = ''):
+    """func を呼び出すたびに profile で包む関数を返す（ジョブの関数をプロファイルする場合に使う）"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile(path, title):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def recent_reports(limit: Optional[int] = 20, folder: Optional[str] = None) -> List[ProfileReport]:
+    """保存先のレポート（新しい順）"""
+    folder = folder or profile_dir()
+    if not os.path.isdir(folder):
+        return []
+    reports = []
+    for entry in os.scandir(folder):
+        if entry.is_file() and entry.name.endswith('.html'):
+            stat = entry.stat()
+            reports.append(ProfileReport(entry.path, entry.name, stat.st_mtime, stat.st_size))
+    reports.sort(key=lambda report: report.created, reverse=True)
+    return reports if limit is None else reports[:limit]
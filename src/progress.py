@@ -0,0 +1,164 @@
+"""
+処理の進捗通知（段階・完了数/総数・経過時間）
+
+処理関数は progress 引数に ProgressReporter（または ProgressEvent を受け取る関数）を受け取り、
+段階ごとに start / advance / finish を呼ぶ。入れ子の処理には同じ ProgressReporter をそのまま渡す。
+- Streamlit: ジョブの進捗（progress(割合, メッセージ)）に流して進捗バーで表示する
+- コマンドライン: TTYProgressBar で端末に進捗バーを表示する
+段階ごとの所要時間は durations で参照でき、どこで時間がかかっているかの確認に使う。
+"""
+import sys
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional
+
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class ProgressEvent(NamedTuple):
+    """進捗の通知"""
+    stage: str
+    completed: int
+    total: int
+    elapsed: float  # 処理全体の経過時間（秒）
+    fraction: float  # 処理全体の進捗（0〜1、段階の重みで按分）
+    message: str = ''
+
+    def describe(self) -> str:
+        """表示用の文字列（例: 「デザート生成 3/10（12秒）」）"""
+        text = f"{self.stage} {self.completed}/{self.total}（{self.elapsed:.0f}秒）"
+        return f"{text} {self.message}" if self.message else text
+
+
+ProgressCallback = Callable[[ProgressEvent], None]
+
+
+class ProgressReporter:
+    """
+    段階ごとの進捗を集計し、callback に ProgressEvent を通知する
+
+    plan で段階ごとの重み（おおよその所要時間の比）を指定すると、処理全体の進捗をその比で按分する。
+    plan にない段階は重み1として扱う。最初に plan を呼んだ処理（最も外側の処理）の重みが優先される。
+    plan に登録した順より前の段階が省略された場合（キャッシュの再利用など）は、完了したものとして扱う。
+    """
+
+    def __init__(self, callback: Optional[ProgressCallback] = None, stages: Optional[Dict[str, float]] = None):
+        self.callback = callback
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self._weights: Dict[str, float] = {}
+        self._done = set()
+        self._stage: Optional[str] = None
+        self._stage_started = 0.0
+        self._completed = 0
+        self._total = 0
+        self._fraction = 0.0
+        self._lock = threading.Lock()
+        self.plan(stages or {})
+
+    def plan(self, stages: Dict[str, float]):
+        """段階ごとの重みを登録する（登録済みの段階は変更しない）"""
+        with self._lock:
+            for stage, weight in stages.items():
+                self._weights.setdefault(stage, float(weight))
+
+    def start(self, stage: str, total: int = 1, message: str = ''):
+        """段階を開始する（実行中の段階があれば完了にする）"""
+        with self._lock:
+            self._finish_stage()
+            self._weights.setdefault(stage, 1.0)
+            for planned in self._weights:
+                if planned == stage:
+                    break
+                self._done.add(planned)
+            self._stage = stage
+            self._stage_started = time.perf_counter()
+            self._completed = 0
+            self._total = max(int(total), 0)
+            event = self._event(message)
+        self._emit(event)
+
+    def advance(self, count: int = 1, message: str = ''):
+        """実行中の段階の完了数を進める"""
+        with self._lock:
+            if self._stage is None:
+                return
+            self._completed = min(self._completed + count, self._total) if self._total else self._completed + count
+            event = self._event(message)
+        self._emit(event)
+
+    def finish(self, message: str = ''):
+        """実行中の段階を完了にする"""
+        with self._lock:
+            if self._stage is None:
+                return
+            self._completed = self._total
+            event = self._event(message)
+            self._finish_stage()
+        self._emit(event)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def _finish_stage(self):
+        if self._stage is None:
+            return
+        self.durations[self._stage] = self.durations.get(self._stage, 0.0) + time.perf_counter() - self._stage_started
+        self._done.add(self._stage)
+        self._stage = None
+
+    def _event(self, message: str) -> ProgressEvent:
+        total_weight = sum(self._weights.values()) or 1.0
+        stage_fraction = self._completed / self._total if self._total else 0.0
+        finished_weight = sum(self._weights[stage] for stage in self._done if stage != self._stage)
+        fraction = (finished_weight + self._weights[self._stage] * stage_fraction) / total_weight
+        # 後から段階が増えても進捗が戻らないようにする
+        self._fraction = max(self._fraction, min(fraction, 1.0))
+        return ProgressEvent(self._stage, self._completed, self._total, self.elapsed, self._fraction, message)
+
+    def _emit(self, event: ProgressEvent):
+        if self.callback is None:
+            return
+        try:
+            self.callback(event)
+        except Exception as e:
+            # 進捗の表示に失敗しても処理は止めない
+            logger.warning("進捗の通知に失敗しました: %s", e)
+
+
+def as_reporter(progress=None) -> ProgressReporter:
+    """progress 引数を ProgressReporter にする（None は通知なし、関数は ProgressEvent を受け取るものとする）"""
+    if isinstance(progress, ProgressReporter):
+        return progress
+    return ProgressReporter(progress)
+
+
+class TTYProgressBar:
+    """
+    ProgressEvent を端末に進捗バーとして表示する（ProgressReporter の callback に指定する）
+
+    端末でない場合（リダイレクト時など）は、通知ごとに1行ずつ出力する。
+    """
+
+    def __init__(self, stream=None, width: int = 30):
+        self.stream = stream or sys.stderr
+        self.width = width
+        self.is_tty = hasattr(self.stream, 'isatty') and self.stream.isatty()
+
+    def __call__(self, event: ProgressEvent):
+        if not self.is_tty:
+            print(f"[{event.fraction * 100:3.0f}%] {event.describe()}", file=self.stream, flush=True)
+            return
+        filled = int(round(self.width * event.fraction))
+        bar = '#' * filled + '-' * (self.width - filled)
+        self.stream.write(f"\r[{bar}] {event.fraction * 100:3.0f}% {event.describe()}\033[K")
+        self.stream.flush()
+
+    def close(self):
+        """進捗バーの行を終える"""
+        if self.is_tty:
+            self.stream.write('\n')
+            self.stream.flush()
@@ -34,7 +34,7 @@ def main():
             
         # 必要なファイルが存在するか確認
         print("\nChecking required files:")
-        required_files = ['app.py', 'menu_updater.py', 'nutrition_data.csv']
+        required_files = ['app.py', 'menu_updater.py', 'menu_model.py', 'excel_export.py', 'image_layout.py', 'pdf_export.py', 'order_sheet.py', 'llm_client.py', 'job_queue.py', 'progress.py', 'log_config.py', 'tracing.py', 'metrics.py', 'profiling.py', 'history.py', 'nutrition_data.csv', 'order_suppliers.csv']
         missing_files = []
         
         for file in required_files:
@@ -102,10 +102,15 @@ def main():
             ]
         
         print(f"\nCommand: {' '.join(streamlit_cmd)}")
-        
+
+        # デスクトップ起動時のみ、出力ファイルの自動オープンを有効にする
+        app_env = os.environ.copy()
+        app_env.setdefault('MENU_AUTO_OPEN', '1')
+
         # Streamlitをサブプロセスとして起動 (シェルモードでの実行)
         process = subprocess.Popen(
             streamlit_cmd,
+            env=app_env,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             universal_newlines=True,
@@ -0,0 +1,309 @@
+"""
+処理時間の計測（スパン）
+
+処理の区間を with span('Excel読み込み', input_bytes=...) で囲み、所要時間・入力サイズ・キャッシュの
+ヒット/ミスなどの属性を記録する。公開関数は @traced で囲み、入れ子のスパンは呼び出し元のスパンの子になる。
+最も外側のスパン（1回の依頼）が終わると、そのトレースの全スパンを小さなSQLiteのテーブルに保存する。
+スパンの項目（trace_id / span_id / parent_span_id / 開始時刻 / 所要時間 / 属性 / 状態）は
+OpenTelemetry のスパンに合わせている。
+- MENU_TRACE_DB: 保存先のSQLiteファイル（既定は一時フォルダの kondate_traces.sqlite）
+- MENU_TRACING: '0' を指定すると保存しない
+スレッドプールで実行する処理を同じトレースに含める場合は in_current_trace で関数を包む。
+add_span_listener で登録した関数は、保存の有効・無効にかかわらず各スパンの終了時に呼ばれる。
+"""
+import contextvars
+import functools
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# トレースのSQLiteファイルと、保存の有効・無効
+TRACE_DB_ENV = 'MENU_TRACE_DB'
+TRACING_ENV = 'MENU_TRACING'
+
+# トレースを保持する時間（秒）
+TRACE_RETENTION_SECONDS = 7 * 24 * 60 * 60
+
+
+class SpanRecord(NamedTuple):
+    """保存済みのスパン"""
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str]
+    name: str
+    start_time: float  # 開始時刻（UNIX時間、秒）
+    duration_ms: float
+    attributes: Dict[str, Any]
+    status: str  # 'ok' または 'error'
+    error: str
+
+
+class TraceSummary(NamedTuple):
+    """トレースの一覧表示用（最も外側のスパン）"""
+    trace_id: str
+    name: str
+    start_time: float
+    duration_ms: float
+    status: str
+    span_count: int
+
+
+class Span:
+    """計測中のスパン（set で属性を追加する）"""
+
+    def __init__(self, trace: '_Trace', name: str, parent: Optional['Span'], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes)
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = 0.0
+        self.status = 'ok'
+        self.error = ''
+
+    def set(self, **attributes):
+        """属性を追加する（例: span.set(cache='hit', rows=120)）"""
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None):
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        if error is not None:
+            self.status = 'error'
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.add(self)
+        for listener in _span_listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                # 集計に失敗しても処理は止めない
+                logger.warning("スパンの通知に失敗しました: %s", e)
+
+    def record(self) -> SpanRecord:
+        return SpanRecord(self.trace.trace_id, self.span_id, self.parent_span_id, self.name, self.start_time,
+                          round(self.duration_ms, 3), self.attributes, self.status, self.error)
+
+
+class _Trace:
+    """1回の依頼で終了したスパン（スレッドプールからも追加される）"""
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('kondate_current_span', default=None)
+_span_listeners = []
+
+
+def add_span_listener(listener):
+    """スパンの終了時に呼ぶ関数（Span を受け取る）を登録する（計測値の集計などに使う）"""
+    _span_listeners.append(listener)
+
+
+def tracing_enabled() -> bool:
+    return os.getenv(TRACING_ENV, '1') != '0'
+
+
+def current_span() -> Optional[Span]:
+    """実行中のスパン（スパンの外ではNone）"""
+    return _current_span.get()
+
+
+def set_attributes(**attributes):
+    """実行中のスパンに属性を追加する（スパンの外では何もしない）"""
+    span_ = _current_span.get()
+    if span_ is not None:
+        span_.set(**attributes)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    処理の区間を計測する
+
+    実行中のスパンがあればその子、なければ新しいトレースの最も外側のスパンになる。
+    例外が発生した場合は状態を 'error' にして、例外はそのまま送出する。
+    """
+    parent = _current_span.get()
+    trace = parent.trace if parent is not None else _Trace()
+    current = Span(trace, name, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=e)
+        raise
+    else:
+        current.end()
+    finally:
+        _current_span.reset(token)
+        if parent is None and tracing_enabled():
+            save_trace(trace)
+
+
+def input_size(value) -> Dict[str, Any]:
+    """入力の大きさを属性にする（bytes・ファイル・パスはバイト数、DataFrameは行数・列数）"""
+    if isinstance(value, (bytes, bytearray)):
+        return {'input_bytes': len(value)}
+    if isinstance(value, io.BytesIO):
+        return {'input_bytes': value.getbuffer().nbytes}
+    if isinstance(value, (str, os.PathLike)) and os.path.isfile(value):
+        return {'input_bytes': os.path.getsize(value)}
+    if hasattr(value, 'shape') and len(getattr(value, 'shape', ())) == 2:
+        return {'input_rows': int(value.shape[0]), 'input_columns': int(value.shape[1])}
+    if hasattr(value, 'getvalue'):
+        return {'input_bytes': len(value.getvalue())}
+    return {}
+
+
+def traced(name: Optional[str] = None):
+    """関数の呼び出しをスパンで囲むデコレーター（最初の引数の大きさを属性に記録する）"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            attributes = input_size(args[0]) if args else {}
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def in_current_trace(func):
+    """スレッドプールで実行する関数を、呼び出し元のスパンの子として計測されるように包む"""
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # 同じ Context は同時に複数のスレッドで使えないため、呼び出しごとに複製する
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+_purged = False
+
+
+def default_db_path() -> str:
+    return os.getenv(TRACE_DB_ENV) or os.path.join(tempfile.gettempdir(), 'kondate_traces.sqlite')
+
+
+def _connect(path: Optional[str] = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(path or default_db_path(), timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS spans ('
+        'trace_id TEXT, span_id TEXT, parent_span_id TEXT, name TEXT, start_time REAL, '
+        'duration_ms REAL, attributes TEXT, status TEXT, error TEXT)'
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS spans_trace ON spans (trace_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS spans_root ON spans (parent_span_id, start_time)')
+    return conn
+
+
+def save_trace(trace: _Trace, path: Optional[str] = None):
+    """トレースの全スパンを保存する（保存に失敗しても処理は止めない）"""
+    global _purged
+    rows = [
+        (*record[:6], json.dumps(record.attributes, ensure_ascii=False, default=str), record.status, record.error)
+        for record in (span_.record() for span_ in trace.spans)
+    ]
+    try:
+        with _connect(path) as conn:
+            conn.executemany('INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        # 保持期間を過ぎたトレースはプロセスごとに最初の保存時に削除する
+        if not _purged:
+            _purged = True
+            purge_traces(path=path)
+    except sqlite3.Error as e:
+        logger.warning("トレースの保存に失敗しました: %s", e)
+
+
+def recent_traces(limit: int = 50, path: Optional[str] = None) -> List[TraceSummary]:
+    """新しい順のトレースの一覧"""
+    with _connect(path) as conn:
+        rows = conn.execute(
+            'SELECT root.trace_id, root.name, root.start_time, root.duration_ms, root.status, '
+            '(SELECT COUNT(*) FROM spans AS child WHERE child.trace_id = root.trace_id) '
+            'FROM spans AS root WHERE root.parent_span_id IS NULL ORDER BY root.start_time DESC LIMIT ?',
+            (limit,),
+        ).fetchall()
+    return [TraceSummary(*row) for row in rows]
+
+
+def load_trace(trace_id: str, path: Optional[str] = None) -> List[SpanRecord]:
+    """トレースの全スパン（開始時刻順）"""
+    with _connect(path) as conn:
+        rows = conn.execute(
+            'SELECT trace_id, span_id, parent_span_id, name, start_time, duration_ms, attributes, status, error '
+            'FROM spans WHERE trace_id = ? ORDER BY start_time', (trace_id,),
+        ).fetchall()
+    return [SpanRecord(*row[:6], json.loads(row[6] or '{}'), *row[7:]) for row in rows]
+
+
+def waterfall_rows(spans: List[SpanRecord]) -> List[Dict[str, Any]]:
+    """
+    トレースのスパンをウォーターフォール表示用の行にする（親の直後に子を開始時刻順に並べる）
+
+    各行は表示順・入れ子の深さ・名前・開始位置と終了位置（最も外側のスパンの開始からのミリ秒）・
+    所要時間・状態・属性を持つ。
+    """
+    if not spans:
+        return []
+    children: Dict[Optional[str], List[SpanRecord]] = {}
+    span_ids = {record.span_id for record in spans}
+    for record in sorted(spans, key=lambda record: record.start_time):
+        # 親が保存されていないスパンは最も外側として扱う
+        parent = record.parent_span_id if record.parent_span_id in span_ids else None
+        children.setdefault(parent, []).append(record)
+    origin = min(record.start_time for record in spans)
+
+    rows = []
+
+    def visit(record: SpanRecord, depth: int):
+        offset_ms = (record.start_time - origin) * 1000
+        rows.append({
+            'order': len(rows),
+            'depth': depth,
+            'name': record.name,
+            'start_ms': round(offset_ms, 1),
+            'end_ms': round(offset_ms + record.duration_ms, 1),
+            'duration_ms': record.duration_ms,
+            'status': record.status,
+            'attributes': json.dumps(record.attributes, ensure_ascii=False, default=str),
+            'error': record.error,
+        })
+        for child in children.get(record.span_id, []):
+            visit(child, depth + 1)
+
+    for root in children.get(None, []):
+        visit(root, 0)
+    return rows
+
+
+def purge_traces(older_than: float = TRACE_RETENTION_SECONDS, path: Optional[str] = None):
+    """保持期間を過ぎたトレースを削除する"""
+    with _connect(path) as conn:
+        conn.execute(
+            'DELETE FROM spans WHERE trace_id IN '
+            '(SELECT trace_id FROM spans WHERE parent_span_id IS NULL AND start_time < ?)',
+            (time.time() - older_than,),
+        )